@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from accounts.summaries import rebuild_summaries, rebuild_summary_range
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-user account summaries from the invoices and "
+        "transactions tables, in user id-range chunks. Safe to run while "
+        "the API is serving writes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='+', dest='users', help="Only rebuild these user ids.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="User ids per chunk.")
+
+    def handle(self, *args, **options):
+        if options['users']:
+            rebuilt = rebuild_summaries(options['users'])
+            self.stdout.write(f"rebuilt {rebuilt} summaries")
+            return
+
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+        bounds = get_user_model().objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write("no users to summarize")
+            return
+        rebuilt = 0
+        chunks = range(bounds['low'], bounds['high'] + 1, chunk_size)
+        for low in chunks:
+            rebuilt += rebuild_summary_range(low, low + chunk_size)
+        self.stdout.write(f"chunks={len(chunks)} rebuilt {rebuilt} summaries")
@@ -0,0 +1,87 @@
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+BLACKLIST_CACHE_TIMEOUT = 60
+WEBSOCKET_AUTH_SUBPROTOCOL = 'Bearer'
+
+
+def blacklist_cache_key(jti):
+    return f'jwt-blacklisted:{jti}'
+
+
+def is_token_blacklisted(jti):
+    """
+    Blacklist lookup cached for BLACKLIST_CACHE_TIMEOUT seconds, so a
+    reconnect storm costs at most one query per token per timeout.
+    """
+    cache_key = blacklist_cache_key(jti)
+    blacklisted = cache.get(cache_key)
+    if blacklisted is None:
+        blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        cache.set(cache_key, blacklisted, BLACKLIST_CACHE_TIMEOUT)
+    return blacklisted
+
+
+def blacklist_access_token(token):
+    """
+    Blacklist an access token the way simplejwt blacklists refresh tokens,
+    and overwrite its cached lookup so WebSocket connections made with it
+    are refused at once.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    outstanding, _ = OutstandingToken.objects.get_or_create(
+        jti=jti,
+        defaults={
+            'user_id': token.get(api_settings.USER_ID_CLAIM),
+            'token': str(token),
+            'expires_at': datetime_from_epoch(token['exp']),
+        },
+    )
+    BlacklistedToken.objects.get_or_create(token=outstanding)
+    cache.set(blacklist_cache_key(jti), True, BLACKLIST_CACHE_TIMEOUT)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections with a simplejwt access token, sent
+    either as `?token=<jwt>` or through the Sec-WebSocket-Protocol header as
+    the `Bearer, <jwt>` subprotocol pair.
+
+    The token is validated from its signature and claims alone and
+    `scope['user']` is a TokenUser built from those claims, so connecting
+    touches neither the sessions nor the users table.
+    """
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token = None
+        subprotocols = scope.get('subprotocols') or []
+        if len(subprotocols) == 2 and subprotocols[0] == WEBSOCKET_AUTH_SUBPROTOCOL:
+            raw_token = subprotocols[1]
+            scope['auth_subprotocol'] = WEBSOCKET_AUTH_SUBPROTOCOL
+        else:
+            query = parse_qs(scope.get('query_string', b'').decode())
+            raw_token = query.get('token', [None])[0]
+
+        scope['user'] = await self.get_user(raw_token)
+        return await super().__call__(scope, receive, send)
+
+    async def get_user(self, raw_token):
+        if not raw_token:
+            return AnonymousUser()
+        try:
+            token = AccessToken(raw_token)
+        except TokenError:
+            return AnonymousUser()
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti and await sync_to_async(is_token_blacklisted)(jti):
+            return AnonymousUser()
+        return TokenUser(token)
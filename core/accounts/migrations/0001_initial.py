@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:42
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+BACKFILL_SUMMARY_SQL = """
+INSERT INTO accounts_usersummary (user_id, open_balance, pending_invoices, lifetime_paid, updated_at)
+SELECT u.id, COALESCE(inv.open_balance, 0), COALESCE(inv.pending_invoices, 0), COALESCE(paid.lifetime_paid, 0), now()
+FROM auth_user AS u
+LEFT JOIN (
+    SELECT user_id, SUM(GREATEST(total_amount - amount_paid, 0)) AS open_balance, COUNT(*) AS pending_invoices
+    FROM invoices_invoice
+    WHERE status = 'PENDING'
+    GROUP BY user_id
+) AS inv ON inv.user_id = u.id
+LEFT JOIN (
+    SELECT user_id, SUM(amount) AS lifetime_paid
+    FROM transactions_transaction
+    WHERE status = 'COMPLETED'
+    GROUP BY user_id
+) AS paid ON paid.user_id = u.id
+"""
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('invoices', '0005_invoiceitem_ordering'),
+        ('transactions', '0006_revenuerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('open_balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('pending_invoices', models.IntegerField(default=0)),
+                ('lifetime_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL_SUMMARY_SQL, migrations.RunSQL.noop),
+    ]
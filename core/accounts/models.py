@@ -1,3 +1,26 @@
+from decimal import Decimal
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class UserSummary(models.Model):
+    """
+    Per-user dashboard counters, maintained incrementally by
+    accounts.summaries in the same database transaction as every invoice and
+    transaction change, and rebuilt by `manage.py rebuild_account_summaries`.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary'
+    )
+    # Still owed on PENDING invoices: total_amount - amount_paid, floored at 0.
+    open_balance = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    pending_invoices = models.IntegerField(default=0)
+    # Sum of the user's COMPLETED transactions.
+    lifetime_paid = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary of user #{self.user_id}"
@@ -2,6 +2,7 @@ from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from .models import UserSummary
 
 
 class RegisterSerializer(serializers.Serializer):
@@ -24,6 +25,12 @@ class RegisterSerializer(serializers.Serializer):
         )
 
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserSummary
+        fields = ('open_balance', 'pending_invoices', 'lifetime_paid', 'updated_at')
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
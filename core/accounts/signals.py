@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from invoices.models import Invoice
+from transactions.models import Transaction
+from transactions.signals import saved_values
+from accounts.models import UserSummary
+from accounts.summaries import invoice_state, record_invoice_changes, record_transaction_changes
+
+INVOICE_FIELDS = ('status', 'total_amount', 'amount_paid')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_summary(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserSummary.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=Invoice)
+def remember_invoice_state(sender, instance, raw=False, **kwargs):
+    instance._stored_state = None
+    if instance._state.adding or raw:
+        return
+    queryset = Invoice.objects.filter(pk=instance.pk)
+    if connection.in_atomic_block:
+        # Hold the row until post_save has recorded the difference.
+        queryset = queryset.select_for_update()
+    instance._stored_state = queryset.values_list('user_id', *INVOICE_FIELDS).first()
+
+
+@receiver(post_save, sender=Invoice)
+def update_invoice_summary(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        record_invoice_changes([(instance.user_id, None, invoice_state(instance))])
+        return
+    stored = getattr(instance, '_stored_state', None)
+    if stored is None:
+        return
+    user_id, previous = stored[0], stored[1:]
+    # Fields left out of update_fields were not written.
+    current = tuple(
+        getattr(instance, field) if update_fields is None or field in update_fields else value
+        for field, value in zip(INVOICE_FIELDS, previous)
+    )
+    if user_id == instance.user_id:
+        record_invoice_changes([(user_id, previous, current)])
+    else:
+        record_invoice_changes([(user_id, previous, None), (instance.user_id, None, current)])
+
+
+@receiver(post_delete, sender=Invoice)
+def forget_invoice(sender, instance, origin=None, **kwargs):
+    # Invoices deleted along with their owner take the summary with them;
+    # recording them would rebuild the summary of a user being deleted.
+    if getattr(origin, '_meta', None) is get_user_model()._meta or (
+        isinstance(origin, QuerySet) and origin.model is get_user_model()
+    ):
+        return
+    record_invoice_changes([(instance.user_id, invoice_state(instance), None)])
+
+
+@receiver(post_save, sender=Transaction)
+def update_transaction_summary(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        record_transaction_changes([(instance.user_id, None, (instance.status, instance.amount))])
+        return
+    previous = getattr(instance, '_stored_values', None)
+    if previous is None:
+        return
+    current = saved_values(instance, update_fields)
+    record_transaction_changes([(
+        instance.user_id,
+        (previous['status'], previous['amount']),
+        (current['status'], current['amount']),
+    )])
@@ -0,0 +1,158 @@
+"""
+Incremental maintenance of UserSummary.
+
+Code paths that change an invoice's status, total or amount paid, or a
+transaction's status or amount, report the states before and after the
+change here, in the same database transaction. The difference in each
+user's counters is applied with one `UPDATE ... SET x = F(x) + delta` per
+user, so concurrent writers never lose an increment. An invoice state is
+a (status, total_amount, amount_paid) tuple and a transaction state a
+(status, amount) tuple; None stands for "did not exist".
+
+Deleted transactions are not tracked (as in the revenue rollup);
+rebuild_summaries() repairs any drift from set-based aggregates.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from invoices.models import Invoice
+from transactions.models import Transaction
+from .models import UserSummary
+
+ZERO = Decimal('0.00')
+
+
+def invoice_contribution(state):
+    """
+    (open_balance, pending_invoices) an invoice in `state` adds to its owner.
+    """
+    if state is None or state[0] != 'PENDING':
+        return ZERO, 0
+    status, total_amount, amount_paid = state
+    return max(Decimal(total_amount) - Decimal(amount_paid), ZERO), 1
+
+
+def transaction_contribution(state):
+    if state is None or state[0] != 'COMPLETED':
+        return ZERO
+    return Decimal(state[1])
+
+
+def invoice_state(invoice):
+    return invoice.status, invoice.total_amount, invoice.amount_paid
+
+
+def record_invoice_changes(changes):
+    """
+    Apply `changes`, an iterable of (user_id, previous_state, current_state).
+    """
+    deltas = defaultdict(lambda: [ZERO, 0, ZERO])
+    for user_id, previous, current in changes:
+        before, after = invoice_contribution(previous), invoice_contribution(current)
+        delta = deltas[user_id]
+        delta[0] += after[0] - before[0]
+        delta[1] += after[1] - before[1]
+    apply_deltas(deltas)
+
+
+def record_transaction_changes(changes):
+    """
+    Apply `changes`, an iterable of (user_id, previous_state, current_state).
+    """
+    deltas = defaultdict(lambda: [ZERO, 0, ZERO])
+    for user_id, previous, current in changes:
+        deltas[user_id][2] += transaction_contribution(current) - transaction_contribution(previous)
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    """
+    Add {user_id: [open_balance, pending_invoices, lifetime_paid]} deltas.
+    A user without a summary row gets it rebuilt from scratch instead.
+    """
+    missing = []
+    # Sorted so concurrent writers lock the summary rows in the same order.
+    for user_id, (open_balance, pending_invoices, lifetime_paid) in sorted(deltas.items()):
+        if not (open_balance or pending_invoices or lifetime_paid):
+            continue
+        updated = UserSummary.objects.filter(user_id=user_id).update(
+            open_balance=F('open_balance') + open_balance,
+            pending_invoices=F('pending_invoices') + pending_invoices,
+            lifetime_paid=F('lifetime_paid') + lifetime_paid,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            missing.append(user_id)
+    if missing:
+        rebuild_summaries(missing)
+
+
+REBUILD_SQL = """
+INSERT INTO {summaries} (user_id, open_balance, pending_invoices, lifetime_paid, updated_at)
+SELECT u.id,
+    COALESCE(inv.open_balance, 0),
+    COALESCE(inv.pending_invoices, 0),
+    COALESCE(paid.lifetime_paid, 0),
+    now()
+FROM {users} AS u
+LEFT JOIN (
+    SELECT user_id,
+        SUM(GREATEST(total_amount - amount_paid, 0)) AS open_balance,
+        COUNT(*) AS pending_invoices
+    FROM {invoices}
+    WHERE status = 'PENDING' AND {user_filter}
+    GROUP BY user_id
+) AS inv ON inv.user_id = u.id
+LEFT JOIN (
+    SELECT user_id, SUM(amount) AS lifetime_paid
+    FROM {transactions}
+    WHERE status = 'COMPLETED' AND {user_filter}
+    GROUP BY user_id
+) AS paid ON paid.user_id = u.id
+WHERE {user_filter_u}
+ON CONFLICT (user_id) DO UPDATE SET
+    open_balance = EXCLUDED.open_balance,
+    pending_invoices = EXCLUDED.pending_invoices,
+    lifetime_paid = EXCLUDED.lifetime_paid,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def _rebuild(user_filter, params):
+    sql = REBUILD_SQL.format(
+        summaries=UserSummary._meta.db_table,
+        users=get_user_model()._meta.db_table,
+        invoices=Invoice._meta.db_table,
+        transactions=Transaction._meta.db_table,
+        user_filter=user_filter.format(column='user_id'),
+        user_filter_u=user_filter.format(column='u.id'),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Lock the existing rows first so that the aggregates below, a new
+        # statement with a fresh snapshot, include every change whose delta
+        # was applied before the lock, and writers still holding a delta
+        # apply it on top of the rebuilt row.
+        cursor.execute(
+            f"SELECT user_id FROM {UserSummary._meta.db_table} "
+            f"WHERE {user_filter.format(column='user_id')} ORDER BY user_id FOR UPDATE",
+            params
+        )
+        cursor.execute(sql, params * 3)
+        return cursor.rowcount
+
+
+def rebuild_summaries(user_ids):
+    """
+    Recompute the summaries of `user_ids` from their invoices and transactions.
+    """
+    return _rebuild('{column} = ANY(%s)', [sorted(set(user_ids))])
+
+
+def rebuild_summary_range(low, high):
+    """
+    Recompute the summaries of every user with low <= id < high.
+    """
+    return _rebuild('{column} >= %s AND {column} < %s', [low, high])
@@ -1,7 +1,22 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import StringIO
+from asgiref.sync import async_to_sync
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from accounts.middleware import JWTAuthMiddleware
+from accounts.models import UserSummary
+from core.routing import websocket_urlpatterns
+from invoices.models import Invoice
+from products.models import Product
 
 class AccountsTestCase(APITestCase):
     def setUp(self):
@@ -72,3 +87,127 @@ class AccountsTestCase(APITestCase):
         self.assertIn('message', response.data)
         self.assertIn('result', response.data)
         self.assertEqual(response.data['result']['email'], "updated@example.com")
+
+    def test_account_summary_tracks_invoices_and_payments(self):
+        """
+        The summary follows invoice creation, payment and cancellation, and
+        matches a rebuild from the underlying tables.
+        """
+        product = Product.objects.create(name="Widget", description="", price=Decimal('10.00'))
+        access_token = self.client.post(self.login_url, self.user_data, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access_token)
+        invoices_url = reverse('invoice-list-create')
+        first = self.client.post(invoices_url, {"items": [{"product": product.id, "quantity": 3}]}, format='json')
+        second = self.client.post(invoices_url, {"products": [product.id]}, format='json')
+        first_id, second_id = first.data['result']['id'], second.data['result']['id']
+
+        transaction_id = self.client.post(
+            reverse('transaction-create'), {"invoice": first_id}, format='json'
+        ).data['result']['id']
+        self.client.patch(
+            reverse('transaction-detail', args=[transaction_id]), {"status": "COMPLETED"}, format='json'
+        )
+        self.client.patch(reverse('invoice-detail', args=[second_id]), {"status": "CANCELLED"}, format='json')
+        Invoice.objects.create(user=self.user)
+
+        response = self.client.get(reverse('account-summary'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result']['open_balance'], '0.00')
+        self.assertEqual(response.data['result']['pending_invoices'], 1)
+        self.assertEqual(response.data['result']['lifetime_paid'], '30.00')
+
+        UserSummary.objects.filter(user=self.user).update(pending_invoices=7, lifetime_paid=0)
+        call_command('rebuild_account_summaries', stdout=StringIO())
+        rebuilt = self.client.get(reverse('account-summary')).data['result']
+        for field in ('open_balance', 'pending_invoices', 'lifetime_paid'):
+            self.assertEqual(rebuilt[field], response.data['result'][field])
+
+    def test_account_summary_self_heals_missing_row(self):
+        UserSummary.objects.filter(user=self.user).delete()
+        Invoice.objects.create(user=self.user, total_amount=Decimal('12.50'))
+        access_token = self.client.post(self.login_url, self.user_data, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access_token)
+        response = self.client.get(reverse('account-summary'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result']['open_balance'], '12.50')
+        self.assertEqual(response.data['result']['pending_invoices'], 1)
+
+
+    def test_deleting_user_with_invoices_removes_summary(self):
+        Invoice.objects.create(user=self.user, total_amount=Decimal('12.50'))
+        user_id = self.user.id
+        self.user.delete()
+        self.assertFalse(UserSummary.objects.filter(user_id=user_id).exists())
+
+        other = User.objects.create_user(username='other', password='otherpass')
+        Invoice.objects.create(user=other, total_amount=Decimal('5.00'))
+        User.objects.filter(pk=other.pk).delete()
+        self.assertFalse(UserSummary.objects.exists())
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class WebSocketAuthTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='wsuser', password='wspass123')
+        self.access = AccessToken.for_user(self.user)
+        self.application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    async def connect(self, path, subprotocols=None):
+        communicator = WebsocketCommunicator(self.application, path, subprotocols=subprotocols)
+        connected, subprotocol = await communicator.connect()
+        await communicator.disconnect()
+        return connected, subprotocol
+
+    async def test_connect_with_query_string_token(self):
+        connected, _ = await self.connect(f'/ws/transactions/user/{self.user.id}/?token={self.access}')
+        self.assertTrue(connected)
+
+    async def test_connect_with_subprotocol_token(self):
+        connected, subprotocol = await self.connect(
+            f'/ws/transactions/user/{self.user.id}/',
+            subprotocols=['Bearer', str(self.access)]
+        )
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, 'Bearer')
+
+    async def test_reject_missing_or_invalid_token(self):
+        connected, _ = await self.connect(f'/ws/transactions/user/{self.user.id}/')
+        self.assertFalse(connected)
+        connected, _ = await self.connect(f'/ws/transactions/user/{self.user.id}/?token=garbage')
+        self.assertFalse(connected)
+
+    async def test_reject_other_users_stream(self):
+        connected, _ = await self.connect(f'/ws/transactions/user/{self.user.id + 1}/?token={self.access}')
+        self.assertFalse(connected)
+
+    async def test_reject_blacklisted_token(self):
+        outstanding = await OutstandingToken.objects.acreate(
+            user=self.user,
+            jti=self.access['jti'],
+            token=str(self.access),
+            expires_at=datetime.fromtimestamp(self.access['exp'], tz=timezone.utc),
+        )
+        await BlacklistedToken.objects.acreate(token=outstanding)
+
+        connected, _ = await self.connect(f'/ws/transactions/user/{self.user.id}/?token={self.access}')
+        self.assertFalse(connected)
+
+    def test_reject_access_token_after_logout(self):
+        """
+        Ensure logging out revokes the access token used to log out, even
+        after a connection has cached it as not blacklisted.
+        """
+        refresh = RefreshToken.for_user(self.user)
+        access = refresh.access_token
+        path = f'/ws/transactions/user/{self.user.id}/?token={access}'
+        connected, _ = async_to_sync(self.connect)(path)
+        self.assertTrue(connected)
+
+        response = self.client.post(
+            reverse('logout'), {'refresh': str(refresh)},
+            content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {access}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=access['jti']).exists())
+
+        connected, _ = async_to_sync(self.connect)(path)
+        self.assertFalse(connected)
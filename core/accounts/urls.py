@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from .views import LogoutView, RegisterView, UserProfileView
+from .views import AccountSummaryView, LogoutView, RegisterView, UserProfileView
 
 urlpatterns = [
     path('login/', TokenObtainPairView.as_view(), name='login'),
@@ -9,4 +9,5 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
      path('logout/', LogoutView.as_view(), name='logout'),
     path('profile/', UserProfileView.as_view(), name='profile'),
+    path('summary/', AccountSummaryView.as_view(), name='account-summary'),
 ]
@@ -3,7 +3,10 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework_simplejwt.tokens import TokenError
-from .serializers import LogoutSerializer, RegisterSerializer, UserProfileSerializer
+from .middleware import blacklist_access_token
+from .models import UserSummary
+from .serializers import LogoutSerializer, RegisterSerializer, UserProfileSerializer, UserSummarySerializer
+from .summaries import rebuild_summaries
 
 
 class RegisterView(APIView):
@@ -96,9 +99,33 @@ class UserProfileView(APIView):
             status=status.HTTP_400_BAD_REQUEST
         )
         
+class AccountSummaryView(APIView):
+    """
+    GET: Open balance, pending invoice count and lifetime paid amount of the
+    logged-in user, read from the incrementally maintained summary row.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UserSummarySerializer
+    query_budgets = {'GET': 2}
+
+    def get(self, request):
+        summary = UserSummary.objects.filter(user=request.user).first()
+        if summary is None:
+            rebuild_summaries([request.user.id])
+            summary = UserSummary.objects.get(user=request.user)
+        return Response(
+            {
+                "message": "Account summary retrieved successfully.",
+                "result": self.serializer_class(summary).data
+            },
+            status=status.HTTP_200_OK
+        )
+
+
 class LogoutView(APIView):
     """
-    Handles user logout by blacklisting the refresh token.
+    Handles user logout by blacklisting the refresh token and the access
+    token the request was made with.
     The client must send the 'refresh' token in the request body.
     """
     permission_classes = [permissions.IsAuthenticated]
@@ -110,6 +137,7 @@ class LogoutView(APIView):
             refresh_token = serializer.validated_data['refresh']
             try:
                 refresh_token.blacklist()
+                blacklist_access_token(request.auth)
                 return Response(
                     {
                         "message": "Logout successful.",
@@ -1,19 +1,19 @@
 import os
 import django
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-import core.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django.setup()
-application = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from accounts.middleware import JWTAuthMiddleware
+import core.routing
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddleware(
         URLRouter(
             core.routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+})
@@ -0,0 +1,100 @@
+"""
+Native async counterparts of DRF's APIView.
+
+DRF dispatches synchronously, so under ASGI every APIView request is handed
+to a worker thread. AsyncAPIView runs the request cycle on the event loop
+instead: authentication is awaited (authenticators that provide
+`aauthenticate`, e.g. accounts.authentication.AsyncJWTAuthentication, need
+no thread hand-off) and handlers are coroutines that query with the async
+ORM. Which class serves a route is chosen in that app's urls.py.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework import exceptions
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are all coroutines. Handlers inherited from a sync
+    view can be adapted with `run_sync`.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = await handler(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """
+        Async version of Request._authenticate(), so that `request.user` is
+        already resolved when sync permission checks read it.
+        """
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
+
+    async def options(self, request, *args, **kwargs):
+        return super().options(request, *args, **kwargs)
+
+
+def run_sync(handler):
+    """
+    Adapt the sync `handler` of a base view for an AsyncAPIView subclass;
+    it runs in a worker thread, as it would for a sync view.
+    """
+    async def async_handler(self, request, *args, **kwargs):
+        return await sync_to_async(handler)(self, request, *args, **kwargs)
+    async_handler.__name__ = handler.__name__
+    async_handler.__doc__ = handler.__doc__
+    return async_handler
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
@@ -0,0 +1,171 @@
+"""
+Versioned read-through cache: an in-process LRU in front of Django's shared
+cache (CACHES['default'], Redis in deployments).
+
+Keys embed a namespace version stored in the shared cache. A write bumps the
+version once its transaction commits, which orphans every entry of the
+namespace in every process at once: the next read sees the new version,
+misses both layers, recomputes and stores under the new key. Orphaned
+entries age out of the LRU and expire from the shared cache. A read costs
+one shared-cache GET for the version and, on a local hit, nothing else:
+
+    catalog_cache = VersionedCache('catalog')
+    value = catalog_cache.get_or_set(('list',), compute)
+    ...
+    transaction.on_commit(catalog_cache.bump)
+
+Entries also expire after `timeout` seconds, which bounds the life of
+entries made stale by writes that bypass the model signals (queryset
+update(), raw SQL). When the shared cache is unreachable, reads go to
+the database instead and do not fail.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRU:
+    """
+    Thread-safe, size-bounded in-process cache of (key -> value, expiry).
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class VersionedCache:
+    def __init__(self, namespace, timeout=300, local_size=256, alias='default'):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.alias = alias
+        self.local = LocalLRU(local_size)
+        self.version_key = f'{namespace}:version'
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def initial_version(self):
+        # Derived from the clock, so a version lost with an evicted key is
+        # never handed out again.
+        return time.time_ns()
+
+    def version(self):
+        version = self.shared.get(self.version_key)
+        if version is None:
+            self.shared.add(self.version_key, self.initial_version(), timeout=None)
+            version = self.shared.get(self.version_key)
+        return version
+
+    async def aversion(self):
+        version = await self.shared.aget(self.version_key)
+        if version is None:
+            await self.shared.aadd(self.version_key, self.initial_version(), timeout=None)
+            version = await self.shared.aget(self.version_key)
+        return version
+
+    def bump(self):
+        """
+        Orphan every entry of the namespace. Call through
+        transaction.on_commit(), so readers never cache pre-commit rows
+        under the new version.
+        """
+        try:
+            self.shared.incr(self.version_key)
+        except ValueError:
+            self.shared.add(self.version_key, self.initial_version(), timeout=None)
+        except Exception:
+            logger.exception("Could not bump the %s cache version", self.namespace)
+
+    def key(self, version, parts):
+        return ':'.join([self.namespace, str(version), *map(str, parts)])
+
+    def unavailable(self):
+        logger.warning("%s cache unavailable, reading through", self.namespace, exc_info=True)
+
+    def get_or_set(self, parts, compute):
+        """
+        Cached value for `parts`, or compute() stored under the current
+        version. A None result is returned but not cached.
+        """
+        try:
+            key = self.key(self.version(), parts)
+        except Exception:
+            self.unavailable()
+            return compute()
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        try:
+            value = self.shared.get(key)
+        except Exception:
+            self.unavailable()
+            return compute()
+        if value is None:
+            value = compute()
+            if value is None:
+                return None
+            try:
+                self.shared.set(key, value, self.timeout)
+            except Exception:
+                self.unavailable()
+                return value
+        self.local.set(key, value, self.timeout)
+        return value
+
+    async def aget_or_set(self, parts, compute):
+        """
+        get_or_set() for coroutine functions `compute`.
+        """
+        try:
+            key = self.key(await self.aversion(), parts)
+        except Exception:
+            self.unavailable()
+            return await compute()
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        try:
+            value = await self.shared.aget(key)
+        except Exception:
+            self.unavailable()
+            return await compute()
+        if value is None:
+            value = await compute()
+            if value is None:
+                return None
+            try:
+                await self.shared.aset(key, value, self.timeout)
+            except Exception:
+                self.unavailable()
+                return value
+        self.local.set(key, value, self.timeout)
+        return value
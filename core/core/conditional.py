@@ -0,0 +1,81 @@
+"""
+Conditional GET for APIViews.
+
+Validators are derived from `updated_at` columns rather than from the
+rendered body, so a request whose `If-None-Match` / `If-Modified-Since`
+still matches is answered with 304 after one cheap query and before any
+serialization:
+
+    version = list_version(Product.objects.all())
+    not_modified = conditional_response(request, version)
+    if not_modified:
+        return not_modified
+    ...
+    return with_validators(response, version)
+
+A list's ETag covers MAX(updated_at) and COUNT(*), so inserts, updates and
+deletes all change it. Lists get no Last-Modified, since a deletion does
+not move MAX(updated_at).
+"""
+import hashlib
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class Version:
+    def __init__(self, *parts, last_modified=None):
+        digest = hashlib.md5('|'.join(map(str, parts)).encode(), usedforsecurity=False)
+        self.etag = quote_etag(f'W/"{digest.hexdigest()}"')
+        self.last_modified = last_modified
+
+    def last_modified_timestamp(self):
+        if self.last_modified is None:
+            return None
+        return int(self.last_modified.timestamp())
+
+
+def _list_aggregates():
+    return {'latest': Max('updated_at'), 'count': Count('id')}
+
+
+def list_version(queryset, *parts):
+    row = queryset.order_by().aggregate(**_list_aggregates())
+    return Version(row['latest'], row['count'], *parts)
+
+
+async def alist_version(queryset, *parts):
+    row = await queryset.order_by().aaggregate(**_list_aggregates())
+    return Version(row['latest'], row['count'], *parts)
+
+
+def object_version(instance, *parts):
+    return Version(instance.pk, instance.updated_at, *parts, last_modified=instance.updated_at)
+
+
+def conditional_response(request, version, private=False):
+    """
+    304 (or 412) response if the request's preconditions match `version`,
+    otherwise None.
+    """
+    response = get_conditional_response(
+        request, etag=version.etag, last_modified=version.last_modified_timestamp()
+    )
+    if response is not None:
+        with_validators(response, version, private)
+    return response
+
+
+def with_validators(response, version, private=False):
+    """
+    Set ETag and Last-Modified on `response`, and ask clients to revalidate
+    before reusing it.
+    """
+    response['ETag'] = version.etag
+    if version.last_modified is not None:
+        response['Last-Modified'] = http_date(version.last_modified_timestamp())
+    if private:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
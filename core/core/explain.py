@@ -0,0 +1,95 @@
+"""
+EXPLAIN helpers for checking that list queries are served by the indexes
+declared for them.
+
+    with CaptureQueriesContext(connection) as queries:
+        self.client.get(url, {'status': 'PENDING'})
+    self.assertIndexOrdered(query_on(queries, Invoice), {'inv_pending_created_idx'})
+
+Sequential scans are disabled while planning, so a query that no index can
+serve still gets a Seq Scan and fails. Indexes on partitions are reported
+under the name of the partitioned index they belong to.
+"""
+import json
+from django.db import connection
+
+INDEX_SCANS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+SORTS = ('Sort', 'Incremental Sort')
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def parent_indexes(names):
+    """
+    Map each index in `names` to its top-level partitioned index, if any.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            WITH RECURSIVE ancestors AS (
+                SELECT c.oid, c.relname AS name, c.relname AS root
+                FROM pg_class c WHERE c.relname = ANY(%s)
+                UNION ALL
+                SELECT parent.oid, a.name, parent.relname
+                FROM ancestors a
+                JOIN pg_inherits i ON i.inhrelid = a.oid
+                JOIN pg_class parent ON parent.oid = i.inhparent
+            )
+            SELECT name, root
+            FROM ancestors a
+            WHERE NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = a.oid)
+        """, [sorted(names)])
+        return dict(cursor.fetchall())
+
+
+def explain(sql):
+    """
+    Plan nodes of `sql`, planned with sequential scans disabled, with
+    partition index names replaced by their parent index's.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SET enable_seqscan = off")
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute("RESET enable_seqscan")
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(plan_nodes(plan[0]['Plan']))
+    parents = parent_indexes({node['Index Name'] for node in nodes if 'Index Name' in node})
+    for node in nodes:
+        if 'Index Name' in node:
+            node['Index Name'] = parents.get(node['Index Name'], node['Index Name'])
+    return nodes
+
+
+def query_on(queries, model):
+    """
+    SQL of the first SELECT captured by `queries` that reads from `model`'s table.
+    """
+    table = f'FROM "{model._meta.db_table}"'
+    return next(
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].startswith('SELECT') and table in query['sql']
+    )
+
+
+class IndexUsageTestMixin:
+    def assertIndexOrdered(self, sql, any_of=()):
+        """
+        Fail unless `sql` is planned without sequential scans or sorts, i.e.
+        its rows come from an index in the requested order, and, if `any_of`
+        is given, through one of those indexes.
+        """
+        nodes = explain(sql)
+        sequential = [node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan']
+        self.assertFalse(sequential, f"Sequential scan on {', '.join(sequential)}:\n{sql}")
+        sorts = [node['Node Type'] for node in nodes if node['Node Type'] in SORTS]
+        self.assertFalse(sorts, f"Rows are sorted after the scan:\n{sql}")
+        if any_of:
+            used = {node['Index Name'] for node in nodes if node['Node Type'] in INDEX_SCANS}
+            self.assertTrue(used & set(any_of), f"Expected one of {sorted(any_of)}, plan uses {sorted(used)}:\n{sql}")
@@ -0,0 +1,124 @@
+"""
+Fast path for read-only list responses.
+
+FastSerializer compiles a DRF serializer's readable fields once per request
+into `(name, lookup, converter)` triples, selects only the needed columns
+with `values()`, and builds each output dict directly from the row. The
+converters reproduce DRF's `to_representation` for the field types used by
+the list endpoints, so the rendered JSON is byte-identical to the
+serializer's; any other field type raises UnsupportedField when compiled.
+"""
+import decimal
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+
+class UnsupportedField(TypeError):
+    pass
+
+
+def _identity(value):
+    return value
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.normalize_output or field.localize or field.decimal_places is None:
+        raise UnsupportedField(field.field_name)
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+
+    if coerce_to_string:
+        return lambda value: format(value.quantize(exponent, rounding=rounding), 'f')
+    return lambda value: value.quantize(exponent, rounding=rounding)
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        raise UnsupportedField(field.field_name)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        raise UnsupportedField(field.field_name)
+
+    def convert(value):
+        if timezone.is_aware(value):
+            value = value.astimezone(field_timezone)
+        else:
+            value = timezone.make_aware(value, field_timezone)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _file_converter(field, model_field):
+    request = field.context.get('request')
+    storage = model_field.storage
+    if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+        return lambda name: name or None
+
+    def convert(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+def compile_field(field, model):
+    if field.source == '*' or isinstance(field, serializers.BaseSerializer):
+        raise UnsupportedField(field.field_name)
+    lookup = '__'.join(field.source_attrs)
+    if isinstance(field, serializers.DecimalField):
+        return lookup, _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return lookup, _datetime_converter(field)
+    if isinstance(field, serializers.FileField) and model is not None:
+        return lookup, _file_converter(field, model._meta.get_field(field.source))
+    if isinstance(field, (serializers.IntegerField, serializers.CharField,
+                          serializers.ChoiceField, serializers.BooleanField)):
+        return lookup, _identity
+    raise UnsupportedField(field.field_name)
+
+
+class FastSerializer:
+    """
+    Read-only list rendering for `serializer` (a DRF serializer instance,
+    with its context) from `values()` rows.
+
+    `fields` limits the output to those names. `attached` names fields the
+    caller fills in itself, e.g. nested lists fetched with a second query:
+    they are passed through from the row, in the serializer's field order.
+    """
+    def __init__(self, serializer, fields=None, attached=()):
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        self.fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if name in attached:
+                self.fields.append((name, name, _identity))
+            else:
+                self.fields.append((name, *compile_field(field, model)))
+        self.columns = tuple(dict.fromkeys(
+            lookup for name, lookup, convert in self.fields if name not in attached
+        ))
+
+    def values(self, queryset, *extra):
+        """
+        `queryset` reduced to the columns needed, plus `extra` columns.
+        """
+        return queryset.values(*dict.fromkeys(self.columns + extra))
+
+    def to_representation(self, rows):
+        fields = self.fields
+        return [
+            {
+                name: None if (value := row[lookup]) is None else convert(value)
+                for name, lookup, convert in fields
+            }
+            for row in rows
+        ]
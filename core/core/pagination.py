@@ -0,0 +1,98 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPagination:
+    """
+    Cursor pagination over a descending (ordering_field, id) key.
+
+    Pages are fetched with `ordering_field <= value AND (ordering_field < value
+    OR id < pk)` instead of an OFFSET, so a composite index on
+    (..., ordering_field, id) turns every page into an index range scan no
+    matter how deep the client has paged. The cursor is an opaque,
+    url-safe token encoding the last row of the previous page.
+    """
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, ordering_field):
+        self.ordering_field = ordering_field
+        self.current_page_size = self.page_size
+        self.next_cursor = None
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, instance):
+        # Rows may be model instances or values() dicts.
+        if isinstance(instance, dict):
+            value, pk = instance[self.ordering_field], instance['id']
+        else:
+            value, pk = getattr(instance, self.ordering_field), instance.pk
+        position = [value.isoformat(), pk]
+        token = base64.urlsafe_b64encode(json.dumps(position).encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (binascii.Error, ValueError, TypeError):
+            raise InvalidCursor(token)
+        if value is None:
+            raise InvalidCursor(token)
+        return value, pk
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Return the queryset of the requested page plus one look-ahead row.
+        Raises InvalidCursor if the client sent a malformed cursor.
+        """
+        self.current_page_size = self.get_page_size(request)
+        field = self.ordering_field
+        queryset = queryset.order_by(f'-{field}', '-id')
+
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            value, pk = self.decode_cursor(token)
+            queryset = queryset.filter(
+                Q(**{f'{field}__lte': value}),
+                Q(**{f'{field}__lt': value}) | Q(id__lt=pk),
+            )
+        return queryset[:self.current_page_size + 1]
+
+    def get_page(self, rows):
+        page = rows[:self.current_page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > self.current_page_size else None
+        return page
+
+    def paginate_queryset(self, queryset, request):
+        """
+        Return the rows of the requested page and set `next_cursor`.
+        Raises InvalidCursor if the client sent a malformed cursor.
+        """
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async version of paginate_queryset().
+        """
+        return self.get_page([row async for row in self.get_page_queryset(queryset, request)])
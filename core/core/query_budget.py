@@ -0,0 +1,114 @@
+"""
+Per-view query budgets.
+
+A view declares the most database queries one request may issue, per HTTP
+method, as a constant that must not grow with the size of the result:
+
+    class TransactionListView(APIView):
+        query_budgets = {'GET': 2}
+
+QueryBudgetTestMixin enforces the budgets in the test suite, and
+QueryBudgetMiddleware checks them at runtime when QUERY_BUDGET_MODE is
+'log' (log a warning) or 'reject' (fail the request as soon as it issues
+one query too many). With the default 'off' the middleware removes itself.
+"""
+import logging
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(APIException):
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    default_detail = "Query budget exceeded."
+    default_code = 'query_budget_exceeded'
+
+
+def get_query_budget(view, method):
+    """
+    Budget of `view` (a view class or the function returned by as_view())
+    for `method`, or None if it declares none.
+    """
+    view_class = getattr(view, 'view_class', view)
+    return getattr(view_class, 'query_budgets', {}).get(method.upper())
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts queries and, when `reject` is set,
+    raises QueryBudgetExceeded on the first query over `budget`.
+    """
+    def __init__(self, reject=False):
+        self.reject = reject
+        self.budget = None
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        if self.reject and self.budget is not None and self.count > self.budget:
+            raise QueryBudgetExceeded(f"Query budget of {self.budget} exceeded.")
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.mode = settings.QUERY_BUDGET_MODE
+        if self.mode not in ('log', 'reject'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter(reject=self.mode == 'reject')
+        request.query_counter = counter
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        if counter.budget is not None and counter.count > counter.budget:
+            logger.warning(
+                "%s %s issued %d queries, budget is %d",
+                request.method, request.path, counter.count, counter.budget
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_counter.budget = get_query_budget(view_func, request.method)
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin asserting that endpoints stay within their query budgets.
+    """
+    def assertWithinQueryBudget(self, url, data=None):
+        """
+        GET `url` and assert it succeeds within its view's budget.
+        Returns the number of queries issued.
+        """
+        budget = get_query_budget(resolve(url).func, 'GET')
+        self.assertIsNotNone(budget, f"{url} declares no GET query budget.")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{url} issued {len(queries)} queries, budget is {budget}:\n"
+            + "\n".join(query['sql'] for query in queries.captured_queries)
+        )
+        return len(queries)
+
+    def assertConstantQueryBudget(self, url, add_rows, data=None):
+        """
+        Assert `url` stays within budget and issues the same number of
+        queries with 1 and with 100 rows, created by calling `add_rows(n)`.
+        """
+        add_rows(1)
+        single = self.assertWithinQueryBudget(url, data)
+        add_rows(99)
+        hundred = self.assertWithinQueryBudget(url, data)
+        self.assertEqual(single, hundred, f"{url} issues queries per row.")
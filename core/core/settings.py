@@ -61,6 +61,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -119,7 +120,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.AsyncJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -176,6 +177,21 @@ AWS_DEFAULT_ACL = os.getenv('AWS_DEFAULT_ACL', None)
 
 MEDIA_URL = f'{AWS_S3_ENDPOINT_URL}/{AWS_STORAGE_BUCKET_NAME}/'
 
+# Lifetime (seconds) of the signed product image URLs in `signed_image_url`,
+# the least a URL may have left when it is handed out, and signatures kept
+# per process.
+PRODUCT_IMAGE_URL_EXPIRES = int(os.getenv('PRODUCT_IMAGE_URL_EXPIRES', 3600))
+PRODUCT_IMAGE_URL_MIN_TTL = int(os.getenv('PRODUCT_IMAGE_URL_MIN_TTL', 300))
+PRODUCT_IMAGE_URL_CACHE_SIZE = int(os.getenv('PRODUCT_IMAGE_URL_CACHE_SIZE', 10000))
+
+# Resized variants rendered for every product image by
+# `manage.py process_product_images`: longest edges (px), formats (webp,
+# jpeg), encoder quality and worker processes.
+PRODUCT_IMAGE_SIZES = [int(size) for size in os.getenv('PRODUCT_IMAGE_SIZES', '200,800').split(',')]
+PRODUCT_IMAGE_FORMATS = os.getenv('PRODUCT_IMAGE_FORMATS', 'webp,jpeg').split(',')
+PRODUCT_IMAGE_QUALITY = int(os.getenv('PRODUCT_IMAGE_QUALITY', 80))
+PRODUCT_IMAGE_WORKERS = int(os.getenv('PRODUCT_IMAGE_WORKERS', os.cpu_count() or 1))
+
 
 ASGI_APPLICATION = 'core.asgi.application'
 
@@ -186,4 +202,37 @@ CHANNEL_LAYERS = {
             "hosts": [(os.getenv("REDIS_HOST","127.0.0.1"), os.getenv("REDIS_PORT",6379))],
         },
     },
-}
\ No newline at end of file
+}
+
+# Shared cache behind the in-process LRUs of core/cache.py (product catalog).
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.redis.RedisCache"),
+        "LOCATION": os.getenv(
+            "CACHE_LOCATION",
+            f"redis://{os.getenv('REDIS_HOST', '127.0.0.1')}:{os.getenv('REDIS_PORT', 6379)}/1"
+        ),
+    },
+}
+# Seconds a catalog entry may live without a product write, and entries
+# kept per process.
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 300))
+CATALOG_CACHE_LOCAL_SIZE = int(os.getenv("CATALOG_CACHE_LOCAL_SIZE", 1024))
+
+# Window (seconds) and size limit for `?delivery=batch` WebSocket clients.
+TRANSACTION_WS_BATCH_WINDOW = float(os.getenv("TRANSACTION_WS_BATCH_WINDOW", 0.25))
+TRANSACTION_WS_BATCH_MAX_EVENTS = int(os.getenv("TRANSACTION_WS_BATCH_MAX_EVENTS", 500))
+
+# Per-user replay log used to resend missed events to reconnecting WebSocket clients.
+TRANSACTION_REPLAY_BUFFER = {
+    "BACKEND": "transactions.replay.RedisReplayBuffer",
+    "OPTIONS": {
+        "size": int(os.getenv("TRANSACTION_REPLAY_SIZE", 1000)),
+        "host": os.getenv("REDIS_HOST", "127.0.0.1"),
+        "port": os.getenv("REDIS_PORT", 6379),
+    },
+}
+
+# Runtime enforcement of per-view query budgets (core/query_budget.py):
+# 'off', 'log' or 'reject'. Meant for staging.
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
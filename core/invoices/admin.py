@@ -1,9 +1,23 @@
 from django.contrib import admin
-from .models import Invoice
+from .models import Invoice, InvoiceItem
+from .totals import recalculate_totals
+
+
+class InvoiceItemInline(admin.TabularInline):
+    model = InvoiceItem
+    fields = ('product', 'quantity', 'product_name', 'unit_price', 'line_total')
+    readonly_fields = ('line_total',)
+    raw_id_fields = ('product',)
+    extra = 0
+
 
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'total_amount', 'status', 'created_at', 'updated_at')
+    list_display = ('id', 'user', 'total_amount', 'amount_paid', 'status', 'payment_status', 'created_at', 'updated_at')
     search_fields = ('user__username', 'products__name')
-    list_filter = ('status', 'created_at', 'updated_at')
-    filter_horizontal = ('products',)
+    list_filter = ('status', 'payment_status', 'created_at', 'updated_at')
+    inlines = [InvoiceItemInline]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recalculate_totals([form.instance.pk])
@@ -0,0 +1,343 @@
+"""
+Bulk invoice import through PostgreSQL COPY.
+
+The input has one row per invoice line: `ref` groups the rows of one
+invoice, `user` is the owner's id, `status` is optional (PENDING), and
+`product` / `quantity` (default 1) add a line item; a row without a product
+creates an invoice without lines. CSV input needs a header naming its
+columns and is passed to COPY as is. NDJSON input has one invoice per
+line, shaped like the create API body plus `ref` and `user`:
+
+    {"ref": "A-1", "user": 7, "products": [1, 2], "items": [{"product": 3, "quantity": 2}]}
+
+Both formats are parsed in Python into fixed-width rows, so a CSV row with
+the wrong number of fields or a line that is not valid UTF-8 is reported
+like any other error. Rows are copied into a temporary staging table as
+text and every check (ids, existing users and products, quantities,
+statuses, conflicting rows of the same ref, quantity and total overflow)
+runs as set-based SQL. Invoices with an error in
+any of their rows are skipped and reported; all others are inserted, with
+their line items and totals, in the same transaction, and the owners'
+account summaries are updated with one delta per user.
+"""
+import csv
+import io
+import json
+import logging
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from accounts.summaries import apply_deltas
+from core.streaming import Echo
+from products.models import Product
+from .models import MAX_QUANTITY, MAX_TOTAL, Invoice, InvoiceItem
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+CSV_COLUMNS = {
+    'ref': 'ref',
+    'user': 'user_id',
+    'status': 'status',
+    'product': 'product_id',
+    'quantity': 'quantity',
+}
+STAGING_COLUMNS = ['row', 'ref', 'user_id', 'status', 'product_id', 'quantity']
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class IteratorFile(io.TextIOBase):
+    """
+    Read-only file over an iterator of strings, for COPY FROM STDIN.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self.buffer = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+def _text(file):
+    if isinstance(file, io.TextIOBase):
+        return file
+    # Undecodable bytes become U+FFFD and their row is rejected.
+    return io.TextIOWrapper(file, encoding='utf-8', errors='replace', newline='')
+
+
+def _invalid_text(value):
+    # PostgreSQL text cannot hold NUL either.
+    return '\ufffd' in value or '\x00' in value
+
+
+def _csv_header(file):
+    header = next(csv.reader([file.readline().lstrip('\ufeff')]), [])
+    columns = [name.strip().lower() for name in header]
+    unknown = [name for name in columns if name not in CSV_COLUMNS]
+    if unknown or len(set(columns)) != len(columns):
+        raise ImportFormatError(f"Unsupported or repeated CSV columns: {', '.join(unknown) or header}.")
+    if not {'ref', 'user'} <= set(columns):
+        raise ImportFormatError("The CSV header must include the ref and user columns.")
+    return [CSV_COLUMNS[name] for name in columns]
+
+
+def _row_ref(values, columns):
+    """
+    The ref of a rejected CSV row as it would have been staged, so the rest
+    of its invoice is rejected too; None if the row has no readable ref.
+    """
+    index = columns.index('ref')
+    if index >= len(values) or _invalid_text(values[index]):
+        return None
+    return values[index].strip(' ') or None
+
+
+def _csv_rows(file, columns, errors):
+    """
+    CSV rows in `columns` order as fixed-width staging rows; rows with the
+    wrong number of fields or invalid text are added to `errors` instead.
+    """
+    writer = csv.writer(Echo())
+    positions = [columns.index(column) if column in columns else None for column in STAGING_COLUMNS[1:]]
+    for number, values in enumerate(csv.reader(file), start=1):
+        if not values:
+            continue
+        if len(values) != len(columns):
+            error = f"Expected {len(columns)} fields, got {len(values)}."
+            errors.append((number, _row_ref(values, columns), error))
+            continue
+        if any(_invalid_text(value) for value in values):
+            errors.append((number, _row_ref(values, columns), "Not valid UTF-8 text."))
+            continue
+        yield writer.writerow([number, *(None if i is None else values[i] for i in positions)])
+
+
+def _ndjson_rows(file, errors):
+    """
+    Flatten NDJSON invoices into CSV staging rows; lines that are not JSON
+    objects are added to `errors` instead.
+    """
+    writer = csv.writer(Echo())
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        if _invalid_text(line):
+            errors.append((number, None, "Not valid UTF-8 text."))
+            continue
+        try:
+            document = json.loads(line)
+            if not isinstance(document, dict):
+                raise ValueError
+            items = [{'product': product} for product in document.get('products') or []]
+            items += document.get('items') or []
+            lines = [(item.get('product'), item.get('quantity')) for item in items] or [(None, None)]
+        except (ValueError, TypeError, AttributeError):
+            errors.append((number, None, "Not a JSON invoice object."))
+            continue
+        for product, quantity in lines:
+            yield writer.writerow([
+                number, document.get('ref'), document.get('user'), document.get('status'), product, quantity
+            ])
+
+
+def _copy(cursor, table, file, output, parse_errors):
+    if output == 'csv':
+        rows = _csv_rows(file, _csv_header(file), parse_errors)
+    else:
+        rows = _ndjson_rows(file, parse_errors)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", IteratorFile(rows)
+    )
+
+
+def import_invoices(file, output):
+    """
+    Import invoices from `file` (binary or text) in `output` format, 'csv' or
+    'ndjson'. Raises ImportFormatError if the input cannot be read at all or
+    the import fails in the database, in which case nothing is imported.
+
+    Returns a summary with the number of rows read, invoices and line items
+    created, invoices rejected and the first MAX_REPORTED_ERRORS row errors.
+    """
+    try:
+        return _import(file, output)
+    except DatabaseError as error:
+        # Every row error is caught by the checks; anything left is a bug
+        # or an outage, and nothing was imported.
+        logger.exception("Invoice import failed")
+        raise ImportFormatError("The file could not be imported; nothing was saved.") from error
+
+
+def _import(file, output):
+    if output not in IMPORT_FORMATS:
+        raise ImportFormatError(f"Unsupported format: {output}.")
+    file = _text(file)
+    tables = {
+        'invoices': Invoice._meta.db_table,
+        'items': InvoiceItem._meta.db_table,
+        'products': Product._meta.db_table,
+        'users': get_user_model()._meta.db_table,
+    }
+    statuses = [choice for choice, _ in Invoice.STATUS_CHOICES]
+    parse_errors = []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TEMP TABLE invoice_import_rows (
+                row bigint, ref text, user_id text, status text, product_id text, quantity text
+            ) ON COMMIT DROP
+        """)
+        _copy(cursor, 'invoice_import_rows', file, output, parse_errors)
+
+        # Casts are guarded by CASE so a malformed value becomes NULL
+        # instead of failing the statement.
+        cursor.execute(r"""
+            CREATE TEMP TABLE invoice_import_lines ON COMMIT DROP AS
+            SELECT row,
+                NULLIF(btrim(ref), '') AS ref,
+                CASE WHEN btrim(user_id) ~ '^\d{1,18}$' THEN btrim(user_id)::bigint END AS user_id,
+                COALESCE(NULLIF(btrim(status), ''), 'PENDING') AS status,
+                NULLIF(btrim(product_id), '') AS raw_product_id,
+                CASE WHEN btrim(product_id) ~ '^\d{1,18}$' THEN btrim(product_id)::bigint END AS product_id,
+                CASE
+                    WHEN NULLIF(btrim(quantity), '') IS NULL THEN 1
+                    WHEN btrim(quantity) ~ '^\d{1,9}$' THEN btrim(quantity)::integer
+                END AS quantity
+            FROM invoice_import_rows
+        """)
+        # Temporary tables are not analyzed automatically.
+        cursor.execute("ANALYZE invoice_import_lines")
+        cursor.execute("""
+            CREATE TEMP TABLE invoice_import_errors (row bigint, ref text, error text) ON COMMIT DROP
+        """)
+        if parse_errors:
+            cursor.executemany(
+                "INSERT INTO invoice_import_errors (row, ref, error) VALUES (%s, %s, %s)", parse_errors
+            )
+        cursor.execute(f"""
+            INSERT INTO invoice_import_errors (row, ref, error)
+            SELECT l.row, l.ref, checks.error
+            FROM invoice_import_lines l
+            LEFT JOIN {tables['users']} u ON u.id = l.user_id
+            LEFT JOIN {tables['products']} p ON p.id = l.product_id
+            CROSS JOIN LATERAL (VALUES
+                (CASE WHEN l.ref IS NULL THEN 'Missing ref.' END),
+                (CASE
+                    WHEN l.user_id IS NULL THEN 'Invalid user id.'
+                    WHEN u.id IS NULL THEN 'User does not exist.'
+                END),
+                (CASE
+                    WHEN l.raw_product_id IS NOT NULL AND l.product_id IS NULL THEN 'Invalid product id.'
+                    WHEN l.product_id IS NOT NULL AND p.id IS NULL THEN 'Product does not exist.'
+                END),
+                (CASE WHEN l.quantity IS NULL OR l.quantity < 1 THEN 'Quantity must be a positive integer.' END),
+                (CASE WHEN l.status <> ALL(%s) THEN 'Invalid status.' END)
+            ) AS checks(error)
+            WHERE checks.error IS NOT NULL
+        """, [statuses])
+        cursor.execute(f"""
+            INSERT INTO invoice_import_errors (row, ref, error)
+            SELECT min(l.row), l.ref, 'Rows of this ref disagree on user or status.'
+            FROM invoice_import_lines l
+            WHERE l.ref IS NOT NULL
+            GROUP BY l.ref
+            HAVING count(DISTINCT l.user_id) > 1 OR count(DISTINCT l.status) > 1
+            UNION ALL
+            SELECT min(l.row), l.ref, 'Quantity of a product exceeds {MAX_QUANTITY}.'
+            FROM invoice_import_lines l
+            WHERE l.ref IS NOT NULL AND l.product_id IS NOT NULL
+            GROUP BY l.ref, l.product_id
+            HAVING sum(l.quantity::bigint) > {MAX_QUANTITY}
+            UNION ALL
+            SELECT min(l.row), l.ref, 'Invoice total exceeds {MAX_TOTAL}.'
+            FROM invoice_import_lines l
+            JOIN {tables['products']} p ON p.id = l.product_id
+            WHERE l.ref IS NOT NULL
+            GROUP BY l.ref
+            HAVING sum(l.quantity::numeric * p.price) > {MAX_TOTAL}
+        """)
+
+        # Invoice ids are drawn from the sequence up front, in input order,
+        # so line items can be joined to their invoice by ref.
+        cursor.execute("""
+            CREATE TEMP TABLE invoice_import_refs ON COMMIT DROP AS
+            SELECT ref, user_id, status, nextval(pg_get_serial_sequence(%s, 'id')) AS invoice_id
+            FROM (
+                SELECT l.ref, min(l.user_id) AS user_id, min(l.status) AS status
+                FROM invoice_import_lines l
+                WHERE l.ref IS NOT NULL
+                  AND l.ref NOT IN (SELECT ref FROM invoice_import_errors WHERE ref IS NOT NULL)
+                GROUP BY l.ref
+                ORDER BY min(l.row)
+            ) valid
+        """, [tables['invoices']])
+        now = timezone.now()
+        cursor.execute(f"""
+            INSERT INTO {tables['invoices']}
+                (id, user_id, status, total_amount, amount_paid, payment_status, created_at, updated_at)
+            SELECT r.invoice_id, r.user_id, r.status, COALESCE(totals.total, 0), 0, 'UNPAID', %s, %s
+            FROM invoice_import_refs r
+            LEFT JOIN (
+                SELECT l.ref, sum(l.quantity * p.price) AS total
+                FROM invoice_import_lines l JOIN {tables['products']} p ON p.id = l.product_id
+                GROUP BY l.ref
+            ) totals ON totals.ref = r.ref
+            ORDER BY r.invoice_id
+        """, [now, now])
+        invoice_count = cursor.rowcount
+        cursor.execute(f"""
+            SELECT i.user_id, sum(i.total_amount), count(*)
+            FROM {tables['invoices']} i JOIN invoice_import_refs r ON r.invoice_id = i.id
+            WHERE i.status = 'PENDING'
+            GROUP BY i.user_id
+        """)
+        apply_deltas({
+            user_id: [open_balance, pending_invoices, 0]
+            for user_id, open_balance, pending_invoices in cursor.fetchall()
+        })
+        cursor.execute(f"""
+            INSERT INTO {tables['items']} (invoice_id, product_id, quantity, product_name, unit_price)
+            SELECT r.invoice_id, p.id, sum(l.quantity), p.name, p.price
+            FROM invoice_import_lines l
+            JOIN invoice_import_refs r ON r.ref = l.ref
+            JOIN {tables['products']} p ON p.id = l.product_id
+            GROUP BY r.invoice_id, p.id, p.name, p.price
+            ORDER BY r.invoice_id, p.id
+        """)
+        item_count = cursor.rowcount
+
+        cursor.execute("""
+            SELECT (SELECT count(DISTINCT row) FROM invoice_import_rows),
+                (SELECT count(*) FROM invoice_import_errors),
+                (SELECT count(DISTINCT ref) FROM invoice_import_errors)
+        """)
+        row_count, error_count, rejected_count = cursor.fetchone()
+        row_count += len(parse_errors)
+        cursor.execute("""
+            SELECT row, ref, error FROM invoice_import_errors ORDER BY row, error LIMIT %s
+        """, [MAX_REPORTED_ERRORS])
+        errors = [{'row': row, 'ref': ref, 'error': error} for row, ref, error in cursor.fetchall()]
+
+    return {
+        'rows': row_count,
+        'invoices': invoice_count,
+        'items': item_count,
+        'rejected_invoices': rejected_count,
+        'error_count': error_count,
+        'errors': errors,
+    }
@@ -0,0 +1,47 @@
+import statistics
+import time
+import uuid
+from types import SimpleNamespace
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from invoices.serializers import InvoiceSerializer
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Time invoice creation through InvoiceSerializer for growing numbers of products."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        sizes, repeat = options['sizes'], options['repeat']
+        user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}')
+        products = Product.objects.bulk_create(
+            Product(name=f'bench-{i}', description='', price=1) for i in range(max(sizes))
+        )
+        product_ids = [product.id for product in products]
+        request = SimpleNamespace(user=user)
+        try:
+            for size in sizes:
+                timings = []
+                for _ in range(repeat):
+                    serializer = InvoiceSerializer(
+                        data={'products': product_ids[:size]}, context={'request': request}
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        invoice = serializer.save()
+                        timings.append(time.perf_counter() - started)
+                    assert invoice.total_amount == size
+                self.stdout.write(
+                    f"products={size:<6} median={statistics.median(timings) * 1000:8.2f}ms "
+                    f"max={max(timings) * 1000:8.2f}ms queries={len(queries)}"
+                )
+        finally:
+            user.delete()
+            Product.objects.filter(id__in=product_ids).delete()
@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from invoices.imports import IMPORT_FORMATS, ImportFormatError, import_invoices
+
+
+class Command(BaseCommand):
+    help = (
+        "Import invoices and their line items from a CSV or NDJSON file (or - for "
+        "stdin) with COPY. Invalid rows are reported; the rest is imported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=IMPORT_FORMATS, dest='output',
+            help="Input format; guessed from the file extension by default."
+        )
+
+    def handle(self, *args, **options):
+        path, output = options['path'], options['output']
+        if output is None:
+            output = Path(path).suffix.lstrip('.').lower()
+            if output not in IMPORT_FORMATS:
+                raise CommandError("Cannot guess the format from the file name; pass --format.")
+
+        try:
+            if path == '-':
+                summary = import_invoices(sys.stdin.buffer, output)
+            else:
+                with open(path, 'rb') as file:
+                    summary = import_invoices(file, output)
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(str(error))
+
+        for error in summary['errors']:
+            self.stderr.write(f"row {error['row']} ref={error['ref']}: {error['error']}")
+        if summary['error_count'] > len(summary['errors']):
+            self.stderr.write(f"... {summary['error_count'] - len(summary['errors'])} more errors")
+        self.stdout.write(
+            f"rows={summary['rows']} invoices={summary['invoices']} items={summary['items']} "
+            f"rejected_invoices={summary['rejected_invoices']} errors={summary['error_count']}"
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:08
+
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='payment_status',
+            field=models.CharField(choices=[('UNPAID', 'Unpaid'), ('UNDERPAID', 'Underpaid'), ('PAID', 'Paid'), ('OVERPAID', 'Overpaid')], default='UNPAID', editable=False, max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))]),
+        ),
+    ]
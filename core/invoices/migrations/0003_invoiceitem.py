@@ -0,0 +1,73 @@
+import django.core.validators
+import django.db.models.deletion
+import django.db.models.expressions
+from decimal import Decimal
+from django.db import migrations, models
+
+
+# The existing auto-created m2m table becomes the InvoiceItem table, so no
+# rows are copied; the snapshot columns are added and backfilled in place.
+BACKFILL_SNAPSHOT_SQL = """
+UPDATE invoices_invoiceitem AS item
+SET product_name = p.name, unit_price = p.price
+FROM products_product AS p
+WHERE p.id = item.product_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0002_invoice_payment_status'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE invoices_invoice_products RENAME TO invoices_invoiceitem',
+                    'ALTER TABLE invoices_invoiceitem RENAME TO invoices_invoice_products',
+                ),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='InvoiceItem',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='invoices.invoice')),
+                        ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoice_items', to='products.product')),
+                    ],
+                    options={
+                        'unique_together': {('invoice', 'product')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='invoice',
+                    name='products',
+                    field=models.ManyToManyField(related_name='invoices', through='invoices.InvoiceItem', to='products.product'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))]),
+        ),
+        migrations.RunSQL(BACKFILL_SNAPSHOT_SQL, migrations.RunSQL.noop),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='line_total',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('quantity'), '*', models.F('unit_price')), output_field=models.DecimalField(decimal_places=2, max_digits=12)),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_invoice_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='invoiceitem',
+            options={'ordering': ['id']},
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0005_invoiceitem_ordering'),
+        ('products', '0002_alter_product_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='inv_user_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-created_at', '-id'], name='inv_pending_created_idx'),
+        ),
+    ]
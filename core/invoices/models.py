@@ -4,31 +4,101 @@ from django.conf import settings
 from products.models import Product
 from django.core.validators import MinValueValidator
 
+# Largest line item quantity (an integer column) and invoice total
+# (max_digits=10) the database accepts.
+MAX_QUANTITY = 2147483647
+MAX_TOTAL = Decimal('99999999.99')
+
 class Invoice(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
         ('PAID', 'Paid'),
         ('CANCELLED', 'Cancelled'),
     ]
+    PAYMENT_STATUS_CHOICES = [
+        ('UNPAID', 'Unpaid'),
+        ('UNDERPAID', 'Underpaid'),
+        ('PAID', 'Paid'),
+        ('OVERPAID', 'Overpaid'),
+    ]
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name='invoices'
     )
-    products = models.ManyToManyField(Product, related_name='invoices')
+    products = models.ManyToManyField(Product, through='InvoiceItem', related_name='invoices')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, validators=[MinValueValidator(Decimal('0.00'))])
     status = models.CharField(
         max_length=10,
         choices=STATUS_CHOICES,
         default='PENDING'
     )
+    # Maintained by transactions.reconciliation from the invoice's COMPLETED
+    # transactions; never written by the API.
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), editable=False)
+    payment_status = models.CharField(
+        max_length=10,
+        choices=PAYMENT_STATUS_CHOICES,
+        default='UNPAID',
+        editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='inv_user_created_id_idx'),
+            models.Index(fields=['-created_at', '-id'], name='inv_created_id_idx'),
+            # List filters: status within one user's history, and the
+            # staff-wide queue of invoices still awaiting payment.
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='inv_user_status_created_idx'),
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='inv_pending_created_idx',
+                condition=models.Q(status='PENDING')
+            ),
+        ]
     
     def __str__(self):
         return f"Invoice #{self.pk} - {self.user.username}"
     
     def calculate_total_amount(self):
-        self.total_amount = sum(product.price for product in self.products.all())
-        self.save()
+        """
+        Recompute total_amount from the linked products in one UPDATE. Totals
+        are normally kept current by invoices.signals; this repairs drift.
+        """
+        from .totals import recalculate_totals
+        self.total_amount, self.updated_at = recalculate_totals([self.pk])[self.pk]
+
+
+class InvoiceItem(models.Model):
+    """
+    One product line of an invoice. The product's name and price are copied
+    when the line is created, so invoices keep their amounts and can be
+    rendered without reading the products table.
+    """
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='invoice_items')
+    quantity = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    # Filled in from the product by InvoiceSerializer, or by invoices.signals
+    # for links made through Invoice.products.
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    unit_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        validators=[MinValueValidator(Decimal('0.00'))]
+    )
+    line_total = models.GeneratedField(
+        expression=models.F('quantity') * models.F('unit_price'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True
+    )
+
+    class Meta:
+        ordering = ['id']
+        unique_together = [('invoice', 'product')]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} on Invoice #{self.invoice_id}"
@@ -5,4 +5,4 @@ class IsOwnerOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user and request.user.is_staff:
             return True
-        return obj.user == request.user
+        return obj.user_id == request.user.id
@@ -1,12 +1,34 @@
+from django.db import transaction
 from rest_framework import serializers
+from core.filters import QueryFilterSerializer
 from products.models import Product
-from .models import Invoice
+from transactions.cancellation import fail_pending_transactions
+from .imports import IMPORT_FORMATS
+from .models import MAX_QUANTITY, MAX_TOTAL, Invoice, InvoiceItem
+from .totals import recalculate_totals
+
+
+class InvoiceItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    name = serializers.CharField(source='product_name', read_only=True)
+    price = serializers.DecimalField(source='unit_price', max_digits=10, decimal_places=2, read_only=True)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = InvoiceItem
+        fields = ('id', 'name', 'price', 'quantity', 'line_total')
+
+
+class InvoiceItemWriteSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY, default=1)
 
-from products.serializers import ProductSerializer
 
 class InvoiceSerializer(serializers.Serializer):
     id = serializers.IntegerField(read_only=True)
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    amount_paid = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    payment_status = serializers.CharField(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
     updated_at = serializers.DateTimeField(read_only=True)
     products_info = serializers.SerializerMethodField(read_only=True)
@@ -15,50 +37,135 @@ class InvoiceSerializer(serializers.Serializer):
         write_only=True,
         required=False
     )
+    items = InvoiceItemWriteSerializer(many=True, write_only=True, required=False)
     status = serializers.CharField(required=False)
 
     user_id = serializers.IntegerField(read_only=True)
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-
-        data['user_id'] = instance.user.id
-
-        return data
-
-    def get_products_info(self, instance) -> ProductSerializer:
-        serializer = ProductSerializer(instance.products.all(), many=True)
+    def get_products_info(self, instance) -> InvoiceItemSerializer(many=True):
+        # Rendered from the line item snapshots; the products table is not read.
+        serializer = InvoiceItemSerializer(instance.items.all(), many=True)
         return serializer.data
 
     def create(self, validated_data):
+        """
+        Insert the invoice and all of its line items with one bulk_create and
+        add up the total in the database, so the number of queries does not
+        depend on how many products the invoice has.
+        """
         request = self.context['request'] 
         user = request.user
 
-        product_ids = validated_data.pop('products', [])
+        lines = validated_data.get('lines', [])
         status_value = validated_data.get('status', 'PENDING')
 
-        invoice = Invoice.objects.create(
-            user=user,
-            status=status_value
-        )
-
-        products = Product.objects.filter(id__in=product_ids)
-        invoice.products.set(products)
-        invoice.calculate_total_amount()
-        invoice.save()
+        with transaction.atomic():
+            invoice = Invoice.objects.create(
+                user=user,
+                status=status_value
+            )
+            self.write_items(invoice, lines)
 
         return invoice
 
     def update(self, instance, validated_data):
-        product_ids = validated_data.pop('products', None)
+        lines = validated_data.get('lines')
         status_value = validated_data.get('status', None)
 
-        if status_value is not None:
-            instance.status = status_value
+        with transaction.atomic():
+            if lines is not None:
+                instance.items.all().delete()
+                self.write_items(instance, lines)
+            if status_value is not None and status_value != instance.status:
+                instance.status = status_value
+                instance.save(update_fields=['status', 'updated_at'])
+                if status_value == 'CANCELLED':
+                    fail_pending_transactions([instance.pk])
+        return instance
+
+    def requested_quantities(self, validated_data):
+        """
+        Merge `products` (quantity 1 each) and `items` into {product_id: quantity},
+        or None if neither was sent.
+        """
+        product_ids = validated_data.pop('products', None)
+        items = validated_data.pop('items', None)
+        if product_ids is None and items is None:
+            return None
+        quantities = dict.fromkeys(product_ids or [], 1)
+        for item in items or []:
+            quantities[item['product']] = quantities.get(item['product'], 0) + item['quantity']
+        return quantities
+
+    def validate(self, attrs):
+        """
+        Resolve `products` and `items` into the invoice's lines,
+        (product_id, name, price, quantity), and reject invoices whose
+        quantities or total the database cannot store.
+        """
+        quantities = self.requested_quantities(attrs)
+        if quantities is None:
+            return attrs
+        if any(quantity > MAX_QUANTITY for quantity in quantities.values()):
+            raise serializers.ValidationError({'items': f"A product's quantity cannot exceed {MAX_QUANTITY}."})
+        # Unknown product ids are ignored, as before.
+        products = Product.objects.filter(id__in=quantities).values_list('id', 'name', 'price')
+        attrs['lines'] = [(product_id, name, price, quantities[product_id]) for product_id, name, price in products]
+        if sum(price * quantity for _, _, price, quantity in attrs['lines']) > MAX_TOTAL:
+            raise serializers.ValidationError({'items': f"The invoice total cannot exceed {MAX_TOTAL}."})
+        return attrs
+
+    def write_items(self, invoice, lines):
+        InvoiceItem.objects.bulk_create(
+            InvoiceItem(
+                invoice=invoice,
+                product_id=product_id,
+                quantity=quantity,
+                product_name=name,
+                unit_price=price
+            )
+            for product_id, name, price, quantity in lines
+        )
+        invoice.total_amount, invoice.updated_at = recalculate_totals([invoice.pk])[invoice.pk]
+
+
+class InvoiceImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    output = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
+
+    def validate(self, attrs):
+        if 'output' not in attrs:
+            extension = attrs['file'].name.rsplit('.', 1)[-1].lower()
+            if extension not in IMPORT_FORMATS:
+                raise serializers.ValidationError({'output': "Cannot guess the format from the file name."})
+            attrs['output'] = extension
+        return attrs
+
+
+class InvoiceBulkCancelSerializer(serializers.Serializer):
+    MAX_BATCH_SIZE = 1000
+
+    invoices = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE
+    )
+
+
+class InvoiceFilterSerializer(QueryFilterSerializer):
+    lookups = {
+        'status': 'status',
+        'payment_status': 'payment_status',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+        'min_total': 'total_amount__gte',
+        'max_total': 'total_amount__lte',
+    }
+    ranges = (('created_after', 'created_before'), ('min_total', 'max_total'))
 
-        if product_ids is not None:
-            products = Product.objects.filter(id__in=product_ids)
-            instance.products.set(products)
-        instance.calculate_total_amount()
-        instance.save()
-        return instance
\ No newline at end of file
+    status = serializers.ChoiceField(choices=Invoice.STATUS_CHOICES, required=False)
+    payment_status = serializers.ChoiceField(choices=Invoice.PAYMENT_STATUS_CHOICES, required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    min_total = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_total = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
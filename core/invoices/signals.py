@@ -0,0 +1,32 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from invoices.models import Invoice
+from invoices.totals import recalculate_totals, snapshot_prices
+
+
+@receiver(m2m_changed, sender=Invoice.products.through)
+def maintain_invoice_total(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep line item snapshots and totals current for links made through the
+    Invoice.products / Product.invoices managers (add, remove, set, clear).
+    """
+    if not reverse:
+        # instance is the invoice, pk_set holds product ids.
+        if action == 'post_add' and pk_set:
+            snapshot_prices([instance.pk], pk_set)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            totals = recalculate_totals([instance.pk])
+            if instance.pk in totals:
+                instance.total_amount, instance.updated_at = totals[instance.pk]
+        return
+
+    # instance is a product, pk_set holds invoice ids.
+    if action == 'pre_clear':
+        instance._cleared_invoice_ids = list(instance.invoices.values_list('id', flat=True))
+    elif action == 'post_add' and pk_set:
+        snapshot_prices(pk_set, [instance.pk])
+        recalculate_totals(pk_set)
+    elif action == 'post_remove' and pk_set:
+        recalculate_totals(pk_set)
+    elif action == 'post_clear':
+        recalculate_totals(getattr(instance, '_cleared_invoice_ids', []))
@@ -1,13 +1,27 @@
+import json
+from datetime import timedelta
+from unittest import mock
+from io import StringIO
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DataError, connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
+from core.explain import IndexUsageTestMixin, query_on
+from core.query_budget import QueryBudgetTestMixin
 
 from invoices.models import Invoice
+from invoices.serializers import InvoiceSerializer
 from products.models import Product
 
-class InvoicesTestCase(APITestCase):
+class InvoicesTestCase(IndexUsageTestMixin, QueryBudgetTestMixin, APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='invoiceuser', password='invoicepass')
         self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
@@ -66,3 +80,366 @@ class InvoicesTestCase(APITestCase):
         response = self.client.get(self.invoice_list_create_url, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(len(response.data['result']) >= 2) 
+
+    def test_invoice_export_ndjson(self):
+        """
+        Ensure the export streams only the user's invoices, one JSON object per line.
+        """
+        invoice = Invoice.objects.create(user=self.user)
+        Invoice.objects.create(user=self.admin_user)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(reverse('invoice-export'), {'output': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['id'], invoice.id)
+
+    def test_invoice_query_budgets(self):
+        """
+        Ensure invoice reads issue a constant number of queries.
+        """
+        def add_invoices(count):
+            for invoice in Invoice.objects.bulk_create(Invoice(user=self.user) for _ in range(count)):
+                invoice.products.set([self.product1, self.product2])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        self.assertConstantQueryBudget(self.invoice_list_create_url, add_invoices, {'expand': 'products'})
+        self.assertWithinQueryBudget(reverse('invoice-export'))
+        invoice = Invoice.objects.filter(user=self.user).first()
+        self.assertWithinQueryBudget(reverse('invoice-detail', args=[invoice.id]))
+
+    def test_invoice_total_maintained_in_database(self):
+        """
+        Ensure totals follow product links from either side, with a constant
+        number of queries per invoice creation.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        many = Product.objects.bulk_create(
+            Product(name=f'Bulk{i}', description='Desc', price=1.0) for i in range(100)
+        )
+        query_counts = []
+        for product_ids in ([self.product1.id], [p.id for p in many]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.invoice_list_create_url, {"products": product_ids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertEqual(response.data['result']['total_amount'], '100.00')
+
+        invoice = Invoice.objects.get(id=response.data['result']['id'])
+        url = reverse('invoice-detail', args=[invoice.id])
+        response = self.client.patch(url, {"products": [self.product1.id, self.product2.id, 9999]}, format='json')
+        self.assertEqual(response.data['result']['total_amount'], '30.00')
+
+        self.product2.invoices.clear()
+        self.product1.invoices.add(Invoice.objects.create(user=self.user))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_amount, Decimal('10.00'))
+        self.assertEqual(Invoice.objects.latest('id').total_amount, Decimal('10.00'))
+
+    def test_invoice_line_item_quantities(self):
+        """
+        Ensure line items keep their quantity and the price at the time of
+        sale, and are served without reading the products table.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        data = {
+            "products": [self.product1.id],
+            "items": [{"product": self.product2.id, "quantity": 3}, {"product": self.product1.id}]
+        }
+        response = self.client.post(self.invoice_list_create_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['result']['total_amount'], '80.00')
+
+        self.product2.price = 99
+        self.product2.save()
+        url = reverse('invoice-detail', args=[response.data['result']['id']])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any(Product._meta.db_table in query['sql'] for query in queries))
+        items = {item['id']: item for item in response.data['result']['products_info']}
+        self.assertEqual(items[self.product1.id]['quantity'], 2)
+        self.assertEqual(items[self.product2.id]['price'], '20.00')
+        self.assertEqual(items[self.product2.id]['line_total'], '60.00')
+        self.assertEqual(response.data['result']['total_amount'], '80.00')
+
+    def test_invoice_rejects_quantities_and_totals_that_overflow(self):
+        expensive = Product.objects.create(name='Expensive', description='Desc', price='99999.99')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        for items in (
+            [{"product": expensive.id, "quantity": 1000000}],
+            [{"product": self.product1.id, "quantity": 2147483648}],
+            [{"product": self.product1.id, "quantity": 2147483647}, {"product": self.product1.id}],
+        ):
+            with self.subTest(items=items):
+                response = self.client.post(self.invoice_list_create_url, {"items": items}, format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('items', response.data['result'])
+        self.assertFalse(Invoice.objects.filter(user=self.user).exists())
+
+        response = self.client.post(
+            self.invoice_list_create_url, {"items": [{"product": expensive.id, "quantity": 1000}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = reverse('invoice-detail', args=[response.data['result']['id']])
+        response = self.client.patch(url, {"items": [{"product": expensive.id, "quantity": 1001}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invoice_list_sparse_fields(self):
+        """
+        Ensure `?fields=` selects only the requested columns, products are
+        only loaded with `?expand=products`, and the list is paginated.
+        """
+        for _ in range(3):
+            Invoice.objects.create(user=self.user).products.set([self.product1])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.invoice_list_create_url, {'fields': 'id,status', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result'][0].keys(), {'id', 'status'})
+        self.assertNotIn('total_amount', queries[-1]['sql'])
+        self.assertFalse(any('invoices_invoiceitem' in query['sql'] for query in queries))
+
+        response = self.client.get(self.invoice_list_create_url, {
+            'fields': 'id', 'expand': 'products', 'cursor': response.data['next_cursor']
+        })
+        self.assertEqual(len(response.data['result']), 1)
+        self.assertIsNone(response.data['next_cursor'])
+        self.assertEqual(response.data['result'][0]['products_info'][0]['id'], self.product1.id)
+
+        response = self.client.get(self.invoice_list_create_url, {'fields': 'id,secret', 'expand': 'users'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['result']['fields'], ['secret', 'users'])
+
+    def test_invoice_list_filters(self):
+        cheap = Invoice.objects.create(user=self.user, total_amount=Decimal('5.00'))
+        paid = Invoice.objects.create(user=self.user, total_amount=Decimal('50.00'), status='PAID')
+        Invoice.objects.create(user=self.admin_user, total_amount=Decimal('50.00'))
+        Invoice.objects.filter(pk=cheap.pk).update(created_at='2024-06-01T00:00:00Z')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        for params, expected in (
+            ({'status': 'PAID'}, [paid.id]),
+            ({'min_total': '10', 'max_total': '100'}, [paid.id]),
+            ({'created_before': '2025-01-01T00:00:00Z'}, [cheap.id]),
+            ({'status': 'PENDING', 'created_after': '2025-01-01T00:00:00Z'}, []),
+        ):
+            response = self.client.get(self.invoice_list_create_url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([row['id'] for row in response.data['result']], expected, params)
+
+        response = self.client.get(self.invoice_list_create_url, {'min_total': '10', 'max_total': '1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.invoice_list_create_url, {'status': 'LOST'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invoice_list_filters_use_indexes(self):
+        """
+        EXPLAIN every supported filter combination for users and staff: each
+        page must be read from an index in list order, and selective status
+        filters must use the indexes added for them.
+        """
+        # Enough rows, with a realistic status mix, for the planner's choice
+        # to reflect production: most invoices are settled, few pending.
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {Invoice._meta.db_table}
+                    (user_id, status, total_amount, amount_paid, payment_status, created_at, updated_at)
+                SELECT CASE WHEN n %% 3 = 0 THEN %s ELSE %s END, status, n %% 200, 0,
+                    CASE WHEN status = 'PAID' THEN 'PAID' ELSE 'UNPAID' END,
+                    now() - n * interval '10 minutes', now()
+                FROM generate_series(1, 60000) AS n, LATERAL (SELECT
+                    CASE WHEN n %% 20 = 0 THEN 'PENDING' WHEN n %% 20 = 1 THEN 'CANCELLED' ELSE 'PAID' END
+                ) AS s(status)
+            """, [self.user.id, self.admin_user.id])
+            cursor.execute(f"ANALYZE {Invoice._meta.db_table}")
+        now = timezone.now()
+        dates = {'created_after': now - timedelta(days=90), 'created_before': now - timedelta(days=30)}
+        totals = {'min_total': '1', 'max_total': '100'}
+        status_indexes = {'inv_user_status_created_idx', 'inv_pending_created_idx'}
+        combinations = (
+            ({}, set(), set()),
+            (dates, set(), set()),
+            (totals, set(), set()),
+            (dates | totals, set(), set()),
+            ({'payment_status': 'PAID'}, set(), set()),
+            ({'status': 'PAID'}, set(), set()),
+            ({'status': 'CANCELLED'}, {'inv_user_status_created_idx'}, set()),
+            ({'status': 'PENDING'}, status_indexes, {'inv_pending_created_idx'}),
+            ({'status': 'PENDING'} | dates | totals, status_indexes, {'inv_pending_created_idx'}),
+        )
+        for filters, user_indexes, staff_indexes in combinations:
+            for access, expected in ((self.user_access, user_indexes), (self.admin_access, staff_indexes)):
+                with self.subTest(filters=filters, staff=access == self.admin_access):
+                    self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(self.invoice_list_create_url, filters)
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertIndexOrdered(query_on(queries, Invoice), expected)
+
+    def test_invoice_list_matches_serializer_output(self):
+        """
+        Ensure the fast list rendering is byte-identical to InvoiceSerializer.
+        """
+        Invoice.objects.create(user=self.user)
+        Invoice.objects.create(user=self.user, status='PAID').products.set([self.product1, self.product2])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(self.invoice_list_create_url, {'expand': 'products'})
+        invoices = Invoice.objects.filter(user=self.user).order_by('-created_at', '-id').prefetch_related('items')
+        expected = InvoiceSerializer(invoices, many=True).data
+        self.assertEqual(JSONRenderer().render(response.data['result']), JSONRenderer().render(expected))
+
+    def test_invoice_import_csv_upload(self):
+        """
+        Ensure staff can import invoices from CSV; invalid rows reject only
+        their own invoice and are reported.
+        """
+        rows = [
+            "ref,user,status,product,quantity",
+            f"A,{self.user.id},,{self.product1.id},2",
+            f"A,{self.user.id},,{self.product2.id},",
+            f"A,{self.user.id},,{self.product1.id},1",
+            f"B,{self.user.id},PAID,,",
+            f"C,{self.user.id},,999999,1",
+            f"C,{self.user.id},,{self.product1.id},x",
+            f"D,abc,,{self.product1.id},1",
+        ]
+        upload = SimpleUploadedFile('invoices.csv', "\n".join(rows).encode())
+        url = reverse('invoice-import')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.post(url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        upload.seek(0)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        response = self.client.post(url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['result']
+        self.assertEqual((result['rows'], result['invoices'], result['items']), (7, 2, 2))
+        self.assertEqual(result['rejected_invoices'], 2)
+        self.assertEqual([(error['row'], error['error']) for error in result['errors']], [
+            (5, 'Product does not exist.'),
+            (6, 'Quantity must be a positive integer.'),
+            (7, 'Invalid user id.'),
+        ])
+
+        invoices = Invoice.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([(i.status, i.total_amount) for i in invoices], [
+            ('PENDING', Decimal('50.00')), ('PAID', Decimal('0.00'))
+        ])
+        self.assertEqual(invoices[0].items.get(product=self.product1).quantity, 3)
+
+    def test_invoice_import_reports_malformed_rows(self):
+        """
+        Ensure rows with the wrong field count, invalid UTF-8 or quantities
+        that overflow are reported without aborting the import, and that
+        database errors are answered with 400.
+        """
+        rows = [
+            b"ref,user,product,quantity",
+            f"A,{self.user.id},{self.product1.id},1".encode(),
+            f"B,{self.user.id},{self.product1.id},1,extra".encode(),
+            f"C,{self.user.id},{self.product1.id},1".encode() + b"\xff",
+            *[f"D,{self.user.id},{self.product1.id},999999999".encode()] * 3,
+        ]
+        url = reverse('invoice-import')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        response = self.client.post(
+            url, {'file': SimpleUploadedFile('invoices.csv', b"\n".join(rows))}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['result']
+        self.assertEqual((result['rows'], result['invoices'], result['items']), (6, 1, 1))
+        self.assertEqual([(error['row'], error['ref'], error['error']) for error in result['errors']], [
+            (2, 'B', 'Expected 4 fields, got 5.'),
+            (3, 'C', 'Not valid UTF-8 text.'),
+            (4, 'D', 'Invoice total exceeds 99999999.99.'),
+            (4, 'D', 'Quantity of a product exceeds 2147483647.'),
+        ])
+
+        with mock.patch('invoices.imports._copy', side_effect=DataError('value too long')), \
+                self.assertLogs('invoices.imports', 'ERROR'):
+            response = self.client.post(
+                url, {'file': SimpleUploadedFile('invoices.csv', b"\n".join(rows))}, format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], "The file could not be imported; nothing was saved.")
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_invoice_import_rejects_whole_invoice_with_malformed_row(self):
+        """
+        Ensure a row with the wrong field count rejects every row of its
+        invoice rather than importing the invoice without that line.
+        """
+        rows = [
+            "ref,user,product,quantity",
+            f"A,{self.user.id},{self.product1.id},1",
+            f" A ,{self.user.id},{self.product2.id},1,extra",
+            f"A,{self.user.id},{self.product2.id},2",
+            f"B,{self.user.id},{self.product1.id},1",
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        response = self.client.post(
+            reverse('invoice-import'),
+            {'file': SimpleUploadedFile('invoices.csv', "\n".join(rows).encode())}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['result']
+        self.assertEqual((result['rows'], result['invoices'], result['items']), (4, 1, 1))
+        self.assertEqual(result['rejected_invoices'], 1)
+        self.assertEqual([(error['row'], error['ref']) for error in result['errors']], [(2, 'A')])
+        self.assertEqual(list(Invoice.objects.values_list('total_amount', flat=True)), [self.product1.price])
+
+    def test_import_invoices_command_ndjson(self):
+        """
+        Ensure the import command reads NDJSON invoices and reports bad lines.
+        """
+        lines = [
+            json.dumps({"ref": "X", "user": self.user.id, "products": [self.product2.id],
+                        "items": [{"product": self.product1.id, "quantity": 4}]}),
+            "not json",
+            json.dumps({"ref": "Y", "user": self.user.id, "status": "LOST"}),
+        ]
+        with StringIO("\n".join(lines)) as source:
+            out, err = StringIO(), StringIO()
+            with mock.patch('sys.stdin', mock.Mock(buffer=source)):
+                call_command('import_invoices', '-', '--format', 'ndjson', stdout=out, stderr=err)
+        self.assertIn('rows=3 invoices=1 items=2 rejected_invoices=1 errors=2', out.getvalue())
+        self.assertIn('row 2 ref=None: Not a JSON invoice object.', err.getvalue())
+        self.assertEqual(Invoice.objects.get(user=self.user).total_amount, Decimal('60.00'))
+
+    def test_invoice_detail_conditional_get(self):
+        """
+        Ensure invoice detail honours If-None-Match / If-Modified-Since after
+        the permission check, and any change to the invoice invalidates them.
+        """
+        invoice = Invoice.objects.create(user=self.user)
+        invoice.products.set([self.product1])
+        url = reverse('invoice-detail', args=[invoice.id])
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertIn('private', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(any('invoices_invoiceitem' in query['sql'] for query in queries))
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other = User.objects.create_user(username='other', password='otherpass')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(other).access_token))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        invoice.products.add(self.product2)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result']['total_amount'], '30.00')
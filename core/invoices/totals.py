@@ -0,0 +1,68 @@
+"""
+Set-based maintenance of Invoice.total_amount.
+
+The total of an invoice is the sum of its line items' `line_total`, a
+generated column over the quantity and the unit price captured when the
+line was created; it is recomputed with one aggregate UPDATE whenever the
+lines change. Product prices are never loaded into Python.
+"""
+from django.db import connection
+from django.utils import timezone
+from accounts.summaries import record_invoice_changes
+from products.models import Product
+from .models import Invoice, InvoiceItem
+
+
+def _tables():
+    return {
+        'invoices': Invoice._meta.db_table,
+        'items': InvoiceItem._meta.db_table,
+        'products': Product._meta.db_table,
+    }
+
+
+def recalculate_totals(invoice_ids):
+    """
+    Recompute the totals of `invoice_ids` from their line items.
+    Returns {invoice_id: (total_amount, updated_at)}.
+    """
+    tables = _tables()
+    with connection.cursor() as cursor:
+        # `old` locks the rows and keeps their previous total for the
+        # account summaries.
+        cursor.execute(f"""
+            UPDATE {tables['invoices']} AS i
+            SET total_amount = COALESCE((
+                    SELECT SUM(item.line_total) FROM {tables['items']} AS item
+                    WHERE item.invoice_id = i.id
+                ), 0),
+                updated_at = %s
+            FROM (
+                SELECT id, total_amount FROM {tables['invoices']}
+                WHERE id = ANY(%s) ORDER BY id FOR UPDATE
+            ) AS old
+            WHERE i.id = old.id
+            RETURNING i.id, i.total_amount, i.updated_at, i.user_id, i.status, i.amount_paid, old.total_amount
+        """, [timezone.now(), sorted(set(invoice_ids))])
+        rows = cursor.fetchall()
+    record_invoice_changes(
+        (user_id, (status, old_total, amount_paid), (status, total, amount_paid))
+        for invoice_id, total, updated_at, user_id, status, amount_paid, old_total in rows
+    )
+    return {invoice_id: (total, updated_at) for invoice_id, total, updated_at, *rest in rows}
+
+
+def snapshot_prices(invoice_ids, product_ids):
+    """
+    Copy the current name and price of `product_ids` onto their line items
+    in `invoice_ids`.
+    """
+    tables = _tables()
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {tables['items']} AS item
+            SET product_name = p.name, unit_price = p.price
+            FROM {tables['products']} AS p
+            WHERE p.id = item.product_id
+              AND item.invoice_id = ANY(%s) AND item.product_id = ANY(%s)
+        """, [sorted(set(invoice_ids)), sorted(set(product_ids))])
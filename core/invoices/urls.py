@@ -1,7 +1,16 @@
 from django.urls import path
-from .views import InvoiceListCreateView, InvoiceDetailView
+from .views import (
+    AsyncInvoiceDetailView,
+    AsyncInvoiceListCreateView,
+    InvoiceBulkCancelView,
+    InvoiceExportView,
+    InvoiceImportView,
+)
 
 urlpatterns = [
-    path('', InvoiceListCreateView.as_view(), name='invoice-list-create'),
-    path('<int:pk>/', InvoiceDetailView.as_view(), name='invoice-detail'),
+    path('', AsyncInvoiceListCreateView.as_view(), name='invoice-list-create'),
+    path('export/', InvoiceExportView.as_view(), name='invoice-export'),
+    path('import/', InvoiceImportView.as_view(), name='invoice-import'),
+    path('cancel/', InvoiceBulkCancelView.as_view(), name='invoice-bulk-cancel'),
+    path('<int:pk>/', AsyncInvoiceDetailView.as_view(), name='invoice-detail'),
 ]
@@ -1,29 +1,133 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from rest_framework.parsers import MultiPartParser
+from django.db.models import aprefetch_related_objects, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema
-from .models import Invoice
-from .serializers import InvoiceSerializer
+from core.async_views import AsyncAPIView, aget_object_or_404, run_sync
+from core.conditional import conditional_response, object_version, with_validators
+from core.fast_serializers import FastSerializer
+from core.pagination import InvalidCursor, KeysetPagination
+from core.streaming import EXPORT_CONTENT_TYPES, export_response
+from transactions.cancellation import cancel_invoices
+from .imports import ImportFormatError, import_invoices
+from .models import Invoice, InvoiceItem
+from .serializers import (
+    InvoiceBulkCancelSerializer,
+    InvoiceFilterSerializer,
+    InvoiceImportSerializer,
+    InvoiceItemSerializer,
+    InvoiceSerializer,
+)
 from .permissions import IsOwnerOrAdmin
 
 class InvoiceListCreateView(APIView):
+    """
+    GET: List invoices, newest first, one keyset page at a time. Pass the
+    returned `next_cursor` back as `?cursor=` to fetch the next page.
+    `?fields=id,status,total_amount` limits the columns selected and returned,
+    and `?expand=products` adds the line items as `products_info`. Filter
+    with `status`, `payment_status`, `created_after` / `created_before` and
+    `min_total` / `max_total`. Rows are rendered with FastSerializer from
+    InvoiceSerializer.
+    POST: Create an invoice.
+    """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = InvoiceSerializer
+    filter_serializer_class = InvoiceFilterSerializer
+    list_fields = ('id', 'user_id', 'status', 'total_amount', 'amount_paid', 'payment_status', 'created_at', 'updated_at')
+    expansions = {'products': 'products_info'}
+    query_budgets = {'GET': 3}
+
     @extend_schema(
-        operation_id="invoiceListGet"
+        operation_id="invoiceListGet",
+        parameters=[InvoiceFilterSerializer]
     )
     def get(self, request):
-        if request.user.is_staff:
-            invoices = Invoice.objects.prefetch_related('products').all()
-        else:
-            invoices = Invoice.objects.filter(user=request.user).prefetch_related('products')
+        fields, unknown = self.get_fields(request)
+        if unknown:
+            return self.unknown_fields_response(unknown)
+        filters = self.filter_serializer_class(data=request.query_params)
+        if not filters.is_valid():
+            return self.invalid_filters_response(filters.errors)
+        paginator = KeysetPagination('created_at')
+        fast = self.get_fast_serializer(request, fields)
+        queryset = filters.filter_queryset(self.get_queryset(request.user))
+        try:
+            page = paginator.paginate_queryset(fast.values(queryset, 'created_at', 'id'), request)
+        except InvalidCursor:
+            return self.invalid_cursor_response()
+        if 'products_info' in fields:
+            items = self.get_items_serializer(request)
+            self.attach_items(page, items, list(self.get_items(items, page)))
+        return self.page_response(fast.to_representation(page), paginator.next_cursor)
+
+    def get_fields(self, request):
+        """
+        Return the output fields requested by `?fields=` and `?expand=`, and
+        the names that were not recognised.
+        """
+        requested = [name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip()]
+        expand = [name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()]
+        fields = list(dict.fromkeys(requested)) or list(self.list_fields)
+        fields += [self.expansions[name] for name in expand if name in self.expansions]
+        unknown = [name for name in requested if name not in self.list_fields]
+        unknown += [name for name in expand if name not in self.expansions]
+        return fields, unknown
+
+    def get_queryset(self, user):
+        if user.is_staff:
+            return Invoice.objects.all()
+        return Invoice.objects.filter(user=user)
+
+    def get_fast_serializer(self, request, fields):
+        # Only the requested columns are selected; id and created_at are
+        # always fetched too, since the page cursor is built from them.
+        serializer = self.serializer_class(context={'request': request})
+        return FastSerializer(serializer, fields=fields, attached=('products_info',))
+
+    def get_items_serializer(self, request):
+        return FastSerializer(InvoiceItemSerializer(context={'request': request}))
+
+    def get_items(self, items, page):
+        """
+        Line item rows of the invoices in `page`, in one query.
+        """
+        queryset = InvoiceItem.objects.filter(invoice_id__in=[row['id'] for row in page])
+        return items.values(queryset, 'invoice_id')
+
+    def attach_items(self, page, items, item_rows):
+        by_invoice = {row['id']: [] for row in page}
+        for item in item_rows:
+            by_invoice[item['invoice_id']].append(item)
+        for row in page:
+            row['products_info'] = items.to_representation(by_invoice[row['id']])
+
+    def unknown_fields_response(self, unknown):
+        return Response(
+            {"message": "Unknown fields.", "result": {"fields": unknown}},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    def invalid_filters_response(self, errors):
+        return Response(
+            {"message": "Validation error.", "result": errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    def invalid_cursor_response(self):
+        return Response(
+            {"message": "Invalid cursor.", "result": {}},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-        serializer = self.serializer_class(invoices, many=True, context={'request': request})
+    def page_response(self, result, next_cursor):
         return Response(
             {
                 "message": "Invoices retrieved successfully.",
-                "result": serializer.data
+                "result": result,
+                "next_cursor": next_cursor
             },
             status=status.HTTP_200_OK
         )
@@ -47,28 +151,168 @@ class InvoiceListCreateView(APIView):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+class AsyncInvoiceListCreateView(AsyncAPIView, InvoiceListCreateView):
+    @extend_schema(
+        operation_id="invoiceListGet",
+        parameters=[InvoiceFilterSerializer]
+    )
+    async def get(self, request):
+        fields, unknown = self.get_fields(request)
+        if unknown:
+            return self.unknown_fields_response(unknown)
+        filters = self.filter_serializer_class(data=request.query_params)
+        if not filters.is_valid():
+            return self.invalid_filters_response(filters.errors)
+        paginator = KeysetPagination('created_at')
+        fast = self.get_fast_serializer(request, fields)
+        queryset = filters.filter_queryset(self.get_queryset(request.user))
+        try:
+            page = await paginator.apaginate_queryset(fast.values(queryset, 'created_at', 'id'), request)
+        except InvalidCursor:
+            return self.invalid_cursor_response()
+        if 'products_info' in fields:
+            items = self.get_items_serializer(request)
+            self.attach_items(page, items, [item async for item in self.get_items(items, page)])
+        return self.page_response(fast.to_representation(page), paginator.next_cursor)
+
+    post = run_sync(InvoiceListCreateView.post)
+
+class InvoiceExportView(APIView):
+    """
+    GET: Stream all invoices as CSV or NDJSON (`?output=csv|ndjson`).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    columns = ('id', 'user_id', 'status', 'total_amount', 'created_at', 'updated_at')
+    query_budgets = {'GET': 2}
+
+    @extend_schema(
+        operation_id="invoiceExportGet"
+    )
+    def get(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {"message": "Unsupported output format.", "result": {}},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        invoices = Invoice.objects.order_by('id')
+        if not request.user.is_staff:
+            invoices = invoices.filter(user=request.user)
+        return export_response(request, invoices, self.columns, output, 'invoices')
+
+class InvoiceImportView(APIView):
+    """
+    POST: Import invoices from an uploaded CSV or NDJSON file (staff only).
+    Rows with errors are reported and skipped; see invoices.imports.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+    serializer_class = InvoiceImportSerializer
+
+    @extend_schema(
+        operation_id="invoiceImportPost"
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if serializer.is_valid():
+            try:
+                summary = import_invoices(serializer.validated_data['file'].file, serializer.validated_data['output'])
+            except ImportFormatError as error:
+                return Response(
+                    {"message": str(error), "result": {}},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return Response(
+                {
+                    "message": "Invoices imported.",
+                    "result": summary
+                },
+                status=status.HTTP_200_OK
+            )
+        return Response(
+            {
+                "message": "Validation error.",
+                "result": serializer.errors
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+class InvoiceBulkCancelView(APIView):
+    """
+    POST: Cancel a list of invoices and fail their pending transactions
+    (staff only). Already cancelled and unknown ids are reported as skipped.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = InvoiceBulkCancelSerializer
+
+    @extend_schema(
+        operation_id="invoiceBulkCancelPost"
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "message": "Validation error.",
+                    "result": serializer.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        invoice_ids = serializer.validated_data['invoices']
+        cancelled, failed = cancel_invoices(invoice_ids)
+        return Response(
+            {
+                "message": f"{len(cancelled)} invoices cancelled.",
+                "result": {
+                    "cancelled": cancelled,
+                    "skipped": sorted(set(invoice_ids) - set(cancelled)),
+                    "failed_transactions": len(failed)
+                }
+            },
+            status=status.HTTP_200_OK
+        )
+
 class InvoiceDetailView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
     serializer_class = InvoiceSerializer
+    query_budgets = {'GET': 3}
 
     def get_object(self, pk):
-        queryset = Invoice.objects.prefetch_related('products')
+        queryset = Invoice.objects.prefetch_related('items')
         return get_object_or_404(queryset, pk=pk)
     
     @extend_schema(
         operation_id="invoiceGet"
     )
     def get(self, request, pk):
-        invoice = self.get_object(pk)
+        invoice = get_object_or_404(Invoice, pk=pk)
+        version, not_modified = self.check_not_modified(request, invoice)
+        if not_modified is not None:
+            return not_modified
+        prefetch_related_objects([invoice], 'items')
+        return self.retrieve_response(request, invoice, version)
+
+    def check_not_modified(self, request, invoice):
+        """
+        Check permissions, then compare the request's preconditions with the
+        invoice's updated_at. Returns the version and a 304 response or None.
+        """
         self.check_object_permissions(request, invoice)
+        version = object_version(invoice)
+        return version, conditional_response(request, version, private=True)
+
+    def retrieve_response(self, request, invoice, version):
         serializer = self.serializer_class(invoice, context={'request': request})
-        return Response(
+        response = Response(
             {
                 "message": "Invoice retrieved successfully.",
                 "result": serializer.data
             },
             status=status.HTTP_200_OK
         )
+        return with_validators(response, version, private=True)
     
     def put(self, request, pk):
         invoice = self.get_object(pk)
@@ -123,3 +367,19 @@ class InvoiceDetailView(APIView):
             },
             status=status.HTTP_204_NO_CONTENT
         )
+
+class AsyncInvoiceDetailView(AsyncAPIView, InvoiceDetailView):
+    @extend_schema(
+        operation_id="invoiceGet"
+    )
+    async def get(self, request, pk):
+        invoice = await aget_object_or_404(Invoice.objects.all(), pk=pk)
+        version, not_modified = self.check_not_modified(request, invoice)
+        if not_modified is not None:
+            return not_modified
+        await aprefetch_related_objects([invoice], 'items')
+        return self.retrieve_response(request, invoice, version)
+
+    put = run_sync(InvoiceDetailView.put)
+    patch = run_sync(InvoiceDetailView.patch)
+    delete = run_sync(InvoiceDetailView.delete)
@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import Product
+from .models import Product, ProductImageJob
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'price', 'created_at', 'updated_at')
     search_fields = ('name', 'description')
     list_filter = ('created_at', 'updated_at')
+
+
+@admin.register(ProductImageJob)
+class ProductImageJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'image', 'created_at')
+    ordering = ('id',)
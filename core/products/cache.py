@@ -0,0 +1,10 @@
+from django.conf import settings
+from core.cache import VersionedCache
+
+# Rendered product list and detail results, invalidated by products.signals
+# whenever a product is saved or deleted.
+catalog_cache = VersionedCache(
+    'catalog',
+    timeout=settings.CATALOG_CACHE_TIMEOUT,
+    local_size=settings.CATALOG_CACHE_LOCAL_SIZE
+)
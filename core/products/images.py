@@ -0,0 +1,141 @@
+"""
+Resized variants of product images.
+
+Saving a product with a new image queues a ProductImageJob (see
+products.signals); `manage.py process_product_images` claims jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so several workers can run at once, and
+renders them in a process pool. A worker process reads the original from
+the storage backend, shrinks it with Pillow to each PRODUCT_IMAGE_SIZES
+longest edge (never enlarging it) and stores one file per size and format
+next to the original:
+
+    products/p.png -> products/p_200.webp, products/p_200.jpg, ...
+
+The keys are recorded in Product.image_variants unless the image was
+replaced in the meantime. A job whose image cannot be rendered is logged
+and dropped, and the product keeps serving its original; enqueue_missing()
+queues such images again.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .cache import catalog_cache
+from .models import Product, ProductImageJob
+
+logger = logging.getLogger(__name__)
+
+# Variant format -> (Pillow format, file extension).
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def _open(storage, name, max_size):
+    with storage.open(name, 'rb') as file:
+        image = Image.open(file)
+        # Lets the JPEG decoder skip detail no variant needs.
+        image.draft('RGB', (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+    return image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+
+def _encode(image, output, quality):
+    if output == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, output, quality=quality)
+    return buffer.getvalue()
+
+
+def render_variants(name, sizes, formats, quality):
+    """
+    Render and store the variants of the image stored as `name`. Runs in a
+    worker process. Returns {format: {size: key}}.
+    """
+    storage = storages.create_storage(storages.backends['default'])
+    image = _open(storage, name, max(sizes))
+    stem = os.path.splitext(name)[0]
+    variants = {}
+    for size in sorted(sizes):
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for variant_format in formats:
+            output, extension = VARIANT_FORMATS[variant_format]
+            content = ContentFile(_encode(resized, output, quality))
+            variants.setdefault(variant_format, {})[str(size)] = storage.save(f'{stem}_{size}.{extension}', content)
+    return variants
+
+
+def image_pool(workers=None):
+    return ProcessPoolExecutor(
+        max_workers=workers or settings.PRODUCT_IMAGE_WORKERS, initializer=django.setup
+    )
+
+
+def process_batch(executor, batch_size=10):
+    """
+    Render the variants of up to `batch_size` queued images in `executor`
+    (see image_pool()), record them and delete the jobs. Jobs of images
+    replaced since they were queued are dropped unrendered.
+    Returns the number of jobs processed.
+    """
+    options = (settings.PRODUCT_IMAGE_SIZES, settings.PRODUCT_IMAGE_FORMATS, settings.PRODUCT_IMAGE_QUALITY)
+    with transaction.atomic():
+        jobs = list(
+            ProductImageJob.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')
+            .values_list('id', 'product_id', 'image', 'product__image')[:batch_size]
+        )
+        if not jobs:
+            return 0
+        futures = {
+            (product_id, image): executor.submit(render_variants, image, *options)
+            for _, product_id, image, current_image in jobs
+            if image == current_image
+        }
+        updated = 0
+        for (product_id, image), future in futures.items():
+            try:
+                variants = future.result()
+            except Exception:
+                logger.exception("Could not render the variants of %s (product %s)", image, product_id)
+                continue
+            updated += Product.objects.filter(pk=product_id, image=image).update(
+                image_variants=variants, updated_at=timezone.now()
+            )
+        ProductImageJob.objects.filter(id__in=[job[0] for job in jobs]).delete()
+        if updated:
+            # update() sends no signals.
+            transaction.on_commit(catalog_cache.bump)
+
+    logger.info("product images processed=%d rendered=%d", len(jobs), updated)
+    return len(jobs)
+
+
+def enqueue_missing():
+    """
+    Queue every product image that has no variants and no pending job.
+    Returns the number of jobs queued.
+    """
+    products = (
+        Product.objects
+        .exclude(image__isnull=True).exclude(image='')
+        .filter(image_variants={}, image_jobs__isnull=True)
+        .values_list('id', 'image')
+    )
+    jobs = ProductImageJob.objects.bulk_create(
+        ProductImageJob(product_id=product_id, image=image) for product_id, image in products
+    )
+    return len(jobs)
@@ -0,0 +1,78 @@
+import statistics
+import time
+import urllib.request
+import uuid
+import boto3
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from products import utils
+
+
+class Command(BaseCommand):
+    help = (
+        "Time signing product image URLs with a new S3 client per URL, with the "
+        "process's pooled client, and from the signature cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Upload an object to AWS_S3_ENDPOINT_URL (e.g. a local MinIO) and fetch it through a signed URL."
+        )
+
+    def handle(self, *args, **options):
+        count, repeat = options['products'], options['repeat']
+        keys = [f'products/bench-{uuid.uuid4().hex}.png' for _ in range(count)]
+
+        def per_call_client(keys):
+            for key in keys:
+                utils.sign(boto3.client(
+                    's3',
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                ), key, settings.PRODUCT_IMAGE_URL_EXPIRES)
+
+        def pooled_client(keys):
+            client = utils.get_s3_client()
+            for key in keys:
+                utils.sign(client, key, settings.PRODUCT_IMAGE_URL_EXPIRES)
+
+        utils.signed_image_urls(keys)
+        # A client per URL is slow enough that a sample gives its per-URL cost.
+        runs = (
+            ('client-per-url', per_call_client, keys[:min(count, 50)]),
+            ('pooled-client', pooled_client, keys),
+            ('cached', utils.signed_image_urls, keys),
+        )
+        for name, run, sample in runs:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run(sample)
+                timings.append((time.perf_counter() - started) / len(sample))
+            self.stdout.write(
+                f"{name:<15} products={len(sample):<6} "
+                f"median={statistics.median(timings) * 1e6:10.1f}us/product "
+                f"page of {count}={statistics.median(timings) * count * 1000:9.2f}ms"
+            )
+
+        if options['check']:
+            self.check_endpoint()
+
+    def check_endpoint(self):
+        client = utils.get_s3_client()
+        key = f'products/bench-{uuid.uuid4().hex}.txt'
+        client.put_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key, Body=b'signed')
+        try:
+            url = utils.generate_presigned_url(key)
+            with urllib.request.urlopen(url, timeout=10) as response:
+                ok = response.status == 200 and response.read() == b'signed'
+        finally:
+            client.delete_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f"Signed URL accepted by {settings.AWS_S3_ENDPOINT_URL}"))
+        else:
+            self.stderr.write(self.style.ERROR(f"Signed URL rejected by {settings.AWS_S3_ENDPOINT_URL}"))
@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand
+from products.images import enqueue_missing, image_pool, process_batch
+
+
+class Command(BaseCommand):
+    help = "Render the resized variants of uploaded product images in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Worker processes (default: PRODUCT_IMAGE_WORKERS)."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds to sleep when no image is queued."
+        )
+        parser.add_argument('--once', action='store_true', help="Drain the current queue and exit.")
+        parser.add_argument(
+            '--enqueue-missing', action='store_true',
+            help="First queue every product image that has no variants, e.g. after failed renders."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['enqueue_missing']:
+            self.stdout.write(f"queued={enqueue_missing()}")
+        processed = 0
+        with image_pool(options['workers']) as executor:
+            try:
+                while True:
+                    count = process_batch(executor, batch_size)
+                    processed += count
+                    if options['once'] and count < batch_size:
+                        break
+                    if count < batch_size:
+                        time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(f"processed={processed}")
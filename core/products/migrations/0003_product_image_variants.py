@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Existing images get their variants rendered by the next worker run.
+ENQUEUE_EXISTING_IMAGES_SQL = """
+INSERT INTO products_productimagejob (product_id, image, created_at)
+SELECT id, image, now() FROM products_product
+WHERE image IS NOT NULL AND image <> ''
+ORDER BY id
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_alter_product_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='ProductImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_jobs', to='products.product')),
+            ],
+        ),
+        migrations.RunSQL(ENQUEUE_EXISTING_IMAGES_SQL, migrations.RunSQL.noop),
+    ]
@@ -8,8 +8,24 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    # {format: {max edge in px: storage key}}, written by products.images.
+    image_variants = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
+
+
+class ProductImageJob(models.Model):
+    """
+    An uploaded product image waiting for its resized variants, rendered by
+    `manage.py process_product_images`. Rows are written in the same
+    database transaction as the upload, so requests never do image work.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='image_jobs')
+    image = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"ProductImageJob #{self.pk} - {self.image}"
@@ -1,8 +1,11 @@
 from rest_framework import serializers
-from .utils import generate_presigned_url
+from .utils import generate_presigned_url, signed_image_urls, variant_keys, variant_urls
 from .models import Product
 
 class ProductSerializer(serializers.ModelSerializer):
+    signed_image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
         fields = '__all__'
@@ -10,4 +13,11 @@ class ProductSerializer(serializers.ModelSerializer):
     def get_signed_image_url(self, obj):
         if not obj.image:
             return None
-        return generate_presigned_url(obj.image.name)
\ No newline at end of file
+        return generate_presigned_url(obj.image.name)
+
+    def get_image_variants(self, obj):
+        """
+        Signed URLs of the resized variants, {format: {size: url}}; empty
+        until products.images has rendered them.
+        """
+        return variant_urls(obj.image_variants, signed_image_urls(variant_keys(obj.image_variants)))
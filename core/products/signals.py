@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from products.cache import catalog_cache
+from products.models import Product, ProductImageJob
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    # After commit, so no reader caches the old rows under the new version.
+    transaction.on_commit(catalog_cache.bump)
+
+
+@receiver(pre_save, sender=Product)
+def detect_new_image(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._image_changed = False
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    stored = None
+    if not instance._state.adding:
+        stored = Product.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+    uploaded = bool(instance.image) and not instance.image._committed
+    if uploaded or (instance.image.name or None) != (stored or None):
+        instance._image_changed = True
+        # Variants of the previous image no longer apply.
+        instance.image_variants = {}
+
+
+@receiver(post_save, sender=Product)
+def enqueue_image_variants(sender, instance, **kwargs):
+    # Rendered by `manage.py process_product_images`, never in the request.
+    if getattr(instance, '_image_changed', False) and instance.image:
+        ProductImageJob.objects.create(product=instance, image=instance.image.name)
@@ -1,12 +1,36 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework import status
-from rest_framework.test import APITestCase
-from products.models import Product
+from unittest import mock
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+from PIL import Image
+from products import utils
+from products.images import enqueue_missing, image_pool, process_batch
+from products.cache import catalog_cache
+from products.models import Product, ProductImageJob
+from products.serializers import ProductSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
+from core.query_budget import QueryBudgetTestMixin
 
-class ProductsTestCase(APITestCase):
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProductsTestCase(QueryBudgetTestMixin, APITestCase):
     def setUp(self):
+        cache.clear()
+        catalog_cache.local.clear()
+        utils._signed_urls.clear()
         self.admin_user = User.objects.create_superuser(
             username='adminuser', 
             password='adminpass'
@@ -76,3 +100,277 @@ class ProductsTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('message', response.data)
         self.assertEqual(response.data['result']['name'], "ProdDetail")
+
+    def test_product_query_budgets(self):
+        """
+        Ensure product reads issue a constant number of queries.
+        """
+        def add_products(count):
+            Product.objects.bulk_create(
+                Product(name=f'Bulk{i}', description='Desc', price=1.0) for i in range(count)
+            )
+            # bulk_create sends no signals.
+            catalog_cache.bump()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.regular_access)
+        self.assertConstantQueryBudget(self.list_create_url, add_products)
+        product = Product.objects.first()
+        self.assertWithinQueryBudget(reverse('product-detail', args=[product.id]))
+
+    def test_product_list_matches_serializer_output(self):
+        """
+        Ensure the fast list rendering is byte-identical to ProductSerializer.
+        """
+        Product.objects.create(name='Plain', description='Desc', price='3.1')
+        Product.objects.create(name='Pictured', description='', price=0, image='products/p.png')
+        storage = Product._meta.get_field('image').storage
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.regular_access)
+        with mock.patch.object(storage, 'url', lambda name: f'/media/{name}'):
+            response = self.client.get(self.list_create_url)
+            request = APIRequestFactory().get(self.list_create_url)
+            expected = ProductSerializer(Product.objects.all(), many=True, context={'request': request}).data
+        self.assertEqual(JSONRenderer().render(response.data['result']), JSONRenderer().render(expected))
+        self.assertEqual(response.data['result'][1]['image'], 'http://testserver/media/products/p.png')
+        self.assertIsNone(response.data['result'][0]['signed_image_url'])
+        self.assertIn('X-Amz-Signature=', response.data['result'][1]['signed_image_url'])
+
+    def test_product_list_conditional_get(self):
+        """
+        Ensure a matching If-None-Match is answered with 304 before the
+        products are loaded, and that changes and deletions change the ETag.
+        """
+        product = Product.objects.create(name='Prod1', description='Desc1', price=10.0)
+        other = Product.objects.create(name='Prod2', description='Desc2', price=20.0)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.regular_access)
+        etag = self.client.get(self.list_create_url)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_create_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(any('"description"' in query['sql'] for query in queries))
+
+        product.price = 11
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response = self.client.get(self.list_create_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        response = self.client.get(self.list_create_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        url = reverse('product-detail', args=[product.id])
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_product_reads_served_from_catalog_cache(self):
+        """
+        Ensure repeated reads skip the database until a product write commits.
+        """
+        product = Product.objects.create(name='Prod1', description='Desc1', price=10.0)
+        detail_url = reverse('product-detail', args=[product.id])
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.regular_access)
+        self.client.get(self.list_create_url)
+        self.client.get(detail_url)
+
+        # Only the authentication query is left.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_create_url)
+        self.assertEqual(response.data['result'][0]['price'], '10.00')
+        with self.assertNumQueries(1):
+            response = self.client.get(detail_url)
+        self.assertEqual(response.data['result']['price'], '10.00')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url, {'price': '12.00'}, format='json')
+        self.assertEqual(self.client.get(self.list_create_url).data['result'][0]['price'], '12.00')
+        self.assertEqual(self.client.get(detail_url).data['result']['price'], '12.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(detail_url)
+        self.assertEqual(self.client.get(self.list_create_url).data['result'], [])
+        self.assertEqual(self.client.get(detail_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_product_reads_fall_back_when_cache_unavailable(self):
+        Product.objects.create(name='Prod1', description='Desc1', price=10.0)
+        unreachable = {'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:1/0',
+        }}
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.regular_access)
+        with override_settings(CACHES=unreachable), self.assertLogs('core.cache', 'WARNING'):
+            response = self.client.get(self.list_create_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['result']), 1)
+
+    def test_product_reads_fall_back_when_cache_entry_unavailable(self):
+        """
+        Ensure a shared-cache error on the entry itself, after the version
+        was read, still answers from the database.
+        """
+        Product.objects.create(name='Prod1', description='Desc1', price=10.0)
+        shared = catalog_cache.shared
+        cache.clear()
+        catalog_cache.local.clear()
+
+        def version_only(method):
+            def call(key, *args, **kwargs):
+                if key == catalog_cache.version_key:
+                    return method(key, *args, **kwargs)
+                raise ConnectionError("cache down")
+            return call
+
+        async def compute():
+            return 'fresh'
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.regular_access)
+        with self.assertLogs('core.cache', 'WARNING') as logs:
+            with mock.patch.object(shared, 'get', version_only(shared.get)):
+                self.assertEqual(self.client.get(self.list_create_url).status_code, status.HTTP_200_OK)
+                self.assertEqual(catalog_cache.get_or_set(('test',), lambda: 'fresh'), 'fresh')
+            with mock.patch.object(shared, 'set', side_effect=ConnectionError("cache down")):
+                self.assertEqual(catalog_cache.get_or_set(('test',), lambda: 'fresh'), 'fresh')
+            with mock.patch.object(shared, 'aget', version_only(shared.aget)):
+                self.assertEqual(async_to_sync(catalog_cache.aget_or_set)(('test',), compute), 'fresh')
+            with mock.patch.object(shared, 'aset', side_effect=ConnectionError("cache down")):
+                self.assertEqual(async_to_sync(catalog_cache.aget_or_set)(('test',), compute), 'fresh')
+        self.assertEqual(len(logs.records), 5)
+
+    def test_product_list_signs_image_urls_once_per_window(self):
+        """
+        Ensure a list signs each image key once with the pooled client and
+        reuses the signatures until the signing window ends.
+        """
+        for name in ('A', 'B'):
+            Product.objects.create(name=name, description='', price=1, image='products/shared.png')
+        Product.objects.create(name='C', description='', price=1, image='products/c.png')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.regular_access)
+
+        with mock.patch.object(utils, 'sign', wraps=utils.sign) as sign:
+            result = self.client.get(self.list_create_url).data['result']
+            self.assertEqual(sign.call_count, 2)
+            self.assertEqual({call.args[0] for call in sign.call_args_list}, {utils.get_s3_client()})
+            urls = [product['signed_image_url'] for product in result]
+            self.assertEqual(urls[0], urls[1])
+            self.assertIn('/products/c.png?', urls[2])
+            self.assertIn('X-Amz-Expires=3600', urls[2])
+
+            cache.clear()
+            catalog_cache.local.clear()
+            detail = self.client.get(reverse('product-detail', args=[result[2]['id']])).data['result']
+            self.assertEqual(detail['signed_image_url'], urls[2])
+            self.assertEqual(sign.call_count, 2)
+
+            later = time.time() + utils.signing_window()
+            with mock.patch.object(utils.time, 'time', return_value=later):
+                self.client.get(self.list_create_url)
+            self.assertEqual(sign.call_count, 4)
+
+
+def png_upload(name, size):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    PRODUCT_IMAGE_SIZES=[50, 100],
+    PRODUCT_IMAGE_FORMATS=['webp', 'jpeg'],
+)
+class ProductImageVariantsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.local.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        storage_settings = override_settings(STORAGES={
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': self.media_root},
+            },
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.storage = Product._meta.get_field('image').storage
+        admin = User.objects.create_superuser(username='adminuser', password='adminpass')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(admin).access_token))
+        self.executor = image_pool(1)
+        self.addCleanup(self.executor.shutdown)
+
+    def process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return process_batch(self.executor)
+
+    def test_upload_renders_variants_in_background(self):
+        """
+        Ensure an upload only queues a job, and that the worker stores each
+        size and format next to the original and records their keys.
+        """
+        response = self.client.post(
+            reverse('product-list-create'),
+            {'name': 'Pictured', 'description': 'Desc', 'price': '1.00', 'image': png_upload('p.png', (400, 200))},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['result']['image_variants'], {})
+        product = Product.objects.get()
+        self.assertEqual(list(ProductImageJob.objects.values_list('image', flat=True)), [product.image.name])
+        self.assertEqual(self.storage.listdir('products')[1], [os.path.basename(product.image.name)])
+
+        self.assertEqual(self.process(), 1)
+        self.assertFalse(ProductImageJob.objects.exists())
+        product.refresh_from_db()
+        stem = os.path.splitext(product.image.name)[0]
+        self.assertEqual(product.image_variants, {
+            'webp': {'50': f'{stem}_50.webp', '100': f'{stem}_100.webp'},
+            'jpeg': {'50': f'{stem}_50.jpg', '100': f'{stem}_100.jpg'},
+        })
+        for output, sizes in (('WEBP', product.image_variants['webp']), ('JPEG', product.image_variants['jpeg'])):
+            for size, key in sizes.items():
+                with self.storage.open(key) as file, Image.open(file) as image:
+                    self.assertEqual((image.format, image.size), (output, (int(size), int(size) // 2)))
+
+        detail = self.client.get(reverse('product-detail', args=[product.id])).data['result']
+        self.assertEqual(list(detail['image_variants']['webp']), ['50', '100'])
+        self.assertIn(f'{stem}_100.webp?', detail['image_variants']['webp']['100'])
+        listed = self.client.get(reverse('product-list-create')).data['result'][0]
+        self.assertEqual(listed['image_variants'], detail['image_variants'])
+
+    def test_replaced_and_unreadable_images(self):
+        """
+        Ensure replacing an image drops its pending render and old variants,
+        and that an unreadable image is logged and can be queued again.
+        """
+        response = self.client.post(
+            reverse('product-list-create'),
+            {'name': 'Pictured', 'description': 'Desc', 'price': '1.00', 'image': png_upload('old.png', (80, 80))},
+            format='multipart'
+        )
+        product_id = response.data['result']['id']
+        self.client.patch(
+            reverse('product-detail', args=[product_id]), {'image': png_upload('new.png', (80, 80))},
+            format='multipart'
+        )
+        self.assertEqual(ProductImageJob.objects.count(), 2)
+        self.assertEqual(self.process(), 2)
+        product = Product.objects.get()
+        self.assertIn('new', product.image_variants['webp']['50'])
+        self.assertFalse(any('old_' in name for name in self.storage.listdir('products')[1]))
+
+        self.storage.save('products/broken.png', ContentFile(b'not an image'))
+        product.image = 'products/broken.png'
+        product.save()
+        self.assertEqual(product.image_variants, {})
+        with self.assertLogs('products.images', 'ERROR'):
+            self.assertEqual(self.process(), 1)
+        self.assertEqual(Product.objects.get().image_variants, {})
+        self.assertEqual(enqueue_missing(), 1)
+        self.assertEqual(enqueue_missing(), 0)
@@ -1,7 +1,7 @@
 from django.urls import path
-from .views import ProductListCreateView, ProductDetailView
+from .views import AsyncProductDetailView, AsyncProductListCreateView
 
 urlpatterns = [
-    path('', ProductListCreateView.as_view(), name='product-list-create'),
-    path('<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
+    path('', AsyncProductListCreateView.as_view(), name='product-list-create'),
+    path('<int:pk>/', AsyncProductDetailView.as_view(), name='product-detail'),
 ]
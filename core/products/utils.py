@@ -1,18 +1,114 @@
+"""
+Signed product image URLs.
+
+Signing is done with one S3 client per process (building a client costs
+far more than signing with it) and each signature is reused for the rest
+of its signing window: windows are PRODUCT_IMAGE_URL_EXPIRES minus
+PRODUCT_IMAGE_URL_MIN_TTL seconds long, so a URL handed out before its
+window ends always has at least PRODUCT_IMAGE_URL_MIN_TTL seconds left.
+Cached product responses are keyed on the window (image_url_epoch()), so
+they roll over together with the signatures they embed.
+"""
+import os
+import threading
+import time
 import boto3
+from botocore.config import Config
 from django.conf import settings
+from core.cache import LocalLRU
+
+_client = None
+_client_lock = threading.Lock()
+_signed_urls = LocalLRU(settings.PRODUCT_IMAGE_URL_CACHE_SIZE)
 
-def generate_presigned_url(key, expires_in=3600):
+
+def get_s3_client():
     """
-    Generate a pre-signed URL to access a file in MinIO for a limited time (default: 1 hour).
+    The process's S3 client, created on first use. botocore clients are
+    thread-safe; a forked worker creates its own instead of sharing the
+    parent's connection pool.
     """
-    s3_client = boto3.client(
-        's3',
-        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    )
-    return s3_client.generate_presigned_url(
+    global _client
+    pid = os.getpid()
+    client = _client
+    if client is None or client[0] != pid:
+        with _client_lock:
+            if _client is None or _client[0] != pid:
+                _client = (pid, boto3.session.Session().client(
+                    's3',
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME or None,
+                    config=Config(signature_version=settings.AWS_S3_SIGNATURE_VERSION),
+                ))
+            client = _client
+    return client[1]
+
+
+def signing_window():
+    return max(settings.PRODUCT_IMAGE_URL_EXPIRES - settings.PRODUCT_IMAGE_URL_MIN_TTL, 1)
+
+
+def image_url_epoch():
+    """
+    Index of the current signing window.
+    """
+    return int(time.time() // signing_window())
+
+
+def sign(client, key, expires_in):
+    return client.generate_presigned_url(
         ClientMethod='get_object',
         Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key},
         ExpiresIn=expires_in
     )
+
+
+def signed_image_urls(keys):
+    """
+    {key: pre-signed GET URL} for the non-empty `keys`, in one pass: URLs
+    signed earlier in the current window are reused, the rest are signed
+    with the process's client.
+    """
+    epoch = image_url_epoch()
+    window = signing_window()
+    urls = {}
+    client = None
+    for key in keys:
+        if not key or key in urls:
+            continue
+        url = _signed_urls.get((epoch, key))
+        if url is None:
+            client = client or get_s3_client()
+            url = sign(client, key, settings.PRODUCT_IMAGE_URL_EXPIRES)
+            _signed_urls.set((epoch, key), url, window)
+        urls[key] = url
+    return urls
+
+
+def variant_keys(variants):
+    return [key for sizes in variants.values() for key in sizes.values()]
+
+
+def variant_urls(variants, urls):
+    """
+    Product.image_variants with each key replaced by its URL in `urls`,
+    formats by name and sizes smallest first.
+    """
+    return {
+        variant_format: {
+            size: urls[key] for size, key in sorted(sizes.items(), key=lambda item: int(item[0]))
+        }
+        for variant_format, sizes in sorted(variants.items())
+    }
+
+
+def generate_presigned_url(key, expires_in=None):
+    """
+    Pre-signed URL to read `key` from the bucket. Without `expires_in`, the
+    URL is the cached one of the current signing window.
+    """
+    if expires_in is not None:
+        return sign(get_s3_client(), key, expires_in)
+    return signed_image_urls([key]).get(key)
@@ -1,29 +1,74 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from .cache import catalog_cache
 from .models import Product
 from .serializers import ProductSerializer
 from .permissions import IsAdminOrReadOnly
+from .utils import image_url_epoch, signed_image_urls, variant_keys, variant_urls
 from drf_spectacular.utils import extend_schema
+from core.async_views import AsyncAPIView, run_sync
+from core.conditional import alist_version, conditional_response, list_version, object_version, with_validators
+from core.fast_serializers import FastSerializer
+
+
+def cache_parts(request, *parts):
+    # Image URLs depend on the signing epoch and, for storages returning
+    # relative URLs, on the host they are made absolute against.
+    return (*parts, image_url_epoch(), request.build_absolute_uri('/'))
+
+
+def with_signed_image_urls(rows):
+    # Signs the images and variants of a whole page at once; see products.utils.
+    urls = signed_image_urls(
+        key for row in rows for key in (row['image'], *variant_keys(row['image_variants']))
+    )
+    for row in rows:
+        row['signed_image_url'] = urls.get(row['image'])
+        row['image_variants'] = variant_urls(row['image_variants'], urls)
+    return rows
+
 
 class ProductListCreateView(APIView):
     """
-    GET: List all products.
+    GET: List all products, rendered with FastSerializer from ProductSerializer
+    and served from catalog_cache until a product is written. Supports
+    conditional requests with the ETag returned.
     POST: Create a new product (admin only).
     """
     permission_classes = [IsAdminOrReadOnly]
     serializer_class = ProductSerializer
+    query_budgets = {'GET': 3}
     
     @extend_schema(
         operation_id="productsListGet"
     )
     def get(self, request):
-        products = Product.objects.all()
-        serializer = self.serializer_class(products, many=True, context={'request': request})
+        version, result = catalog_cache.get_or_set(cache_parts(request, 'list'), lambda: self.load(request))
+        return self.cached_response(request, version, result)
+
+    def load(self, request):
+        version = list_version(Product.objects.all(), image_url_epoch())
+        fast = self.get_fast_serializer(request)
+        rows = list(fast.values(Product.objects.all(), 'image_variants'))
+        return version, fast.to_representation(with_signed_image_urls(rows))
+
+    def cached_response(self, request, version, result):
+        not_modified = conditional_response(request, version)
+        if not_modified is not None:
+            return not_modified
+        return with_validators(self.list_response(result), version)
+
+    def get_fast_serializer(self, request):
+        return FastSerializer(
+            self.serializer_class(context={'request': request}), attached=('signed_image_url', 'image_variants')
+        )
+
+    def list_response(self, result):
         return Response(
             {
                 "message": "Products retrieved successfully.",
-                "result": serializer.data
+                "result": result
             },
             status=status.HTTP_200_OK
         )
@@ -47,6 +92,22 @@ class ProductListCreateView(APIView):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+class AsyncProductListCreateView(AsyncAPIView, ProductListCreateView):
+    @extend_schema(
+        operation_id="productsListGet"
+    )
+    async def get(self, request):
+        version, result = await catalog_cache.aget_or_set(cache_parts(request, 'list'), lambda: self.aload(request))
+        return self.cached_response(request, version, result)
+
+    async def aload(self, request):
+        version = await alist_version(Product.objects.all(), image_url_epoch())
+        fast = self.get_fast_serializer(request)
+        rows = [row async for row in fast.values(Product.objects.all(), 'image_variants').aiterator(chunk_size=2000)]
+        return version, fast.to_representation(with_signed_image_urls(rows))
+
+    post = run_sync(ProductListCreateView.post)
+
 class ProductDetailView(APIView):
     """
     GET: Retrieve a specific product.
@@ -56,6 +117,7 @@ class ProductDetailView(APIView):
     """
     permission_classes = [IsAdminOrReadOnly]
     serializer_class = ProductSerializer
+    query_budgets = {'GET': 2}
 
     def get_object(self, pk):
         try:
@@ -67,8 +129,22 @@ class ProductDetailView(APIView):
         operation_id="productGet"
     )
     def get(self, request, pk):
-        product = self.get_object(pk)
-        if not product:
+        cached = catalog_cache.get_or_set(
+            cache_parts(request, 'detail', pk), lambda: self.load(request, self.get_object(pk))
+        )
+        return self.retrieve_response(request, cached)
+
+    def load(self, request, product):
+        """
+        (version, serialized product) to cache, or None if it does not exist.
+        """
+        if product is None:
+            return None
+        serializer = self.serializer_class(product, context={'request': request})
+        return object_version(product, image_url_epoch()), dict(serializer.data)
+
+    def retrieve_response(self, request, cached):
+        if not cached:
             return Response(
                 {
                     "message": "Product not found.",
@@ -76,14 +152,18 @@ class ProductDetailView(APIView):
                 },
                 status=status.HTTP_404_NOT_FOUND
             )
-        serializer = self.serializer_class(product, context={'request': request})
-        return Response(
+        version, result = cached
+        not_modified = conditional_response(request, version)
+        if not_modified is not None:
+            return not_modified
+        response = Response(
             {
                 "message": "Product retrieved successfully.",
-                "result": serializer.data
+                "result": result
             },
             status=status.HTTP_200_OK
         )
+        return with_validators(response, version)
     
     def put(self, request, pk):
         product = self.get_object(pk)
@@ -159,3 +239,22 @@ class ProductDetailView(APIView):
             },
             status=status.HTTP_204_NO_CONTENT
         )
+
+class AsyncProductDetailView(AsyncAPIView, ProductDetailView):
+    async def aget_object(self, pk):
+        try:
+            return await Product.objects.aget(pk=pk)
+        except Product.DoesNotExist:
+            return None
+
+    @extend_schema(
+        operation_id="productGet"
+    )
+    async def get(self, request, pk):
+        async def aload():
+            return self.load(request, await self.aget_object(pk))
+        return self.retrieve_response(request, await catalog_cache.aget_or_set(cache_parts(request, 'detail', pk), aload))
+
+    put = run_sync(ProductDetailView.put)
+    patch = run_sync(ProductDetailView.patch)
+    delete = run_sync(ProductDetailView.delete)
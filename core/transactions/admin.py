@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Transaction
+from .models import OutboxEvent, RevenueRollup, Transaction
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
@@ -7,3 +7,17 @@ class TransactionAdmin(admin.ModelAdmin):
     search_fields = ('invoice__id', 'invoice__user__username', 'status')
     list_filter = ('status', 'transaction_date')
     ordering = ('-transaction_date',)
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'group_name', 'created_at')
+    list_filter = ('event_type',)
+    ordering = ('id',)
+
+
+@admin.register(RevenueRollup)
+class RevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ('granularity', 'bucket', 'status', 'total_amount', 'transaction_count')
+    list_filter = ('granularity', 'status')
+    ordering = ('-bucket',)
@@ -0,0 +1,82 @@
+"""
+Cascade of invoice cancellation to the invoice's PENDING transactions.
+
+All pending transactions of the cancelled invoices are failed with one
+UPDATE ... RETURNING; the returned rows feed the revenue rollup deltas and
+one grouped `transaction_batch_update` notification per affected user.
+The UPDATE only matches rows that are still PENDING.
+
+Lock order: the invoice, then its transactions. Completing a transaction
+(TransactionStatusUpdateSerializer, Transaction.save()) locks the invoice
+before the transaction row too, so a completion and a cancellation of the
+same invoice run one after the other: a transaction completed first stays
+COMPLETED, one cancelled first makes the completion a 409 Conflict.
+"""
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+from accounts.summaries import record_invoice_changes
+from invoices.models import Invoice
+from .models import Transaction
+from .notifications import notify_transactions
+from .rollups import apply_deltas
+
+
+def fail_pending_transactions(invoice_ids):
+    """
+    Fail the PENDING transactions of `invoice_ids`. Must run inside the
+    database transaction that cancels the invoices.
+    Returns the failed transactions.
+    """
+    if not invoice_ids:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {Transaction._meta.db_table}
+            SET status = 'FAILED'
+            WHERE invoice_id = ANY(%s) AND status = 'PENDING'
+            RETURNING id, invoice_id, user_id, amount, status, transaction_date
+        """, [sorted(set(invoice_ids))])
+        failed = [
+            Transaction(
+                id=pk, invoice_id=invoice_id, user_id=user_id, amount=amount,
+                status=status, transaction_date=transaction_date
+            )
+            for pk, invoice_id, user_id, amount, status, transaction_date in cursor.fetchall()
+        ]
+
+    apply_deltas(
+        change
+        for transaction in failed
+        for change in (
+            (transaction.transaction_date, 'PENDING', -transaction.amount, -1),
+            (transaction.transaction_date, 'FAILED', transaction.amount, 1),
+        )
+    )
+    notify_transactions(failed)
+    return failed
+
+
+def cancel_invoices(invoice_ids):
+    """
+    Cancel every invoice of `invoice_ids` that is not cancelled yet and fail
+    their pending transactions, in one database transaction.
+    Returns the ids of the invoices cancelled and the failed transactions.
+    """
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {Invoice._meta.db_table} AS i
+            SET status = 'CANCELLED', updated_at = %s
+            FROM (
+                SELECT id, status FROM {Invoice._meta.db_table}
+                WHERE id = ANY(%s) AND status <> 'CANCELLED' ORDER BY id FOR UPDATE
+            ) AS old
+            WHERE i.id = old.id
+            RETURNING i.id, i.user_id, old.status, i.total_amount, i.amount_paid
+        """, [timezone.now(), sorted(set(invoice_ids))])
+        rows = cursor.fetchall()
+        record_invoice_changes(
+            (user_id, (status, total_amount, amount_paid), ('CANCELLED', total_amount, amount_paid))
+            for pk, user_id, status, total_amount, amount_paid in rows
+        )
+        cancelled = sorted(row[0] for row in rows)
+        return cancelled, fail_pending_transactions(cancelled)
@@ -1,22 +1,106 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
+from .replay import get_replay_buffer
 
 class UserTransactionConsumer(AsyncWebsocketConsumer):
+    """
+    Streams a user's transaction updates.
+
+    By default every update is sent as its own frame. Clients that connect
+    with `?delivery=batch` instead receive JSON array frames: updates are
+    buffered for TRANSACTION_WS_BATCH_WINDOW seconds (or until
+    TRANSACTION_WS_BATCH_MAX_EVENTS distinct transactions are pending) and
+    multiple updates to the same transaction are coalesced into its latest state.
+
+    Every update carries the `seq` of the user's event stream. A client that
+    reconnects with `?since=<seq>` first receives the updates it missed from
+    the replay buffer, or a `{"type": "resync_required"}` frame when they
+    have already been evicted.
+
+    Connections must be authenticated (see accounts.middleware.JWTAuthMiddleware)
+    as the user named in the URL.
+    """
     async def connect(self):
         self.user_id = self.scope['url_route']['kwargs']['user_id']
         self.group_name = f'user_{self.user_id}_transactions'
+        self.flush_task = None
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated or str(user.id) != self.user_id:
+            await self.close()
+            return
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.batched = query.get('delivery', [''])[0] == 'batch'
+        self.pending = {}
+        self.replayed_seq = 0
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
-        await self.accept()
+        await self.accept(subprotocol=self.scope.get('auth_subprotocol'))
+
+        since = query.get('since', [''])[0]
+        if since.isdigit():
+            await self.replay(int(since))
+
+    async def replay(self, since):
+        # Live events are only dispatched once connect() returns, so anything
+        # published while we read the buffer is dropped below by its seq.
+        missed = await sync_to_async(get_replay_buffer().since)(self.group_name, since)
+        if missed is None:
+            await self.send(text_data=json.dumps({"type": "resync_required"}))
+            return
+        for seq, event in missed:
+            await self.dispatch({**event, "seq": seq})
+        if missed:
+            self.replayed_seq = missed[-1][0]
 
     async def disconnect(self, close_code):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
 
     async def transaction_update(self, event):
-        message = event['message']
-        await self.send(text_data=json.dumps(message))
+        await self.deliver(event, [event['message']])
+
+    async def transaction_batch_update(self, event):
+        await self.deliver(event, event['messages'])
+
+    async def deliver(self, event, messages):
+        seq = event.get('seq')
+        if seq is not None:
+            if seq <= self.replayed_seq:
+                return
+            messages = [{**message, "seq": seq} for message in messages]
+
+        if not self.batched:
+            for message in messages:
+                await self.send(text_data=json.dumps(message))
+            return
+
+        for message in messages:
+            self.pending[message['transaction_id']] = message
+        if len(self.pending) >= settings.TRANSACTION_WS_BATCH_MAX_EVENTS:
+            await self.flush()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_after_window())
+
+    async def flush_after_window(self):
+        await asyncio.sleep(settings.TRANSACTION_WS_BATCH_WINDOW)
+        await self.flush()
+
+    async def flush(self):
+        if self.flush_task is not None and self.flush_task is not asyncio.current_task():
+            self.flush_task.cancel()
+        self.flush_task = None
+        if not self.pending:
+            return
+        messages = list(self.pending.values())
+        self.pending = {}
+        await self.send(text_data=json.dumps(messages))
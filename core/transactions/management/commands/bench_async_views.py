@@ -0,0 +1,119 @@
+import asyncio
+import statistics
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import path
+from rest_framework_simplejwt.tokens import AccessToken
+from invoices.models import Invoice
+from invoices.views import AsyncInvoiceListCreateView, InvoiceListCreateView
+from products.views import AsyncProductListCreateView, ProductListCreateView
+from transactions.models import Transaction
+from transactions.views import AsyncTransactionListView, TransactionListView
+
+# Both variants of each read endpoint, mounted side by side for the run.
+urlpatterns = [
+    path('sync/transactions/', TransactionListView.as_view()),
+    path('async/transactions/', AsyncTransactionListView.as_view()),
+    path('sync/invoices/', InvoiceListCreateView.as_view()),
+    path('async/invoices/', AsyncInvoiceListCreateView.as_view()),
+    path('sync/products/', ProductListCreateView.as_view()),
+    path('async/products/', AsyncProductListCreateView.as_view()),
+]
+ENDPOINTS = ('transactions', 'invoices', 'products')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/s and latency of the sync and async variants of the "
+        "list endpoints, driving the ASGI handler in-process under concurrent load."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and variant.")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--rows', type=int, default=200, help="Transactions created for the benchmark user.")
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}')
+        invoice = Invoice.objects.create(user=user)
+        Transaction.objects.bulk_create(
+            Transaction(invoice=invoice, user=user, amount=invoice.total_amount)
+            for _ in range(options['rows'])
+        )
+        token = str(AccessToken.for_user(user))
+        try:
+            with override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=['localhost']):
+                results = asyncio.run(self.run(token, options['requests'], options['concurrency']))
+        finally:
+            user.delete()
+
+        self.stdout.write(f"requests={options['requests']} concurrency={options['concurrency']}")
+        for (endpoint, variant), (elapsed, latencies, failures) in results.items():
+            latencies.sort()
+            self.stdout.write(
+                f"{endpoint:<13} {variant:<5} {len(latencies) / elapsed:8.1f} req/s "
+                f"p50={statistics.median(latencies) * 1000:7.2f}ms "
+                f"p99={latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000:7.2f}ms "
+                f"failures={failures}"
+            )
+
+    async def run(self, token, requests, concurrency):
+        application = ASGIHandler()
+        results = {}
+        for endpoint in ENDPOINTS:
+            for variant in ('sync', 'async'):
+                results[(endpoint, variant)] = await self.load(
+                    application, f'/{variant}/{endpoint}/', token, requests, concurrency
+                )
+        return results
+
+    async def load(self, application, url, token, requests, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        failures = 0
+
+        async def one():
+            nonlocal failures
+            async with semaphore:
+                started = time.perf_counter()
+                status = await self.request(application, url, token)
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    failures += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - started, latencies, failures
+
+    async def request(self, application, url, token):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': url,
+            'query_string': b'',
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+            'server': ('localhost', 80),
+            'client': ('127.0.0.1', 0),
+        }
+        received = asyncio.Event()
+        messages = []
+
+        async def receive():
+            if received.is_set():
+                # Nothing more to read; wait for the handler to finish.
+                await asyncio.Future()
+            received.set()
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await application(scope, receive, send)
+        return messages[0]['status']
@@ -0,0 +1,116 @@
+import statistics
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from core.fast_serializers import FastSerializer
+from invoices.models import Invoice, InvoiceItem
+from invoices.serializers import InvoiceSerializer
+from invoices.views import InvoiceListCreateView
+from products.models import Product
+from products.serializers import ProductSerializer
+from products.views import ProductListCreateView, with_signed_image_urls
+from transactions.models import Transaction
+from transactions.serializers import TransactionListSerializer
+
+ENDPOINTS = ('transactions', 'invoices', 'products')
+
+
+class Command(BaseCommand):
+    help = (
+        "Render growing numbers of rows through the DRF list serializers and "
+        "through FastSerializer, check the JSON is identical and compare timings. "
+        "Rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        sizes, repeat = sorted(options['sizes']), options['repeat']
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}')
+            created = 0
+            for size in sizes:
+                self.add_rows(user, size - created)
+                created = size
+                for endpoint in ENDPOINTS:
+                    drf, fast = getattr(self, f'render_{endpoint}')(user)
+                    self.report(endpoint, size, repeat, drf, fast)
+            transaction.set_rollback(True)
+
+    def add_rows(self, user, count):
+        product = Product.objects.create(name='bench', description='', price=1)
+        Product.objects.bulk_create(
+            Product(name=f'bench-{i}', description='', price=i % 100) for i in range(count - 1)
+        )
+        invoices = Invoice.objects.bulk_create(
+            Invoice(user=user, total_amount=2) for _ in range(count)
+        )
+        InvoiceItem.objects.bulk_create(
+            InvoiceItem(invoice=invoice, product=product, quantity=2, product_name='bench', unit_price=1)
+            for invoice in invoices
+        )
+        Transaction.objects.bulk_create(
+            Transaction(invoice=invoice, user=user, amount=invoice.total_amount) for invoice in invoices
+        )
+
+    def render_transactions(self, user):
+        queryset = Transaction.objects.filter(user=user).order_by('-transaction_date', '-id')
+
+        def drf():
+            return TransactionListSerializer(queryset.select_related('invoice'), many=True).data
+
+        def fast():
+            serializer = FastSerializer(TransactionListSerializer())
+            return serializer.to_representation(list(serializer.values(queryset)))
+        return drf, fast
+
+    def render_invoices(self, user):
+        queryset = Invoice.objects.filter(user=user).order_by('-created_at', '-id')
+        view = InvoiceListCreateView()
+        fields = list(view.list_fields) + ['products_info']
+
+        def drf():
+            return InvoiceSerializer(queryset.prefetch_related('items'), many=True).data
+
+        def fast():
+            serializer = view.get_fast_serializer(None, fields)
+            rows = list(serializer.values(queryset))
+            items = view.get_items_serializer(None)
+            view.attach_items(rows, items, list(view.get_items(items, rows)))
+            return serializer.to_representation(rows)
+        return drf, fast
+
+    def render_products(self, user):
+        queryset = Product.objects.order_by('id')
+
+        def drf():
+            return ProductSerializer(queryset, many=True).data
+
+        def fast():
+            serializer = ProductListCreateView().get_fast_serializer(None)
+            return serializer.to_representation(with_signed_image_urls(list(serializer.values(queryset, 'image_variants'))))
+        return drf, fast
+
+    def report(self, endpoint, size, repeat, drf, fast):
+        renderer = JSONRenderer()
+        timings = {}
+        output = {}
+        for name, render in (('drf', drf), ('fast', fast)):
+            runs = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                output[name] = renderer.render(render())
+                runs.append(time.perf_counter() - started)
+            timings[name] = statistics.median(runs)
+        if output['drf'] != output['fast']:
+            self.stderr.write(self.style.ERROR(f"{endpoint} rows={size}: outputs differ"))
+        self.stdout.write(
+            f"{endpoint:<12} rows={size:<7} drf={timings['drf'] * 1000:9.1f}ms "
+            f"fast={timings['fast'] * 1000:9.1f}ms speedup={timings['drf'] / timings['fast']:5.1f}x "
+            f"bytes={len(output['fast'])}"
+        )
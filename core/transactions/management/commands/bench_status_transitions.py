@@ -0,0 +1,93 @@
+import statistics
+import threading
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from invoices.models import Invoice
+from transactions.models import OutboxEvent, Transaction
+from transactions.serializers import StatusConflict, TransactionStatusUpdateSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer single PENDING transactions with concurrent status updates and "
+        "check that exactly one writer wins each race."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        threads, rounds = options['threads'], options['rounds']
+        user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}')
+        invoice = Invoice.objects.create(user=user)
+        try:
+            latencies, wins, conflicts, elapsed = self.run(invoice, threads, rounds)
+        finally:
+            group_name = f'user_{user.id}_transactions'
+            OutboxEvent.objects.filter(group_name=group_name).delete()
+            user.delete()
+
+        attempts = wins + conflicts
+        latencies.sort()
+        self.stdout.write(f"threads={threads} rounds={rounds} attempts={attempts}")
+        self.stdout.write(f"wins={wins} conflicts={conflicts} lost_updates={max(wins - rounds, 0)}")
+        self.stdout.write(
+            f"throughput={attempts / elapsed:.1f} updates/s "
+            f"p50={statistics.median(latencies) * 1000:.2f}ms "
+            f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms"
+        )
+        if wins != rounds:
+            self.stderr.write(self.style.ERROR(f"expected exactly {rounds} winning updates, got {wins}"))
+
+    def run(self, invoice, threads, rounds):
+        latencies = []
+        outcomes = []
+        lock = threading.Lock()
+        elapsed = 0.0
+
+        def attempt(transaction, new_status, barrier):
+            serializer = TransactionStatusUpdateSerializer(
+                transaction, data={'status': new_status}, partial=True
+            )
+            serializer.is_valid(raise_exception=True)
+            connection.ensure_connection()
+            barrier.wait()
+            started = time.perf_counter()
+            try:
+                serializer.save()
+                won = True
+            except StatusConflict:
+                won = False
+            latency = time.perf_counter() - started
+            connection.close()
+            with lock:
+                latencies.append(latency)
+                outcomes.append(won)
+
+        for _ in range(rounds):
+            transaction = Transaction.objects.create(invoice=invoice, amount=invoice.total_amount)
+            barrier = threading.Barrier(threads)
+            workers = [
+                threading.Thread(
+                    target=attempt,
+                    args=(
+                        Transaction.objects.get(pk=transaction.pk),
+                        'COMPLETED' if i % 2 else 'FAILED',
+                        barrier,
+                    ),
+                )
+                for i in range(threads)
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed += time.perf_counter() - started
+
+        wins = sum(outcomes)
+        return latencies, wins, len(outcomes) - wins, elapsed
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from transactions.outbox import dispatch_batch, outbox_metrics
+
+
+class Command(BaseCommand):
+    help = "Drain the notification outbox and publish its events to the channel layer."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--poll-interval', type=float, default=0.5,
+            help="Seconds to sleep when the outbox is empty."
+        )
+        parser.add_argument(
+            '--metrics-interval', type=float, default=30.0,
+            help="Seconds between backlog/lag reports."
+        )
+        parser.add_argument('--once', action='store_true', help="Drain the current backlog and exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        next_report = 0.0
+        try:
+            while True:
+                dispatched = dispatch_batch(batch_size)
+                if options['once'] and dispatched < batch_size:
+                    break
+                if time.monotonic() >= next_report:
+                    self.report()
+                    next_report = time.monotonic() + options['metrics_interval']
+                if dispatched < batch_size:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.report()
+
+    def report(self):
+        metrics = outbox_metrics()
+        self.stdout.write(
+            f"outbox backlog={metrics['backlog']} delivery_lag_seconds={metrics['delivery_lag_seconds']}"
+        )
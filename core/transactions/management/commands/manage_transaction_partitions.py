@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from transactions.partitions import (
+    add_months,
+    create_partition,
+    detach_partition,
+    month_start,
+    monthly_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-create upcoming monthly partitions of the transactions table and "
+        "detach (optionally drop) partitions older than the retention window."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+        parser.add_argument(
+            '--retain-months', type=int, default=None,
+            help="Detach partitions that ended more than this many months ago. Keeps everything by default."
+        )
+        parser.add_argument(
+            '--drop', action='store_true',
+            help="Drop detached partitions instead of keeping them as standalone tables."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Transaction partitioning requires PostgreSQL.")
+
+        current = month_start(timezone.now())
+        with connection.cursor() as cursor:
+            existing = monthly_partitions(cursor)
+
+        for offset in range(options['months_ahead'] + 1):
+            month = add_months(current, offset)
+            if month in existing:
+                continue
+            with transaction.atomic(), connection.cursor() as cursor:
+                name = create_partition(cursor, month)
+            self.stdout.write(f"created {name}")
+
+        if options['retain_months'] is None:
+            return
+        cutoff = add_months(current, -options['retain_months'])
+        for month, name in sorted(existing.items()):
+            if add_months(month, 1) > cutoff:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                detach_partition(cursor, name, drop=options['drop'])
+            self.stdout.write(f"{'dropped' if options['drop'] else 'detached'} {name}")
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Min, Max, Sum
+from django.db.models.functions import Trunc
+from transactions.models import RevenueRollup, Transaction
+from transactions.rollups import GRANULARITIES, bucket_start
+
+
+def rebuild_chunk(start, end):
+    """
+    Recompute every rollup bucket in [start, end) from the transactions table.
+    `start` and `end` must be UTC midnights so no bucket straddles two chunks.
+    """
+    with transaction.atomic():
+        RevenueRollup.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+        rows = []
+        for granularity in GRANULARITIES:
+            buckets = Transaction.objects.filter(
+                transaction_date__gte=start,
+                transaction_date__lt=end
+            ).annotate(
+                bucket=Trunc('transaction_date', granularity, tzinfo=timezone.utc)
+            ).values('bucket', 'status').annotate(
+                total_amount=Sum('amount'),
+                transaction_count=Count('id')
+            ).order_by()
+            rows.extend(RevenueRollup(granularity=granularity, **bucket) for bucket in buckets)
+        RevenueRollup.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_chunk_in_thread(chunk):
+    try:
+        return rebuild_chunk(*chunk)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the revenue rollup from the transactions table in parallel "
+        "day-aligned chunks. Meant for backfills; buckets of the chunk being "
+        "rebuilt should not receive writes meanwhile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=datetime.fromisoformat, help="Defaults to the oldest transaction.")
+        parser.add_argument('--end', type=datetime.fromisoformat, help="Defaults to the newest transaction.")
+        parser.add_argument('--chunk-days', type=int, default=7)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        bounds = Transaction.objects.aggregate(oldest=Min('transaction_date'), newest=Max('transaction_date'))
+        start = options['start'] or bounds['oldest']
+        end = options['end'] or bounds['newest']
+        if start is None or end is None:
+            self.stdout.write("no transactions to roll up")
+            return
+        start = bucket_start(self.aware(start), 'day')
+        end = bucket_start(self.aware(end), 'day') + timedelta(days=1)
+        if options['chunk_days'] < 1 or options['workers'] < 1:
+            raise CommandError("--chunk-days and --workers must be positive.")
+
+        chunks = []
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days']), end)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end
+
+        if options['workers'] == 1:
+            self.report(chunks, (rebuild_chunk(*chunk) for chunk in chunks))
+            return
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            self.report(chunks, executor.map(rebuild_chunk_in_thread, chunks))
+
+    def report(self, chunks, results):
+        for (chunk_start, chunk_end), rows in zip(chunks, results):
+            self.stdout.write(f"rebuilt {chunk_start:%Y-%m-%d}..{chunk_end:%Y-%m-%d}: {rows} buckets")
+
+    def aware(self, value):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
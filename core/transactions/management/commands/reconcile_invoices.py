@@ -0,0 +1,57 @@
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from invoices.models import Invoice
+from transactions.reconciliation import reconcile_id_range
+
+
+def reconcile_chunk(bounds):
+    with transaction.atomic():
+        return Counter(payment_status for _, payment_status in reconcile_id_range(*bounds))
+
+
+class Command(BaseCommand):
+    help = (
+        "Settle every invoice against its completed transactions, in id-range "
+        "chunks spread over worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Invoice ids per chunk.")
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+
+    def handle(self, *args, **options):
+        chunk_size, workers = options['chunk_size'], options['workers']
+        if chunk_size < 1 or workers < 1:
+            raise CommandError("--chunk-size and --workers must be positive.")
+
+        bounds = Invoice.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write("no invoices to reconcile")
+            return
+        chunks = [
+            (low, low + chunk_size)
+            for low in range(bounds['low'], bounds['high'] + 1, chunk_size)
+        ]
+
+        if workers == 1:
+            results = map(reconcile_chunk, chunks)
+            self.report(len(chunks), results)
+            return
+
+        # Forked workers must not share the parent's database connection;
+        # each opens its own on first use.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            self.report(len(chunks), executor.map(reconcile_chunk, chunks))
+
+    def report(self, chunk_count, results):
+        changed = Counter()
+        for result in results:
+            changed.update(result)
+        summary = ' '.join(f"{status.lower()}={count}" for status, count in sorted(changed.items()))
+        self.stdout.write(f"chunks={chunk_count} changed={sum(changed.values())} {summary}".rstrip())
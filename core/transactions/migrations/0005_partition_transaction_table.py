@@ -0,0 +1,194 @@
+"""
+Convert transactions_transaction into a table partitioned by month on
+transaction_date, online.
+
+1. Create a partitioned shadow table with the same columns, indexes and
+   foreign keys (under temporary names) and a trigger that mirrors every
+   insert, update and delete on the live table into it.
+2. Copy the existing rows in id-ordered chunks, one short transaction each,
+   share-locking each chunk so concurrent changes to it wait for the copy.
+3. In one brief ACCESS EXCLUSIVE transaction, move the id sequence over,
+   drop the old table and rename the shadow table and its indexes and
+   constraints into place.
+
+Only PostgreSQL is converted; other backends keep the plain table.
+"""
+from datetime import datetime, timezone
+
+from django.db import migrations, transaction
+
+TABLE = 'transactions_transaction'
+SHADOW = 'transactions_transaction_partitioned'
+SYNC_FUNCTION = 'transactions_transaction_partition_sync'
+CHUNK_SIZE = 10000
+MONTHS_AHEAD = 3
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def temporary_name(name):
+    return f'{name[:59]}_tmp'
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    return cursor.fetchone()[0] == 'p'
+
+
+def create_shadow_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE {SHADOW} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING IDENTITY)
+        PARTITION BY RANGE (transaction_date)
+    """)
+    cursor.execute(f"ALTER TABLE {SHADOW} ADD PRIMARY KEY (id, transaction_date)")
+
+    cursor.execute(f"SELECT min(transaction_date) FROM {TABLE}")
+    oldest = cursor.fetchone()[0] or datetime.now(timezone.utc)
+    month = month_start(oldest)
+    last = add_months(month_start(datetime.now(timezone.utc)), MONTHS_AHEAD)
+    while month <= last:
+        cursor.execute(
+            f"CREATE TABLE {TABLE}_y{month.year}m{month.month:02d} PARTITION OF {SHADOW} "
+            "FOR VALUES FROM (%s) TO (%s)",
+            [month, add_months(month, 1)]
+        )
+        month = add_months(month, 1)
+    cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {SHADOW} DEFAULT")
+
+    # pg_get_indexdef() qualifies the table with its schema and quotes both
+    # parts as format('%I.%I') does, so build the names to swap the same way.
+    cursor.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid),
+               format('%%I.%%I', n.nspname, t.relname), format('%%I.%%I', n.nspname, %s)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+    """, [SHADOW, TABLE])
+    for name, definition, table, shadow in cursor.fetchall():
+        definition = definition.replace(f' ON {table} ', f' ON {shadow} ', 1)
+        definition = definition.replace(f' INDEX {name} ', f' INDEX {temporary_name(name)} ', 1)
+        cursor.execute(definition)
+
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'
+    """, [TABLE])
+    for name, definition in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {SHADOW} ADD CONSTRAINT {temporary_name(name)} {definition}")
+
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = %s ORDER BY ordinal_position
+    """, [TABLE])
+    columns = [row[0] for row in cursor.fetchall()]
+    assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns)
+    cursor.execute(f"""
+        CREATE FUNCTION {SYNC_FUNCTION}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {SHADOW}
+                WHERE id = OLD.id AND transaction_date = OLD.transaction_date
+                  AND (TG_OP = 'DELETE' OR OLD.transaction_date <> NEW.transaction_date);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {SHADOW} SELECT (NEW).*
+                ON CONFLICT (id, transaction_date) DO UPDATE SET {assignments};
+                RETURN NEW;
+            END IF;
+            RETURN OLD;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER {SYNC_FUNCTION} AFTER INSERT OR UPDATE OR DELETE ON {TABLE}
+        FOR EACH ROW EXECUTE FUNCTION {SYNC_FUNCTION}()
+    """)
+
+
+def copy_chunk(cursor, after_id):
+    # FOR SHARE makes a concurrent UPDATE or DELETE of a chunk row wait until
+    # the chunk is committed, so its trigger then finds the copy to remove;
+    # rows changed before the lock is taken are read in their latest version.
+    cursor.execute(f"""
+        WITH chunk AS (
+            SELECT * FROM {TABLE} WHERE id > %s ORDER BY id LIMIT %s FOR SHARE
+        ), copied AS (
+            INSERT INTO {SHADOW} SELECT * FROM chunk
+            ON CONFLICT (id, transaction_date) DO NOTHING
+        )
+        SELECT max(id) FROM chunk
+    """, [after_id, CHUNK_SIZE])
+    return cursor.fetchone()[0]
+
+
+def swap_tables(cursor):
+    cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+    cursor.execute(
+        "SELECT pg_get_serial_sequence(%s, 'id'), pg_get_serial_sequence(%s, 'id')",
+        [TABLE, SHADOW]
+    )
+    sequence, shadow_sequence = cursor.fetchone()
+    cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+    cursor.execute("SELECT setval(%s, %s, %s)", [shadow_sequence, *cursor.fetchone()])
+    cursor.execute("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+    """, [TABLE])
+    index_names = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE]
+    )
+    constraint_names = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute(f"DROP TABLE {TABLE}")
+    cursor.execute(f"DROP FUNCTION {SYNC_FUNCTION}()")
+    cursor.execute(f"ALTER TABLE {SHADOW} RENAME TO {TABLE}")
+    cursor.execute(f"ALTER SEQUENCE {shadow_sequence} RENAME TO {sequence.split('.')[-1]}")
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {SHADOW}_pkey TO {TABLE}_pkey")
+    for name in index_names:
+        cursor.execute(f"ALTER INDEX {temporary_name(name)} RENAME TO {name}")
+    for name in constraint_names:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {temporary_name(name)} TO {name}")
+
+
+def partition_transactions(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return
+        create_shadow_table(cursor)
+
+    last_id = 0
+    while last_id is not None:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            last_id = copy_chunk(cursor, last_id)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        swap_tables(cursor)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('transactions', '0004_outboxevent'),
+    ]
+
+    operations = [
+        # The partitioned table is a drop-in replacement for the plain one,
+        # so going back to an earlier migration leaves it in place.
+        migrations.RunPython(partition_transactions, migrations.RunPython.noop),
+    ]
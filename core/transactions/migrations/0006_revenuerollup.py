@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:00
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+BACKFILL_ROLLUP_SQL = """
+INSERT INTO transactions_revenuerollup (granularity, bucket, status, total_amount, transaction_count)
+SELECT g.granularity,
+       date_trunc(g.granularity, t.transaction_date AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+       t.status, SUM(t.amount), COUNT(*)
+FROM transactions_transaction AS t
+CROSS JOIN (VALUES ('hour'), ('day')) AS g (granularity)
+GROUP BY 1, 2, 3
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_partition_transaction_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], max_length=10)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket', 'status'), name='revenue_rollup_bucket_uniq')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_ROLLUP_SQL, migrations.RunSQL.noop),
+    ]
@@ -1,5 +1,6 @@
 from decimal import Decimal
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from invoices.models import Invoice
 from django.core.validators import MinValueValidator
 
@@ -15,6 +16,14 @@ class Transaction(models.Model):
         on_delete=models.CASCADE,
         related_name='transactions'
     )
+    # Denormalized invoice owner so per-user history pages can be served
+    # from a single (user, transaction_date, id) index range scan.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='transactions',
+        editable=False
+    )
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
     status = models.CharField(
         max_length=10,
@@ -23,5 +32,72 @@ class Transaction(models.Model):
     )
     transaction_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-transaction_date', '-id'], name='txn_user_date_id_idx'),
+            models.Index(fields=['-transaction_date', '-id'], name='txn_date_id_idx'),
+            # List filters: status within one user's history, and the
+            # staff-wide view of transactions still awaiting settlement.
+            models.Index(fields=['user', 'status', '-transaction_date', '-id'], name='txn_user_status_date_idx'),
+            models.Index(
+                fields=['-transaction_date', '-id'],
+                name='txn_pending_date_idx',
+                condition=models.Q(status='PENDING')
+            ),
+        ]
+
     def __str__(self):
         return f"Transaction #{self.pk} - Invoice #{self.invoice.pk} - {self.status}"
+
+    def save(self, *args, **kwargs):
+        if self.user_id is None:
+            self.user_id = self.invoice.user_id
+        # post_save handlers write outbox rows; keep them in the same
+        # database transaction as the row they describe.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class OutboxEvent(models.Model):
+    """
+    A channel-layer event waiting to be published by the outbox dispatcher
+    (`manage.py dispatch_outbox`). Rows are written in the same database
+    transaction as the change they describe, so a rolled-back write never
+    produces a notification and a slow channel layer never blocks a request.
+    """
+    group_name = models.CharField(max_length=100)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"OutboxEvent #{self.pk} - {self.event_type} -> {self.group_name}"
+
+
+class RevenueRollup(models.Model):
+    """
+    Running amount and count of transactions per (granularity, bucket, status),
+    kept up to date by transactions.rollups as transactions are created and
+    change status. `bucket` is the UTC start of the hour or day.
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Transaction.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket', 'status'],
+                name='revenue_rollup_bucket_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"RevenueRollup {self.granularity} {self.bucket:%Y-%m-%d %H:00} {self.status}"
@@ -0,0 +1,47 @@
+from collections import defaultdict
+from .models import OutboxEvent
+
+
+def transaction_group_name(user_id):
+    return f'user_{user_id}_transactions'
+
+
+def build_transaction_message(transaction):
+    return {
+        "transaction_id": transaction.id,
+        "invoice_id": transaction.invoice_id,
+        "amount": str(transaction.amount),
+        "status": transaction.status,
+        "transaction_date": str(transaction.transaction_date),
+    }
+
+
+def notify_transaction(transaction):
+    """
+    Queue a `transaction_update` event in the outbox. Must be called inside
+    the database transaction that changed `transaction`.
+    """
+    OutboxEvent.objects.create(
+        group_name=transaction_group_name(transaction.user_id),
+        event_type="transaction_update",
+        payload={"message": build_transaction_message(transaction)},
+    )
+
+
+def notify_transactions(transactions):
+    """
+    Queue one `transaction_batch_update` event per affected user instead of
+    one event per transaction.
+    """
+    messages_by_user = defaultdict(list)
+    for transaction in transactions:
+        messages_by_user[transaction.user_id].append(build_transaction_message(transaction))
+
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            group_name=transaction_group_name(user_id),
+            event_type="transaction_batch_update",
+            payload={"messages": messages},
+        )
+        for user_id, messages in messages_by_user.items()
+    ])
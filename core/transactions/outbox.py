@@ -0,0 +1,61 @@
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from .models import OutboxEvent
+from .replay import get_replay_buffer
+
+logger = logging.getLogger(__name__)
+
+
+async def _publish(channel_layer, messages):
+    for group_name, message in messages:
+        await channel_layer.group_send(group_name, message)
+
+
+def dispatch_batch(batch_size=100):
+    """
+    Publish up to `batch_size` pending outbox events to the channel layer and
+    delete them. Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so
+    several dispatchers can drain the outbox concurrently. Each event is
+    stamped with the next sequence number of its group's stream and recorded
+    in the replay buffer before it is published. Delivery is at-least-once:
+    if publishing fails the batch is rolled back and retried.
+    Returns the number of events dispatched.
+    """
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects
+            .select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+        replay_buffer = get_replay_buffer()
+        messages = []
+        for event in events:
+            message = {"type": event.event_type, **event.payload}
+            seq = replay_buffer.append(event.group_name, message)
+            messages.append((event.group_name, {**message, "seq": seq}))
+        async_to_sync(_publish)(get_channel_layer(), messages)
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+
+    lag = (timezone.now() - events[0].created_at).total_seconds()
+    logger.info("outbox dispatched=%d max_delivery_lag_seconds=%.3f", len(events), lag)
+    return len(events)
+
+
+def outbox_metrics():
+    """
+    Current backlog size and delivery lag (age of the oldest undelivered event).
+    """
+    stats = OutboxEvent.objects.aggregate(backlog=Count('id'), oldest=Min('created_at'))
+    lag = 0.0
+    if stats['oldest'] is not None:
+        lag = (timezone.now() - stats['oldest']).total_seconds()
+    return {
+        "backlog": stats['backlog'],
+        "delivery_lag_seconds": round(lag, 3),
+    }
@@ -0,0 +1,82 @@
+"""
+Maintenance helpers for the monthly range partitions of the transactions
+table (see migration 0005). PostgreSQL only.
+"""
+import re
+from datetime import datetime, timezone
+from .models import Transaction
+
+MONTHLY_PARTITION = re.compile(r'_y(\d{4})m(\d{2})$')
+
+
+def parent_table():
+    return Transaction._meta.db_table
+
+
+def default_partition():
+    return f'{parent_table()}_default'
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{parent_table()}_y{month.year}m{month.month:02d}'
+
+
+def monthly_partitions(cursor):
+    """
+    Map the first day of each month that has a partition to the partition name.
+    """
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, [parent_table()])
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = MONTHLY_PARTITION.search(name)
+        if match:
+            partitions[datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)] = name
+    return partitions
+
+
+def create_partition(cursor, month):
+    """
+    Create the partition for `month`. Rows that already landed in the default
+    partition for that month are moved into it.
+    """
+    parent, default = parent_table(), default_partition()
+    name = partition_name(month)
+    bounds = [month, add_months(month, 1)]
+
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {default} "
+        "WHERE transaction_date >= %s AND transaction_date < %s)",
+        bounds
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)", bounds)
+        return name
+
+    cursor.execute(f"ALTER TABLE {parent} DETACH PARTITION {default}")
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)", bounds)
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {default} "
+        "WHERE transaction_date >= %s AND transaction_date < %s RETURNING *) "
+        f"INSERT INTO {parent} SELECT * FROM moved",
+        bounds
+    )
+    cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {default} DEFAULT")
+    return name
+
+
+def detach_partition(cursor, name, drop=False):
+    cursor.execute(f"ALTER TABLE {parent_table()} DETACH PARTITION {name}")
+    if drop:
+        cursor.execute(f"DROP TABLE {name}")
@@ -0,0 +1,95 @@
+"""
+Settlement of invoices against their COMPLETED transactions.
+
+`amount_paid` is recomputed as the sum of the invoice's completed
+transactions and compared with `total_amount` in one set-based UPDATE per
+batch of invoices: PENDING invoices that are fully paid become PAID, and
+`payment_status` records UNPAID / UNDERPAID / PAID / OVERPAID for every
+invoice. Runs incrementally whenever a transaction is completed (see
+signals and TransactionStatusUpdateSerializer) and in bulk through
+`manage.py reconcile_invoices`.
+"""
+from django.db import connection
+from accounts.summaries import record_invoice_changes
+from invoices.models import Invoice
+from .models import Transaction
+
+RECONCILE_SQL = """
+WITH paid AS (
+    SELECT i.id, COALESCE(SUM(t.amount) FILTER (WHERE t.status = 'COMPLETED'), 0) AS amount_paid
+    FROM {invoices} AS i
+    LEFT JOIN {transactions} AS t ON t.invoice_id = i.id
+    WHERE {where}
+    GROUP BY i.id
+), settled AS (
+    SELECT i.id, p.amount_paid,
+        CASE
+            WHEN p.amount_paid = 0 THEN 'UNPAID'
+            WHEN p.amount_paid < i.total_amount THEN 'UNDERPAID'
+            WHEN p.amount_paid = i.total_amount THEN 'PAID'
+            ELSE 'OVERPAID'
+        END AS payment_status,
+        CASE
+            WHEN i.status = 'PENDING' AND p.amount_paid > 0 AND p.amount_paid >= i.total_amount THEN 'PAID'
+            ELSE i.status
+        END AS status
+    FROM {invoices} AS i JOIN paid AS p ON p.id = i.id
+)
+UPDATE {invoices} AS i
+SET amount_paid = s.amount_paid, payment_status = s.payment_status, status = s.status, updated_at = now()
+FROM settled AS s
+WHERE i.id = s.id
+  AND (i.amount_paid, i.payment_status, i.status) IS DISTINCT FROM (s.amount_paid, s.payment_status, s.status)
+RETURNING i.id, i.payment_status, i.status, i.amount_paid, i.total_amount
+"""
+
+
+def _reconcile(where, params):
+    tables = {'invoices': Invoice._meta.db_table, 'transactions': Transaction._meta.db_table}
+    with connection.cursor() as cursor:
+        # Lock the invoices first so the UPDATE below, a new statement with
+        # a fresh snapshot, sees every payment committed before it got the lock.
+        cursor.execute(
+            f"SELECT id, user_id, status, total_amount, amount_paid FROM {tables['invoices']} AS i "
+            f"WHERE {where} ORDER BY id FOR UPDATE",
+            params
+        )
+        if cursor.rowcount == 0:
+            return []
+        locked = {row[0]: row[1:] for row in cursor.fetchall()}
+        cursor.execute(RECONCILE_SQL.format(where=where, **tables), params)
+        changed = cursor.fetchall()
+    record_invoice_changes(
+        (locked[pk][0], locked[pk][1:], (status, total_amount, amount_paid))
+        for pk, payment_status, status, amount_paid, total_amount in changed
+    )
+    return [(pk, payment_status) for pk, payment_status, *rest in changed]
+
+
+def lock_invoices(invoice_ids):
+    """
+    Lock the given invoices. Writers that change an invoice's transactions
+    and then settle or cancel the invoice lock it first, so they queue on
+    the invoice row instead of deadlocking on each other's transaction rows
+    (see transactions.cancellation). Must run inside a transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id FROM {Invoice._meta.db_table} WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+            [sorted(set(invoice_ids))]
+        )
+
+
+def reconcile_invoices(invoice_ids):
+    """
+    Settle the given invoices. Must run inside a transaction; returns the
+    (id, payment_status) of every invoice whose state changed.
+    """
+    return _reconcile('i.id = ANY(%s)', [sorted(set(invoice_ids))])
+
+
+def reconcile_id_range(low, high):
+    """
+    Settle every invoice with low <= id < high. Must run inside a transaction.
+    """
+    return _reconcile('i.id >= %s AND i.id < %s', [low, high])
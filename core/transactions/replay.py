@@ -0,0 +1,119 @@
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+import redis
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class ReplayBuffer(ABC):
+    """
+    Bounded log of the most recent events of each notification stream.
+
+    `append` assigns the next sequence number of the stream and stores the
+    event; `since` returns the `(seq, event)` pairs after a given sequence
+    number, or None when part of that gap has already been evicted and the
+    client has to resynchronise from the API instead.
+    """
+    def __init__(self, size=1000):
+        self.size = size
+
+    @abstractmethod
+    def append(self, stream, event):
+        ...
+
+    @abstractmethod
+    def since(self, stream, seq):
+        ...
+
+
+class InMemoryReplayBuffer(ReplayBuffer):
+    """
+    Process-local buffer, for tests and single-process development servers.
+    """
+    def __init__(self, size=1000):
+        super().__init__(size)
+        self.lock = threading.Lock()
+        self.streams = {}
+
+    def append(self, stream, event):
+        with self.lock:
+            last_seq, events = self.streams.get(stream, (0, deque(maxlen=self.size)))
+            last_seq += 1
+            events.append((last_seq, event))
+            self.streams[stream] = (last_seq, events)
+            return last_seq
+
+    def since(self, stream, seq):
+        with self.lock:
+            last_seq, events = self.streams.get(stream, (0, ()))
+            return _gap(seq, last_seq, list(events))
+
+
+class RedisReplayBuffer(ReplayBuffer):
+    """
+    Shared buffer: a counter plus a sorted set (scored by seq) per stream,
+    trimmed to `size` entries and expired after `ttl` seconds of inactivity.
+    """
+    # Counter and entry are written in one atomic step, so `since` never
+    # sees a sequence number whose event is not stored yet.
+    APPEND_SCRIPT = """
+        local seq = redis.call('INCR', KEYS[1])
+        redis.call('ZADD', KEYS[2], seq, '[' .. seq .. ', ' .. ARGV[1] .. ']')
+        redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        redis.call('EXPIRE', KEYS[2], ARGV[3])
+        return seq
+    """
+
+    def __init__(self, size=1000, ttl=86400, host='127.0.0.1', port=6379, db=0):
+        super().__init__(size)
+        self.ttl = ttl
+        self.client = redis.Redis(host=host, port=int(port), db=db)
+        self.append_script = self.client.register_script(self.APPEND_SCRIPT)
+
+    def keys(self, stream):
+        return f'replay:{stream}:seq', f'replay:{stream}:events'
+
+    def append(self, stream, event):
+        return self.append_script(keys=self.keys(stream), args=[json.dumps(event), self.size, self.ttl])
+
+    def since(self, stream, seq):
+        seq_key, events_key = self.keys(stream)
+        with self.client.pipeline() as pipe:
+            pipe.get(seq_key)
+            pipe.zrangebyscore(events_key, seq + 1, '+inf')
+            last_seq, entries = pipe.execute()
+        events = [tuple(json.loads(entry)) for entry in entries]
+        return _gap(seq, int(last_seq or 0), events)
+
+
+def _gap(seq, last_seq, events):
+    if seq > last_seq:
+        # The stream was reset (e.g. its keys expired); the client is ahead of us.
+        return None
+    missed = [(event_seq, event) for event_seq, event in events if event_seq > seq]
+    if len(missed) != last_seq - seq:
+        return None
+    return missed
+
+
+_buffer = None
+
+
+def get_replay_buffer():
+    global _buffer
+    if _buffer is None:
+        config = settings.TRANSACTION_REPLAY_BUFFER
+        _buffer = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _buffer
+
+
+@receiver(setting_changed)
+def reset_replay_buffer(setting, **kwargs):
+    global _buffer
+    if setting == 'TRANSACTION_REPLAY_BUFFER':
+        _buffer = None
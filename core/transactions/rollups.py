@@ -0,0 +1,82 @@
+"""
+Incremental maintenance of RevenueRollup.
+
+Every code path that creates a transaction or changes its status or amount
+records the change here, in the same database transaction, as signed
+(amount, count) deltas. The deltas are folded into the rollup with one
+INSERT ... ON CONFLICT DO UPDATE, so concurrent writers never lose an
+increment and reading a bucket never scans the transactions table.
+"""
+from collections import defaultdict
+from datetime import timezone
+from decimal import Decimal
+from django.db import connection
+from .models import RevenueRollup, Transaction
+
+GRANULARITIES = [choice[0] for choice in RevenueRollup.GRANULARITY_CHOICES]
+AMOUNT_FIELD = Transaction._meta.get_field('amount')
+
+
+def bucket_start(value, granularity):
+    value = value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        value = value.replace(hour=0)
+    return value
+
+
+def apply_deltas(changes):
+    """
+    Add `changes`, an iterable of (transaction_date, status, amount, count)
+    tuples, to every granularity of the rollup.
+    """
+    deltas = defaultdict(lambda: [Decimal('0.00'), 0])
+    for transaction_date, status, amount, count in changes:
+        amount = AMOUNT_FIELD.to_python(amount)
+        for granularity in GRANULARITIES:
+            delta = deltas[(granularity, bucket_start(transaction_date, granularity), status)]
+            delta[0] += amount
+            delta[1] += count
+
+    # Sorted so concurrent writers lock the rollup rows in the same order.
+    rows = [(*key, *delta) for key, delta in sorted(deltas.items()) if delta[1] or delta[0]]
+    if not rows:
+        return
+
+    table = RevenueRollup._meta.db_table
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (granularity, bucket, status, total_amount, transaction_count) "
+            f"VALUES {placeholders} "
+            "ON CONFLICT (granularity, bucket, status) DO UPDATE SET "
+            f"total_amount = {table}.total_amount + EXCLUDED.total_amount, "
+            f"transaction_count = {table}.transaction_count + EXCLUDED.transaction_count",
+            [value for row in rows for value in row]
+        )
+
+
+def record_created(transactions):
+    apply_deltas(
+        (transaction.transaction_date, transaction.status, transaction.amount, 1)
+        for transaction in transactions
+    )
+
+
+def record_changed(previous, current):
+    """
+    Move a transaction out of the bucket described by `previous` and into the
+    one described by `current`, both dicts of transaction_date, status and amount.
+    """
+    if previous == current:
+        return
+    apply_deltas([
+        (previous['transaction_date'], previous['status'], -previous['amount'], -1),
+        (current['transaction_date'], current['status'], current['amount'], 1),
+    ])
+
+
+def record_status_change(transaction, old_status):
+    apply_deltas([
+        (transaction.transaction_date, old_status, -transaction.amount, -1),
+        (transaction.transaction_date, transaction.status, transaction.amount, 1),
+    ])
@@ -1,5 +1,12 @@
+from datetime import timedelta
+from django.db import transaction as db_transaction
 from rest_framework import serializers
-from .models import Transaction
+from accounts.summaries import record_transaction_changes
+from core.filters import QueryFilterSerializer
+from .models import RevenueRollup, Transaction
+from .notifications import notify_transaction, notify_transactions
+from .reconciliation import lock_invoices, reconcile_invoices
+from .rollups import record_created, record_status_change
 from invoices.models import Invoice
 
 class TransactionCreateSerializer(serializers.ModelSerializer):
@@ -25,8 +32,64 @@ class TransactionCreateSerializer(serializers.ModelSerializer):
         return transaction
 
 
+class StatusConflict(Exception):
+    """
+    Raised when a transaction's status changed between validation and update.
+    """
+
+
+class TransactionBatchCreateSerializer(serializers.Serializer):
+    MAX_BATCH_SIZE = 1000
+
+    invoices = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE
+    )
+
+    def create(self, validated_data):
+        """
+        Register one transaction per invoice id. Ownership is checked with a
+        single query, all rows are inserted with one bulk_create, and the
+        revenue rollup and one notification per user are updated in the same
+        database transaction.
+        Returns one outcome per requested id, in request order.
+        """
+        user = self.context['request'].user
+        invoice_ids = validated_data['invoices']
+
+        invoices = Invoice.objects.filter(id__in=set(invoice_ids))
+        if not user.is_staff:
+            invoices = invoices.filter(user=user)
+        invoices = {
+            invoice.id: invoice
+            for invoice in invoices.only('id', 'user_id', 'total_amount', 'status')
+        }
+
+        outcomes = []
+        pending = []
+        for invoice_id in invoice_ids:
+            invoice = invoices.get(invoice_id)
+            if invoice is None:
+                outcomes.append({
+                    "invoice": invoice_id,
+                    "error": "Invoice does not exist or does not belong to you."
+                })
+                continue
+            transaction = Transaction(invoice=invoice, user_id=invoice.user_id, amount=invoice.total_amount)
+            outcomes.append({"invoice": invoice_id, "transaction": transaction})
+            pending.append(transaction)
+
+        if pending:
+            with db_transaction.atomic():
+                Transaction.objects.bulk_create(pending)
+                record_created(pending)
+                notify_transactions(pending)
+        return outcomes
+
+
 class TransactionListSerializer(serializers.ModelSerializer):
-    invoice_id = serializers.IntegerField(source='invoice.id', read_only=True)
+    invoice_id = serializers.IntegerField(read_only=True)
     invoice_status = serializers.CharField(source='invoice.status', read_only=True)
 
     class Meta:
@@ -59,4 +122,79 @@ class TransactionStatusUpdateSerializer(serializers.ModelSerializer):
                 f"Status is already {new_status}."
             )
 
-        return new_status
\ No newline at end of file
+        return new_status
+
+    def update(self, instance, validated_data):
+        """
+        Apply the transition as a compare-and-swap: one
+        UPDATE ... WHERE id = %s AND status = 'PENDING' that writes only the
+        status column. The invoice is locked first, the lock order of
+        invoice cancellation. Raises StatusConflict when a concurrent
+        request already moved the transaction on.
+        """
+        new_status = validated_data.get('status')
+        if new_status is None:
+            return instance
+
+        with db_transaction.atomic():
+            lock_invoices([instance.invoice_id])
+            updated = Transaction.objects.filter(
+                pk=instance.pk,
+                status='PENDING'
+            ).update(status=new_status)
+            if not updated:
+                raise StatusConflict(instance.pk)
+            instance.status = new_status
+            record_status_change(instance, 'PENDING')
+            if new_status == 'COMPLETED':
+                record_transaction_changes([
+                    (instance.user_id, ('PENDING', instance.amount), ('COMPLETED', instance.amount))
+                ])
+                reconcile_invoices([instance.invoice_id])
+            notify_transaction(instance)
+        return instance
+
+
+class TransactionFilterSerializer(QueryFilterSerializer):
+    lookups = {
+        'status': 'status',
+        'invoice': 'invoice_id',
+        'date_after': 'transaction_date__gte',
+        'date_before': 'transaction_date__lt',
+        'min_amount': 'amount__gte',
+        'max_amount': 'amount__lte',
+    }
+    ranges = (('date_after', 'date_before'), ('min_amount', 'max_amount'))
+
+    status = serializers.ChoiceField(choices=Transaction.STATUS_CHOICES, required=False)
+    invoice = serializers.IntegerField(required=False)
+    date_after = serializers.DateTimeField(required=False)
+    date_before = serializers.DateTimeField(required=False)
+    min_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+
+class RevenueStatsQuerySerializer(serializers.Serializer):
+    MAX_BUCKETS = 2000
+    BUCKET_SIZES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+    granularity = serializers.ChoiceField(choices=RevenueRollup.GRANULARITY_CHOICES, default='day')
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    status = serializers.ChoiceField(choices=Transaction.STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError("start must be before end.")
+        buckets = (attrs['end'] - attrs['start']) / self.BUCKET_SIZES[attrs['granularity']]
+        if buckets > self.MAX_BUCKETS:
+            raise serializers.ValidationError(
+                f"The range covers more than {self.MAX_BUCKETS} {attrs['granularity']} buckets."
+            )
+        return attrs
+
+
+class RevenueRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RevenueRollup
+        fields = ('bucket', 'status', 'total_amount', 'transaction_count')
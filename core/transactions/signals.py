@@ -1,25 +1,63 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from transactions.models import Transaction
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from transactions.notifications import notify_transaction
+from transactions.reconciliation import lock_invoices, reconcile_invoices
+from transactions.rollups import record_changed, record_created
+
+TRACKED_FIELDS = ('transaction_date', 'status', 'amount')
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_stored_values(sender, instance, update_fields=None, **kwargs):
+    # Transaction.save() runs inside atomic(), so the row stays locked until
+    # the post_save handlers below have compared it with the new values. A
+    # save that may settle the invoice locks it first, like cancellation.
+    instance._stored_values = None
+    if instance._state.adding:
+        if instance.status == 'COMPLETED':
+            lock_invoices([instance.invoice_id])
+        return
+    lock_invoices([instance.invoice_id])
+    instance._stored_values = Transaction.objects.select_for_update().filter(
+        pk=instance.pk
+    ).values(*TRACKED_FIELDS).first()
+
+
+def saved_values(instance, update_fields):
+    # Fields left out of update_fields were not written.
+    previous = instance._stored_values
+    return {
+        field: getattr(instance, field) if update_fields is None or field in update_fields else previous[field]
+        for field in TRACKED_FIELDS
+    }
+
+
+@receiver(post_save, sender=Transaction)
+def update_revenue_rollup(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        record_created([instance])
+        return
+    previous = getattr(instance, '_stored_values', None)
+    if previous is None:
+        return
+    record_changed(previous, saved_values(instance, update_fields))
+
+
+@receiver(post_save, sender=Transaction)
+def settle_invoice(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        if instance.status == 'COMPLETED':
+            reconcile_invoices([instance.invoice_id])
+        return
+    previous = getattr(instance, '_stored_values', None)
+    if previous is None:
+        return
+    current = saved_values(instance, update_fields)
+    if current != previous and 'COMPLETED' in (previous['status'], current['status']):
+        reconcile_invoices([instance.invoice_id])
+
 
 @receiver(post_save, sender=Transaction)
 def transaction_status_notification(sender, instance, created, **kwargs):
-    channel_layer = get_channel_layer()
-    user_id = instance.invoice.user.id
-    group_name = f'user_{user_id}_transactions'
-    message = {
-        "transaction_id": instance.id,
-        "invoice_id": instance.invoice.id,
-        "amount": str(instance.amount),
-        "status": instance.status,
-        "transaction_date": str(instance.transaction_date),
-    }
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": "transaction_update",
-            "message": message,
-        }
-    )
\ No newline at end of file
+    notify_transaction(instance)
@@ -1,14 +1,45 @@
+import csv
+import importlib
+import os
+import threading
+import time
+import uuid
+import redis
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management import call_command
+from django.db import connection, transaction as db_transaction
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
 from django.contrib.auth.models import User
-from transactions.models import Transaction
+from transactions.cancellation import cancel_invoices
+from transactions.models import OutboxEvent, RevenueRollup, Transaction
+from transactions.outbox import dispatch_batch
+from transactions.partitions import add_months, create_partition, month_start, monthly_partitions, partition_name
+from transactions.reconciliation import reconcile_invoices
+from transactions.replay import RedisReplayBuffer, get_replay_buffer
+from transactions.serializers import TransactionListSerializer, TransactionStatusUpdateSerializer
+from transactions.views import AsyncTransactionListView
 from products.models import Product
 from invoices.models import Invoice
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from accounts.middleware import JWTAuthMiddleware
+from core.explain import IndexUsageTestMixin, query_on
+from core.query_budget import QueryBudgetTestMixin
+from core.routing import websocket_urlpatterns
 
-class TransactionTests(APITestCase):
+class TransactionTests(IndexUsageTestMixin, QueryBudgetTestMixin, APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='user1', password='pass123')
         self.admin = User.objects.create_superuser(username='admin', password='adminpass')
@@ -93,3 +124,625 @@ class TransactionTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], "Transaction history retrieved successfully.")
         self.assertEqual(len(response.data['result']), 2)
+
+    def test_transaction_history_keyset_pages(self):
+        created = [Transaction.objects.create(invoice=self.invoice1, amount=30.00) for _ in range(5)]
+        expected_ids = [t.id for t in reversed(created)]
+
+        url = reverse('transaction-list')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        seen_ids = []
+        cursor = None
+        while True:
+            params = {'page_size': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen_ids += [row['id'] for row in response.data['result']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(seen_ids, expected_ids)
+
+    def test_transaction_history_matches_serializer_output(self):
+        Transaction.objects.create(invoice=self.invoice1, amount=Decimal('30.5'))
+        Transaction.objects.create(invoice=self.invoice1, amount=30, status='COMPLETED')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(reverse('transaction-list'))
+        transactions = Transaction.objects.filter(user=self.user).order_by('-transaction_date', '-id')
+        expected = TransactionListSerializer(transactions, many=True).data
+        self.assertEqual(JSONRenderer().render(response.data['result']), JSONRenderer().render(expected))
+
+    def test_transaction_history_invalid_cursor(self):
+        url = reverse('transaction-list')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], "Invalid cursor.")
+
+    def test_transaction_history_filters(self):
+        small = Transaction.objects.create(invoice=self.invoice1, amount=Decimal('5.00'))
+        completed = Transaction.objects.create(invoice=self.invoice1, amount=30, status='COMPLETED')
+        Transaction.objects.create(invoice=self.invoice2, amount=30)
+        old = timezone.now() - timedelta(days=400)
+        Transaction.objects.filter(pk=small.pk).update(transaction_date=old)
+
+        url = reverse('transaction-list')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        for params, expected in (
+            ({'status': 'COMPLETED'}, [completed.id]),
+            ({'min_amount': '10'}, [completed.id]),
+            ({'date_before': old + timedelta(days=1)}, [small.id]),
+            ({'invoice': self.invoice2.id}, []),
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([row['id'] for row in response.data['result']], expected, params)
+
+        response = self.client.get(url, {'date_after': timezone.now(), 'date_before': old})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_transaction_history_filters_use_indexes(self):
+        """
+        EXPLAIN every supported filter combination for users and staff: each
+        page must be read from an index in list order, and selective status
+        filters must use the indexes added for them.
+        """
+        # Enough rows, with a realistic status mix, for the planner's choice
+        # to reflect production: most transactions complete, few are pending.
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {Transaction._meta.db_table} (invoice_id, user_id, amount, status, transaction_date)
+                SELECT CASE WHEN n %% 3 = 0 THEN %s ELSE %s END,
+                    CASE WHEN n %% 3 = 0 THEN %s ELSE %s END,
+                    n %% 200,
+                    CASE WHEN n %% 20 = 0 THEN 'PENDING' WHEN n %% 20 = 1 THEN 'FAILED' ELSE 'COMPLETED' END,
+                    now() - n * interval '10 minutes'
+                FROM generate_series(1, 60000) AS n
+            """, [self.invoice1.id, self.invoice2.id, self.user.id, self.admin.id])
+            cursor.execute(f"ANALYZE {Transaction._meta.db_table}")
+        now = timezone.now()
+        dates = {'date_after': now - timedelta(days=90), 'date_before': now - timedelta(days=30)}
+        amounts = {'min_amount': '1', 'max_amount': '100'}
+        status_indexes = {'txn_user_status_date_idx', 'txn_pending_date_idx'}
+        combinations = (
+            ({}, set(), set()),
+            (dates, set(), set()),
+            (amounts, set(), set()),
+            (dates | amounts, set(), set()),
+            ({'invoice': self.invoice1.id}, set(), set()),
+            ({'status': 'COMPLETED'}, set(), set()),
+            ({'status': 'FAILED'}, {'txn_user_status_date_idx'}, set()),
+            ({'status': 'PENDING'}, status_indexes, {'txn_pending_date_idx'}),
+            ({'status': 'PENDING'} | dates | amounts, status_indexes, {'txn_pending_date_idx'}),
+        )
+        url = reverse('transaction-list')
+        for filters, user_indexes, staff_indexes in combinations:
+            for access, expected in ((self.user_access, user_indexes), (self.admin_access, staff_indexes)):
+                with self.subTest(filters=filters, staff=access == self.admin_access):
+                    self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(url, filters)
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertIndexOrdered(query_on(queries, Transaction), expected)
+
+    def test_export_transaction_history_csv(self):
+        own = Transaction.objects.create(invoice=self.invoice1, amount=30.00)
+        Transaction.objects.create(invoice=self.invoice2, amount=10.00)
+        url = reverse('transaction-export')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['id', 'invoice_id', 'user_id', 'amount', 'status', 'transaction_date'])
+        self.assertEqual(rows[1:], [[
+            str(own.id), str(self.invoice1.id), str(self.user.id), '30.00', 'PENDING',
+            own.transaction_date.isoformat()
+        ]])
+
+        response = self.client.get(url, {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_async_views_authenticate_and_404(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(reverse('transaction-detail', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_query_budgets(self):
+        def add_transactions(count):
+            Transaction.objects.bulk_create(
+                Transaction(invoice=self.invoice1, user=self.user, amount=self.invoice1.total_amount)
+                for _ in range(count)
+            )
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        self.assertConstantQueryBudget(reverse('transaction-list'), add_transactions)
+        self.assertWithinQueryBudget(reverse('transaction-export'))
+        transaction = Transaction.objects.filter(user=self.user).first()
+        self.assertWithinQueryBudget(reverse('transaction-detail', args=[transaction.id]))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        self.assertWithinQueryBudget(reverse('transaction-outbox-metrics'))
+        self.assertWithinQueryBudget(
+            reverse('transaction-stats'),
+            {'start': '2020-01-01T00:00:00Z', 'end': '2020-01-02T00:00:00Z'}
+        )
+
+    @override_settings(QUERY_BUDGET_MODE='reject')
+    def test_query_budget_rejects_at_runtime(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        with mock.patch.dict(AsyncTransactionListView.query_budgets, {'GET': 1}), \
+                self.assertLogs('core.query_budget', 'WARNING'):
+            response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_batch_create_transactions(self):
+        url = reverse('transaction-batch-create')
+        data = {"invoices": [self.invoice1.id, self.invoice2.id, self.invoice1.id, 999999]}
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        results = response.data['result']
+        self.assertEqual([r['success'] for r in results], [True, False, True, False])
+        self.assertEqual(results[0]['transaction']['invoice_id'], self.invoice1.id)
+        self.assertEqual(results[0]['transaction']['amount'], "30.00")
+        self.assertEqual(Transaction.objects.filter(invoice=self.invoice1).count(), 2)
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.group_name, f'user_{self.user.id}_transactions')
+        self.assertEqual(event.event_type, 'transaction_batch_update')
+        self.assertEqual(len(event.payload['messages']), 2)
+
+    def test_batch_create_rejects_empty_list(self):
+        url = reverse('transaction-batch-create')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.post(url, {"invoices": []}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('invoices', response.data['result'])
+
+    def test_status_update_writes_only_status(self):
+        transaction = Transaction.objects.create(invoice=self.invoice1, amount=30.00)
+        url = reverse('transaction-detail', args=[transaction.id])
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        response = self.client.patch(url, {"status": "COMPLETED"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result']['status'], "COMPLETED")
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, "COMPLETED")
+        self.assertEqual(OutboxEvent.objects.filter(event_type='transaction_update').count(), 2)
+
+    def test_concurrent_status_update_conflict(self):
+        transaction = Transaction.objects.create(invoice=self.invoice1, amount=30.00)
+        stale = Transaction.objects.get(pk=transaction.pk)
+        Transaction.objects.filter(pk=transaction.pk).update(status='FAILED')
+
+        url = reverse('transaction-detail', args=[transaction.id])
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        with mock.patch('transactions.views.TransactionDetailView.get_object', return_value=stale):
+            response = self.client.patch(url, {"status": "COMPLETED"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, "FAILED")
+
+    @override_settings(
+        CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+        TRANSACTION_REPLAY_BUFFER={'BACKEND': 'transactions.replay.InMemoryReplayBuffer'},
+    )
+    def test_outbox_dispatch_publishes_and_drains(self):
+        transaction = Transaction.objects.create(invoice=self.invoice1, amount=30.00)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'user_{self.user.id}_transactions', channel_name)
+
+        self.assertEqual(dispatch_batch(), 1)
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(event['type'], 'transaction_update')
+        self.assertEqual(event['seq'], 1)
+        self.assertEqual(event['message']['transaction_id'], transaction.id)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(
+            get_replay_buffer().since(f'user_{self.user.id}_transactions', 0),
+            [(1, {'type': 'transaction_update', 'message': event['message']})]
+        )
+
+    def test_outbox_metrics_staff_only(self):
+        Transaction.objects.create(invoice=self.invoice1, amount=30.00)
+        url = reverse('transaction-outbox-metrics')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result']['backlog'], 1)
+
+    def test_revenue_stats_follow_status_changes(self):
+        first = Transaction.objects.create(invoice=self.invoice1, amount=30.00)
+        second = Transaction.objects.create(invoice=self.invoice2, amount=10.00)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.patch(reverse('transaction-detail', args=[first.id]), {'status': 'COMPLETED'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        second.status = 'FAILED'
+        second.save()
+
+        url = reverse('transaction-stats')
+        day = first.transaction_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        params = {'start': day.isoformat(), 'end': (day + timedelta(days=1)).isoformat()}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = [
+            {'bucket': day.isoformat().replace('+00:00', 'Z'), 'status': 'COMPLETED', 'total_amount': '30.00', 'transaction_count': 1},
+            {'bucket': day.isoformat().replace('+00:00', 'Z'), 'status': 'FAILED', 'total_amount': '10.00', 'transaction_count': 1},
+        ]
+        self.assertEqual(response.data['result'], expected)
+
+        RevenueRollup.objects.all().delete()
+        call_command('rebuild_revenue_rollups', workers=1, stdout=StringIO())
+        response = self.client.get(url, params)
+        self.assertEqual(response.data['result'], expected)
+
+    def test_completing_transactions_settles_invoice(self):
+        partial = Transaction.objects.create(invoice=self.invoice1, amount=10.00)
+        partial.status = 'COMPLETED'
+        partial.save()
+        self.invoice1.refresh_from_db()
+        self.assertEqual((self.invoice1.status, self.invoice1.payment_status), ('PENDING', 'UNDERPAID'))
+
+        rest = Transaction.objects.create(invoice=self.invoice1, amount=20.00)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        response = self.client.patch(reverse('transaction-detail', args=[rest.id]), {'status': 'COMPLETED'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.invoice1.refresh_from_db()
+        self.assertEqual((self.invoice1.status, self.invoice1.payment_status), ('PAID', 'PAID'))
+        self.assertEqual(self.invoice1.amount_paid, Decimal('30.00'))
+
+    def test_cancelling_invoices_fails_pending_transactions(self):
+        pending = [Transaction.objects.create(invoice=self.invoice1, amount=30.00) for _ in range(3)]
+        completed = Transaction.objects.create(invoice=self.invoice1, amount=5.00, status='COMPLETED')
+        other = Transaction.objects.create(invoice=self.invoice2, amount=10.00)
+        OutboxEvent.objects.all().delete()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user_access)
+        url = reverse('invoice-detail', args=[self.invoice1.id])
+        with self.assertNumQueries(11):
+            response = self.client.patch(url, {'status': 'CANCELLED'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(Transaction.objects.filter(status='FAILED').values_list('id', flat=True)),
+            [t.id for t in pending]
+        )
+        completed.refresh_from_db()
+        self.assertEqual(completed.status, 'COMPLETED')
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.event_type, 'transaction_batch_update')
+        self.assertEqual(len(event.payload['messages']), 3)
+        failed = RevenueRollup.objects.get(granularity='day', status='FAILED')
+        self.assertEqual((failed.transaction_count, failed.total_amount), (3, Decimal('90.00')))
+        self.assertEqual(RevenueRollup.objects.get(granularity='day', status='PENDING').transaction_count, 1)
+
+        bulk_url = reverse('invoice-bulk-cancel')
+        response = self.client.post(bulk_url, {'invoices': [self.invoice1.id, self.invoice2.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.admin_access)
+        response = self.client.post(bulk_url, {'invoices': [self.invoice1.id, self.invoice2.id, 0]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result'], {
+            'cancelled': [self.invoice2.id], 'skipped': [0, self.invoice1.id], 'failed_transactions': 1
+        })
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'FAILED')
+        self.assertEqual(OutboxEvent.objects.filter(group_name=f'user_{self.admin.id}_transactions').count(), 1)
+
+    def test_reconcile_invoices_command(self):
+        Transaction.objects.create(invoice=self.invoice2, amount=15.00)
+        Transaction.objects.filter(invoice=self.invoice2).update(status='COMPLETED')
+
+        out = StringIO()
+        call_command('reconcile_invoices', workers=1, stdout=out)
+        self.assertIn('overpaid=1', out.getvalue())
+        self.invoice2.refresh_from_db()
+        self.assertEqual((self.invoice2.status, self.invoice2.payment_status), ('PAID', 'OVERPAID'))
+        self.invoice1.refresh_from_db()
+        self.assertEqual(self.invoice1.payment_status, 'UNPAID')
+
+    def test_partition_maintenance(self):
+        current = month_start(timezone.now())
+        later = add_months(current, 12)
+        old = add_months(current, -24)
+        transaction = Transaction.objects.create(invoice=self.invoice1, amount=30.00)
+        Transaction.objects.filter(pk=transaction.pk).update(transaction_date=later)
+        with connection.cursor() as cursor:
+            create_partition(cursor, later)
+            create_partition(cursor, old)
+            cursor.execute(f"SELECT count(*) FROM {partition_name(later)}")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+        call_command('manage_transaction_partitions', months_ahead=5, retain_months=12, drop=True, stdout=StringIO())
+
+        with connection.cursor() as cursor:
+            partitions = monthly_partitions(cursor)
+        self.assertIn(add_months(current, 5), partitions)
+        self.assertIn(later, partitions)
+        self.assertNotIn(old, partitions)
+        self.assertTrue(Transaction.objects.filter(pk=transaction.pk).exists())
+
+
+class RedisReplayBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.buffer = RedisReplayBuffer(
+            size=3, ttl=60, host=os.getenv('REDIS_HOST', '127.0.0.1'), port=os.getenv('REDIS_PORT', 6379), db=15
+        )
+        self.stream = f'test-{uuid.uuid4().hex}'
+        try:
+            self.buffer.client.ping()
+        except redis.ConnectionError:
+            self.skipTest("Redis is not available")
+        self.addCleanup(self.buffer.client.delete, *self.buffer.keys(self.stream))
+
+    def test_append_and_replay(self):
+        seqs = [self.buffer.append(self.stream, {"transaction_id": n}) for n in range(1, 6)]
+        self.assertEqual(seqs, [1, 2, 3, 4, 5])
+        self.assertEqual(self.buffer.since(self.stream, 3), [(4, {"transaction_id": 4}), (5, {"transaction_id": 5})])
+        self.assertEqual(self.buffer.since(self.stream, 5), [])
+        self.assertIsNone(self.buffer.since(self.stream, 1))
+        self.assertGreater(self.buffer.client.ttl(self.buffer.keys(self.stream)[1]), 0)
+
+    def test_concurrent_reader_never_sees_a_missing_entry(self):
+        """
+        Ensure a reader never sees a sequence number before its event is
+        stored, which it would report as a gap.
+        """
+        self.buffer.size = 1000
+        done = threading.Event()
+
+        def write():
+            for n in range(500):
+                self.buffer.append(self.stream, {"transaction_id": n})
+            done.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        gaps = 0
+        while not done.is_set():
+            gaps += self.buffer.since(self.stream, 0) is None
+        writer.join()
+        self.assertEqual(gaps, 0)
+
+
+class CancellationLockOrderTests(TransactionTestCase):
+    """
+    Completing a transaction while its invoice is being cancelled, with real
+    commits and two connections.
+    """
+    def setUp(self):
+        user = User.objects.create_user(username='user1', password='pass123')
+        self.invoice = Invoice.objects.create(user=user)
+        self.transaction = Transaction.objects.create(invoice=self.invoice, amount=30.00)
+
+    def race(self, complete, reconcile_target):
+        """
+        Run complete() and cancel the invoice while complete() is about to
+        settle it, i.e. after its row locks have been taken.
+        """
+        settling = threading.Event()
+        errors = []
+
+        def slow_reconcile(invoice_ids):
+            settling.set()
+            time.sleep(0.5)
+            return reconcile_invoices(invoice_ids)
+
+        def run(target):
+            try:
+                target()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        def cancel():
+            settling.wait(5)
+            cancel_invoices([self.invoice.id])
+
+        with mock.patch(reconcile_target, slow_reconcile):
+            threads = [threading.Thread(target=run, args=(target,)) for target in (complete, cancel)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+        self.assertEqual(errors, [])
+        self.transaction.refresh_from_db()
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.transaction.status, self.invoice.status), ('COMPLETED', 'CANCELLED'))
+
+    def test_status_update_and_cancellation_do_not_deadlock(self):
+        def complete():
+            serializer = TransactionStatusUpdateSerializer(self.transaction, data={'status': 'COMPLETED'})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        self.race(complete, 'transactions.serializers.reconcile_invoices')
+
+    def test_saved_completion_and_cancellation_do_not_deadlock(self):
+        def complete():
+            transaction = Transaction.objects.get(pk=self.transaction.pk)
+            transaction.status = 'COMPLETED'
+            transaction.save()
+        self.race(complete, 'transactions.signals.reconcile_invoices')
+
+
+class PartitionCopyTests(TransactionTestCase):
+    """
+    The online copy of the partitioning migration, run against a scratch table
+    while another connection deletes and moves rows of the chunk being copied.
+    """
+    migration = importlib.import_module('transactions.migrations.0005_partition_transaction_table')
+
+    def setUp(self):
+        for name, value in (('TABLE', 'partition_copy_source'), ('SHADOW', 'partition_copy_shadow'),
+                            ('SYNC_FUNCTION', 'partition_copy_sync')):
+            patcher = mock.patch.object(self.migration, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.drop_tables)
+
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE partition_copy_source (
+                    id bigserial PRIMARY KEY, transaction_date timestamptz NOT NULL, amount numeric(10, 2) NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX partition_copy_source_date ON partition_copy_source (transaction_date)")
+            cursor.executemany(
+                "INSERT INTO partition_copy_source (transaction_date, amount) VALUES (%s, %s)",
+                [(now - timedelta(days=40), 10), (now - timedelta(days=40), 20), (now, 30)]
+            )
+            self.migration.create_shadow_table(cursor)
+
+    def drop_tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS partition_copy_shadow, partition_copy_source CASCADE")
+            cursor.execute("DROP FUNCTION IF EXISTS partition_copy_sync()")
+
+    def rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id, transaction_date, amount FROM {table} ORDER BY id, transaction_date")
+            return cursor.fetchall()
+
+    def test_shadow_indexes_are_created(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexdef FROM pg_indexes WHERE indexname = 'partition_copy_source_date_tmp'")
+            self.assertIn(' ON ONLY public.partition_copy_shadow ', cursor.fetchone()[0])
+
+    def test_rows_changed_during_copy_are_not_brought_back(self):
+        def copy():
+            try:
+                with db_transaction.atomic(), connection.cursor() as cursor:
+                    self.migration.copy_chunk(cursor, 0)
+            finally:
+                connection.close()
+
+        with db_transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM partition_copy_source WHERE id = 1")
+            cursor.execute("UPDATE partition_copy_source SET transaction_date = now() WHERE id = 2")
+            copier = threading.Thread(target=copy)
+            copier.start()
+            time.sleep(0.5)
+        copier.join(10)
+
+        self.assertFalse(copier.is_alive())
+        self.assertEqual(self.rows('partition_copy_shadow'), self.rows('partition_copy_source'))
+        self.assertEqual([row[0] for row in self.rows('partition_copy_shadow')], [2, 3])
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    TRANSACTION_REPLAY_BUFFER={'BACKEND': 'transactions.replay.InMemoryReplayBuffer', 'OPTIONS': {'size': 2}},
+    TRANSACTION_WS_BATCH_WINDOW=0.05,
+    TRANSACTION_WS_BATCH_MAX_EVENTS=3,
+)
+class UserTransactionConsumerTests(TransactionTestCase):
+    group_name = 'user_7_transactions'
+
+    def setUp(self):
+        self.replay_buffer = get_replay_buffer()
+        self.replay_buffer.streams.clear()
+
+    def message(self, transaction_id, status):
+        return {"transaction_id": transaction_id, "status": status}
+
+    async def connect(self, query=''):
+        token = AccessToken()
+        token['user_id'] = 7
+        query = f'{query}&token={token}' if query else f'?token={token}'
+        communicator = WebsocketCommunicator(
+            JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+            f'/ws/transactions/user/7/{query}'
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_default_delivery_sends_one_frame_per_event(self):
+        communicator = await self.connect()
+        await get_channel_layer().group_send(self.group_name, {
+            "type": "transaction_batch_update",
+            "messages": [self.message(1, 'PENDING'), self.message(1, 'COMPLETED')],
+        })
+
+        self.assertEqual(await communicator.receive_json_from(), self.message(1, 'PENDING'))
+        self.assertEqual(await communicator.receive_json_from(), self.message(1, 'COMPLETED'))
+        await communicator.disconnect()
+
+    async def test_batch_delivery_coalesces_within_window(self):
+        communicator = await self.connect('?delivery=batch')
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send(self.group_name, {
+            "type": "transaction_update", "message": self.message(1, 'PENDING'),
+        })
+        await channel_layer.group_send(self.group_name, {
+            "type": "transaction_batch_update",
+            "messages": [self.message(2, 'PENDING'), self.message(1, 'COMPLETED')],
+        })
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame, [self.message(1, 'COMPLETED'), self.message(2, 'PENDING')])
+        self.assertTrue(await communicator.receive_nothing(0.1))
+        await communicator.disconnect()
+
+    async def test_batch_delivery_flushes_at_max_events(self):
+        with self.settings(TRANSACTION_WS_BATCH_WINDOW=60):
+            communicator = await self.connect('?delivery=batch')
+            await get_channel_layer().group_send(self.group_name, {
+                "type": "transaction_batch_update",
+                "messages": [self.message(i, 'PENDING') for i in range(3)],
+            })
+
+            frame = await communicator.receive_json_from()
+            self.assertEqual([m['transaction_id'] for m in frame], [0, 1, 2])
+            await communicator.disconnect()
+
+    async def test_reconnect_replays_missed_events(self):
+        for status_value in ('PENDING', 'COMPLETED'):
+            self.replay_buffer.append(self.group_name, {
+                "type": "transaction_update", "message": self.message(1, status_value),
+            })
+
+        communicator = await self.connect('?since=1')
+        self.assertEqual(await communicator.receive_json_from(), {**self.message(1, 'COMPLETED'), "seq": 2})
+        self.assertTrue(await communicator.receive_nothing(0.05))
+        await communicator.disconnect()
+
+    async def test_reconnect_after_eviction_requests_resync(self):
+        for transaction_id in range(3):
+            self.replay_buffer.append(self.group_name, {
+                "type": "transaction_update", "message": self.message(transaction_id, 'PENDING'),
+            })
+
+        communicator = await self.connect('?since=0')
+        self.assertEqual(await communicator.receive_json_from(), {"type": "resync_required"})
+        await communicator.disconnect()
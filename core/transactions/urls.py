@@ -1,13 +1,21 @@
 
 from django.urls import path
 from .views import (
+    AsyncTransactionDetailView,
+    AsyncTransactionListView,
+    TransactionBatchCreateView,
     TransactionCreateView,
-    TransactionListView,
-    TransactionDetailView,
+    TransactionExportView,
+    OutboxMetricsView,
+    RevenueStatsView,
 )
 
 urlpatterns = [
     path('create/', TransactionCreateView.as_view(), name='transaction-create'),
-    path('', TransactionListView.as_view(), name='transaction-list'),
-    path('<int:pk>/', TransactionDetailView.as_view(), name='transaction-detail'),  # new detail route
+    path('batch/', TransactionBatchCreateView.as_view(), name='transaction-batch-create'),
+    path('', AsyncTransactionListView.as_view(), name='transaction-list'),
+    path('export/', TransactionExportView.as_view(), name='transaction-export'),
+    path('stats/', RevenueStatsView.as_view(), name='transaction-stats'),
+    path('outbox/metrics/', OutboxMetricsView.as_view(), name='transaction-outbox-metrics'),
+    path('<int:pk>/', AsyncTransactionDetailView.as_view(), name='transaction-detail'),  # new detail route
 ]
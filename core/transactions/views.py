@@ -3,8 +3,22 @@ from rest_framework.response import Response
 from rest_framework import status, permissions
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema
-from .models import Transaction
-from .serializers import TransactionCreateSerializer, TransactionListSerializer, TransactionStatusUpdateSerializer
+from core.async_views import AsyncAPIView, aget_object_or_404, run_sync
+from core.fast_serializers import FastSerializer
+from core.pagination import InvalidCursor, KeysetPagination
+from core.streaming import EXPORT_CONTENT_TYPES, export_response
+from .models import RevenueRollup, Transaction
+from .outbox import outbox_metrics
+from .serializers import (
+    RevenueRollupSerializer,
+    RevenueStatsQuerySerializer,
+    StatusConflict,
+    TransactionFilterSerializer,
+    TransactionBatchCreateSerializer,
+    TransactionCreateSerializer,
+    TransactionListSerializer,
+    TransactionStatusUpdateSerializer,
+)
 
 class TransactionCreateView(APIView):
     """
@@ -33,30 +47,151 @@ class TransactionCreateView(APIView):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+class TransactionBatchCreateView(APIView):
+    """
+    POST: Register transactions for a list of invoices in one request.
+    Each invoice id gets its own result entry; invalid ids do not abort the batch.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = TransactionBatchCreateSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "message": "Validation error.",
+                    "result": serializer.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = []
+        created = 0
+        for outcome in serializer.save():
+            if "transaction" in outcome:
+                created += 1
+                results.append({
+                    "invoice": outcome["invoice"],
+                    "success": True,
+                    "transaction": TransactionListSerializer(outcome["transaction"]).data
+                })
+            else:
+                results.append({
+                    "invoice": outcome["invoice"],
+                    "success": False,
+                    "error": outcome["error"]
+                })
+        return Response(
+            {
+                "message": f"{created} of {len(results)} transactions registered successfully.",
+                "result": results
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
 class TransactionListView(APIView):
     """
-    GET: View transaction history.
+    GET: View transaction history, newest first, one keyset page at a time.
+    Pass the returned `next_cursor` back as `?cursor=` to fetch the next page.
+    Filter with `status`, `invoice`, `date_after` / `date_before` and
+    `min_amount` / `max_amount`. Rows are rendered with FastSerializer from
+    TransactionListSerializer.
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = TransactionListSerializer
-    @extend_schema(
-        operation_id="transactionListGet"
-    )
-    def get(self, request):
-        user = request.user
+    filter_serializer_class = TransactionFilterSerializer
+    query_budgets = {'GET': 2}
+
+    def get_queryset(self, user):
         if user.is_staff:
             transactions = Transaction.objects.all()
         else:
-            transactions = Transaction.objects.filter(invoice__user=user)
-        serializer = self.serializer_class(transactions, many=True)
+            transactions = Transaction.objects.filter(user=user)
+        return transactions.select_related('invoice')
+
+    @extend_schema(
+        operation_id="transactionListGet",
+        parameters=[TransactionFilterSerializer]
+    )
+    def get(self, request):
+        filters = self.filter_serializer_class(data=request.query_params)
+        if not filters.is_valid():
+            return self.invalid_filters_response(filters.errors)
+        paginator = KeysetPagination('transaction_date')
+        fast = FastSerializer(self.serializer_class())
+        queryset = filters.filter_queryset(self.get_queryset(request.user))
+        try:
+            page = paginator.paginate_queryset(fast.values(queryset), request)
+        except InvalidCursor:
+            return self.invalid_cursor_response()
+        return self.page_response(fast.to_representation(page), paginator.next_cursor)
+
+    def invalid_filters_response(self, errors):
+        return Response(
+            {"message": "Validation error.", "result": errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    def invalid_cursor_response(self):
+        return Response(
+            {"message": "Invalid cursor.", "result": {}},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    def page_response(self, result, next_cursor):
         return Response(
             {
                 "message": "Transaction history retrieved successfully.",
-                "result": serializer.data
+                "result": result,
+                "next_cursor": next_cursor
             },
             status=status.HTTP_200_OK
         )
 
+class AsyncTransactionListView(AsyncAPIView, TransactionListView):
+    @extend_schema(
+        operation_id="transactionListGet",
+        parameters=[TransactionFilterSerializer]
+    )
+    async def get(self, request):
+        filters = self.filter_serializer_class(data=request.query_params)
+        if not filters.is_valid():
+            return self.invalid_filters_response(filters.errors)
+        paginator = KeysetPagination('transaction_date')
+        fast = FastSerializer(self.serializer_class())
+        queryset = filters.filter_queryset(self.get_queryset(request.user))
+        try:
+            page = await paginator.apaginate_queryset(fast.values(queryset), request)
+        except InvalidCursor:
+            return self.invalid_cursor_response()
+        return self.page_response(fast.to_representation(page), paginator.next_cursor)
+
+class TransactionExportView(APIView):
+    """
+    GET: Stream the full transaction history, newest first, as CSV or NDJSON
+    (`?output=csv|ndjson`). Memory use does not grow with the number of rows.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    columns = ('id', 'invoice_id', 'user_id', 'amount', 'status', 'transaction_date')
+    query_budgets = {'GET': 2}
+
+    @extend_schema(
+        operation_id="transactionExportGet"
+    )
+    def get(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {"message": "Unsupported output format.", "result": {}},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        transactions = Transaction.objects.order_by('-transaction_date', '-id')
+        if not request.user.is_staff:
+            transactions = transactions.filter(user=request.user)
+        return export_response(request, transactions, self.columns, output, 'transactions')
+
 class TransactionDetailView(APIView):
     """
     GET: Retrieve one transaction item by ID.
@@ -65,18 +200,21 @@ class TransactionDetailView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = TransactionStatusUpdateSerializer
+    query_budgets = {'GET': 2}
 
     def get_object(self, pk, user):
-        transaction = get_object_or_404(Transaction, pk=pk)
-        if not user.is_staff and transaction.invoice.user != user:
-            return None 
+        transaction = get_object_or_404(Transaction.objects.select_related('invoice'), pk=pk)
+        if not user.is_staff and transaction.user_id != user.id:
+            return None
         return transaction
 
     @extend_schema(
         operation_id="transactionGet"
     )
     def get(self, request, pk):
-        transaction = self.get_object(pk, request.user)
+        return self.retrieve_response(self.get_object(pk, request.user))
+
+    def retrieve_response(self, transaction):
         if not transaction:
             return Response(
                 {"message": "You do not have permission to view this transaction.", "result": {}},
@@ -111,7 +249,16 @@ class TransactionDetailView(APIView):
             context={'request': request}
         )
         if serializer.is_valid():
-            transaction = serializer.save()
+            try:
+                transaction = serializer.save()
+            except StatusConflict:
+                return Response(
+                    {
+                        "message": "Transaction status was changed by another request.",
+                        "result": {}
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
             response_serializer = TransactionListSerializer(transaction)
             return Response(
                 {
@@ -128,3 +275,78 @@ class TransactionDetailView(APIView):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+class AsyncTransactionDetailView(AsyncAPIView, TransactionDetailView):
+    async def aget_object(self, pk, user):
+        transaction = await aget_object_or_404(Transaction.objects.select_related('invoice'), pk=pk)
+        if not user.is_staff and transaction.user_id != user.id:
+            return None
+        return transaction
+
+    @extend_schema(
+        operation_id="transactionGet"
+    )
+    async def get(self, request, pk):
+        return self.retrieve_response(await self.aget_object(pk, request.user))
+
+    patch = run_sync(TransactionDetailView.patch)
+
+class OutboxMetricsView(APIView):
+    """
+    GET: Notification outbox backlog and delivery lag (staff only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+    query_budgets = {'GET': 2}
+
+    @extend_schema(
+        operation_id="transactionOutboxMetricsGet"
+    )
+    def get(self, request):
+        return Response(
+            {
+                "message": "Outbox metrics retrieved successfully.",
+                "result": outbox_metrics()
+            },
+            status=status.HTTP_200_OK
+        )
+
+class RevenueStatsView(APIView):
+    """
+    GET: Revenue per hour or day and status for buckets starting in [start, end)
+    (staff only). Answered from the revenue rollup, not the transactions table.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    query_budgets = {'GET': 2}
+
+    @extend_schema(
+        operation_id="transactionStatsGet",
+        parameters=[RevenueStatsQuerySerializer]
+    )
+    def get(self, request):
+        query = RevenueStatsQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                {
+                    "message": "Validation error.",
+                    "result": query.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = query.validated_data
+        rollups = RevenueRollup.objects.filter(
+            granularity=params['granularity'],
+            bucket__gte=params['start'],
+            bucket__lt=params['end'],
+            transaction_count__gt=0
+        ).order_by('bucket', 'status')
+        if 'status' in params:
+            rollups = rollups.filter(status=params['status'])
+
+        serializer = RevenueRollupSerializer(rollups, many=True)
+        return Response(
+            {
+                "message": "Revenue stats retrieved successfully.",
+                "result": serializer.data
+            },
+            status=status.HTTP_200_OK
+        )